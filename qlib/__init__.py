@@ -32,7 +32,7 @@ def init(default_conf="client", **kwargs):
 
     """
     from .config import C  # pylint: disable=C0415
-    from .data.cache import H  # pylint: disable=C0415
+    from .data.cache import H, SharedMemCache  # pylint: disable=C0415
 
     logger = get_module_logger("Initialization")
 
@@ -48,6 +48,9 @@ def init(default_conf="client", **kwargs):
         H.clear()
     C.set(default_conf, **kwargs)
     get_module_logger.setLevel(C.logging_level)
+    if C["shared_mem_cache"] is True:
+        # The sub-processes get the directory from `C`
+        C["shared_mem_cache"] = SharedMemCache.make_temp_dir()
 
     # mount nfs
     for _freq, provider_uri in C.provider_uri.items():
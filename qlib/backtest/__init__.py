@@ -23,6 +23,7 @@ from .backtest import INDICATOR_METRIC, PORT_METRIC, backtest_loop, collect_data
 from .decision import Order
 from .exchange import Exchange
 from .utils import CommonInfrastructure
+from .vectorized import VectorizedBacktest, vectorized_backtest
 
 # make import more user-friendly by adding `from qlib.backtest import STH`
 
@@ -252,7 +253,8 @@ def backtest(
     exchange_kwargs : dict
         the kwargs for initializing Exchange
     pos_type : str
-        the type of Position.
+        the type of Position. "ArrayPosition" keeps the position in arrays, which is faster for the backtests with
+        many bars (e.g. the nested high-frequency ones).
 
     Returns
     -------
@@ -346,4 +348,4 @@ def format_decisions(
     return res
 
 
-__all__ = ["Order", "backtest", "get_strategy_executor"]
+__all__ = ["Order", "backtest", "get_strategy_executor", "VectorizedBacktest", "vectorized_backtest"]
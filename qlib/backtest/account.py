@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 import copy
-from typing import Dict, List, Optional, Tuple, cast
+from typing import Dict, List, Mapping, Optional, Tuple, Union, cast
 
 import pandas as pd
 
@@ -12,7 +12,7 @@ from qlib.utils import init_instance_by_config
 from .decision import BaseTradeDecision, Order
 from .exchange import Exchange
 from .high_performance_ds import BaseOrderIndicator
-from .position import BasePosition
+from .position import ArrayPosition, ArrayPositionHistory, BasePosition
 from .report import Indicator, PortfolioMetrics
 
 """
@@ -126,7 +126,7 @@ class Account:
 
         # 2) following variables are not shared between layers
         self.portfolio_metrics: Optional[PortfolioMetrics] = None
-        self.hist_positions: Dict[pd.Timestamp, BasePosition] = {}
+        self.hist_positions: Union[Dict[pd.Timestamp, BasePosition], ArrayPositionHistory] = {}
         self.reset(freq=freq, benchmark_config=benchmark_config)
 
     def is_port_metr_enabled(self) -> bool:
@@ -141,7 +141,7 @@ class Account:
             # NOTE:
             # `accum_info` and `current_position` are shared here
             self.portfolio_metrics = PortfolioMetrics(freq, benchmark_config)
-            self.hist_positions = {}
+            self.hist_positions = ArrayPositionHistory() if isinstance(self.current_position, ArrayPosition) else {}
 
             # fill stock value
             # The frequency of account may not align with the trading frequency.
@@ -174,7 +174,7 @@ class Account:
 
         self.reset_report(self.freq, self.benchmark_config)
 
-    def get_hist_positions(self) -> Dict[pd.Timestamp, BasePosition]:
+    def get_hist_positions(self) -> Mapping[pd.Timestamp, BasePosition]:
         return self.hist_positions
 
     def get_cash(self) -> float:
@@ -297,8 +297,12 @@ class Account:
         self.current_position.position["now_account_value"] = now_account_value
         self.current_position.update_weight_all()
         # update hist_positions
-        # note use deepcopy
-        self.hist_positions[trade_start_time] = copy.deepcopy(self.current_position)
+        if isinstance(self.hist_positions, ArrayPositionHistory):
+            # the snapshots of ArrayPosition are recorded as arrays
+            self.hist_positions.record(trade_start_time, cast(ArrayPosition, self.current_position))
+        else:
+            # note use deepcopy
+            self.hist_positions[trade_start_time] = copy.deepcopy(self.current_position)
 
     def update_indicator(
         self,
@@ -10,6 +10,7 @@ from ..utils.index_data import IndexData
 if TYPE_CHECKING:
     from .account import Account
 
+import logging
 import random
 
 import numpy as np
@@ -127,6 +128,8 @@ class Exchange:
                                                 limit_buy will be set to False by default (False indicates we can buy
                                                 this target on this day).
                                     index: MultipleIndex(instrument, pd.Datetime)
+        :param quote_cls:       the class maintaining the quote data. `IndexedNumpyQuote` is faster than the default
+                                `NumpyQuote` for high frequency backtest and supports batched queries.
         """
         self.freq = freq
         self.start_time = start_time
@@ -462,6 +465,108 @@ class Exchange:
 
         return trade_val, trade_cost, trade_price
 
+    def deal_orders(
+        self,
+        orders: List[Order],
+        trade_account: Account | None = None,
+        position: BasePosition | None = None,
+        dealt_order_amount: Dict[str, float] | None = None,
+    ) -> List[Tuple[float, float, float]]:
+        """
+        Deal a batch of orders. The results are the same as calling `deal_order` on the orders one by one (and
+        accumulating the deal amount into `dealt_order_amount` after each order).
+
+        The tradability, deal price, volume, factor and volume limits of all the orders are fetched from the quote with
+        batched queries. Then the orders are dealt in the given sequence, so each order is constrained by the cash
+        left by the previous ones (i.e. the order of `orders` decides the serial or parallel semantics of trading).
+        The results section in `Order` will be changed.
+
+        :param orders: Deal the orders.
+        :param trade_account: Trade account to be updated after dealing the orders.
+        :param position: position to be updated after dealing the orders.
+        :param dealt_order_amount: the dealt order amount dict with the format of {stock_id: float}.
+                                   It will be updated **inplace** with the deal amount of the orders.
+        :return: a list of (trade_val, trade_cost, trade_price) for each order
+        """
+        if trade_account is not None and position is not None:
+            raise ValueError("trade_account and position can only choose one")
+        if dealt_order_amount is None:
+            dealt_order_amount = defaultdict(float)
+
+        n = len(orders)
+        tradable = np.zeros(n, dtype=bool)
+        trade_price, volume, factor = np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan)
+        vol_limit_num = {Order.BUY: np.full((n, len(self.buy_vol_limit or [])), np.nan)}
+        vol_limit_num[Order.SELL] = np.full((n, len(self.sell_vol_limit or [])), np.nan)
+
+        # the orders of a trade decision usually share the same time range, so they are queried together
+        groups: Dict[Tuple[pd.Timestamp, pd.Timestamp], List[int]] = defaultdict(list)
+        all_stock = self.quote.get_all_stock()
+        for i, order in enumerate(orders):
+            if order.stock_id in all_stock:
+                groups[order.start_time, order.end_time].append(i)
+        for (start_time, end_time), idx in groups.items():
+            idx_arr = np.array(idx)
+            stock_ids = [orders[i].stock_id for i in idx]
+            is_buy = np.array([orders[i].direction == Order.BUY for i in idx])
+
+            def _get_data(field: str, method: str) -> np.ndarray:
+                return self.quote.get_data_batch(stock_ids, start_time, end_time, field, method)
+
+            # suspended stocks have no valid $close. NaN limit means limited like `check_stock_limit`
+            limited = np.where(is_buy, _get_data("limit_buy", "all"), _get_data("limit_sell", "all"))
+            tradable[idx_arr] = ~np.isnan(_get_data("$close", "ts_data_last")) & (limited == 0)
+            trade_price[idx_arr] = np.where(
+                is_buy, _get_data(self.buy_price, "ts_data_last"), _get_data(self.sell_price, "ts_data_last")
+            )
+            volume[idx_arr] = _get_data("$volume", "sum")
+            factor[idx_arr] = _get_data("$factor", "ts_data_last")
+            for direction, vol_limit in ((Order.BUY, self.buy_vol_limit), (Order.SELL, self.sell_vol_limit)):
+                for j, limit in enumerate(vol_limit or []):
+                    if limit[0] not in ("current", "cum"):
+                        raise ValueError(f"{limit[0]} is not supported")
+                    method = "sum" if limit[0] == "current" else "ts_data_last"
+                    vol_limit_num[direction][idx_arr, j] = _get_data(limit[1], method)
+
+        res = []
+        # accessing the logger is not cheap, so it's checked only once for the batch
+        log_debug = self.logger.isEnabledFor(logging.DEBUG)
+        current_position = trade_account.current_position if trade_account else position
+        for i, order in enumerate(orders):
+            if not tradable[i]:
+                order.deal_amount = 0.0
+                if log_debug:
+                    self.logger.debug(f"Order failed due to trading limitation: {order}")
+                res.append((0.0, 0.0, np.nan))
+                continue
+
+            price = trade_price[i]
+            if np.isnan(price) or price <= 1e-08:
+                # fall back to the close price with warnings
+                price = self.get_deal_price(order.stock_id, order.start_time, order.end_time, order.direction)
+            order.factor = None if np.isnan(factor[i]) else factor[i]
+            order.deal_amount = order.amount
+            vol_limit = self.buy_vol_limit if order.direction == Order.BUY else self.sell_vol_limit
+            if vol_limit is not None:
+                limit_num = [
+                    value - dealt_order_amount[order.stock_id] if limit[0] == "cum" else value
+                    for limit, value in zip(vol_limit, vol_limit_num[order.direction][i])
+                ]
+                self._clip_amount_by_volume_limit(order, limit_num, vol_limit, log_debug)
+
+            price, trade_val, trade_cost = self._calc_trade_info_by_deal_amount(
+                order, current_position, price, volume[i] * price, log_debug
+            )
+            if trade_val > 1e-5:
+                # please refer to `deal_order` for skipping the orders of 0 value
+                if trade_account:
+                    trade_account.update_order(order=order, trade_val=trade_val, cost=trade_cost, trade_price=price)
+                elif position:
+                    position.update_order(order=order, trade_val=trade_val, cost=trade_cost, trade_price=price)
+            dealt_order_amount[order.stock_id] += order.deal_amount
+            res.append((trade_val, trade_cost, price))
+        return res
+
     def get_quote_info(
         self,
         stock_id: str,
@@ -823,14 +928,23 @@ class Exchange:
                 vol_limit_num.append(limit_value - dealt_order_amount[order.stock_id])
             else:
                 raise ValueError(f"{limit[0]} is not supported")
+        self._clip_amount_by_volume_limit(order, vol_limit_num, vol_limit)
+        return None
+
+    def _clip_amount_by_volume_limit(
+        self,
+        order: Order,
+        vol_limit_num: List[float],
+        vol_limit: list,
+        log_debug: bool = True,
+    ) -> None:
+        """clip the order.deal_amount **inplace** by the values of the volume limits"""
         vol_limit_min = min(vol_limit_num)
         orig_deal_amount = order.deal_amount
         order.deal_amount = max(min(vol_limit_min, orig_deal_amount), 0)
-        if vol_limit_min < orig_deal_amount:
+        if vol_limit_min < orig_deal_amount and log_debug:
             self.logger.debug(f"Order clipped due to volume limitation: {order}, {list(zip(vol_limit_num, vol_limit))}")
 
-        return None
-
     def _get_buy_amount_by_cash_limit(self, trade_price: float, cash: float, cost_ratio: float) -> float:
         """return the real order amount after cash limit for buying.
         Parameters
@@ -882,7 +996,26 @@ class Exchange:
         # Another choice is placing it after rounding the order
         # - It simulates that the large order is submitted, but partial is dealt regardless of rounding by trading unit.
         self._clip_amount_by_volume(order, dealt_order_amount)
+        return self._calc_trade_info_by_deal_amount(order, position, trade_price, total_trade_val)
 
+    def _calc_trade_info_by_deal_amount(
+        self,
+        order: Order,
+        position: Optional[BasePosition],
+        trade_price: float,
+        total_trade_val: float,
+        log_debug: bool = True,
+    ) -> Tuple[float, float, float]:
+        """
+        Calculation of trade info after `order.deal_amount` is clipped by the volume limitation
+        **NOTE**: Order will be changed in this function
+        :param order:
+        :param position: Position
+        :param trade_price: the deal price of the order
+        :param total_trade_val: the total trade value of the market during the order's time range
+        :param log_debug: log the clipping of the order or not
+        :return: trade_price, trade_val, trade_cost
+        """
         # TODO: the adjusted cost ratio can be overestimated as deal_amount will be clipped in the next steps
         trade_val = order.deal_amount * trade_price
         if not total_trade_val or np.isnan(total_trade_val):
@@ -913,7 +1046,8 @@ class Exchange:
                     self.min_cost,
                 ):
                     order.deal_amount = 0
-                    self.logger.debug(f"Order clipped due to cash limitation: {order}")
+                    if log_debug:
+                        self.logger.debug(f"Order clipped due to cash limitation: {order}")
 
         elif order.direction == Order.BUY:
             cost_ratio = self.open_cost + adj_cost_ratio
@@ -924,7 +1058,8 @@ class Exchange:
                 if cash < max(trade_val * cost_ratio, self.min_cost):
                     # cash cannot cover cost
                     order.deal_amount = 0
-                    self.logger.debug(f"Order clipped due to cost higher than cash: {order}")
+                    if log_debug:
+                        self.logger.debug(f"Order clipped due to cost higher than cash: {order}")
                 elif cash < trade_val + max(trade_val * cost_ratio, self.min_cost):
                     # The money is not enough
                     max_buy_amount = self._get_buy_amount_by_cash_limit(trade_price, cash, cost_ratio)
@@ -932,7 +1067,8 @@ class Exchange:
                         min(max_buy_amount, order.deal_amount),
                         order.factor,
                     )
-                    self.logger.debug(f"Order clipped due to cash limitation: {order}")
+                    if log_debug:
+                        self.logger.debug(f"Order clipped due to cash limitation: {order}")
                 else:
                     # The money is enough
                     order.deal_amount = self.round_amount_by_trade_unit(order.deal_amount, order.factor)
@@ -591,25 +591,24 @@ class SimulatorExecutor(BaseExecutor):
         trade_start_time, _ = self.trade_calendar.get_step_time()
         execute_result: list = []
 
-        for order in self._get_order_iterator(trade_decision):
-            # Each time we move into a new date, clear `self.dealt_order_amount` since it only maintains intraday
-            # information.
-            now_deal_day = self.trade_calendar.get_step_time()[0].floor(freq="D")
-            if self.deal_day is None or now_deal_day > self.deal_day:
-                self.dealt_order_amount = defaultdict(float)
-                self.deal_day = now_deal_day
-
-            # execute the order.
-            # NOTE: The trade_account will be changed in this function
-            trade_val, trade_cost, trade_price = self.trade_exchange.deal_order(
-                order,
-                trade_account=self.trade_account,
-                dealt_order_amount=self.dealt_order_amount,
-            )
+        # Each time we move into a new date, clear `self.dealt_order_amount` since it only maintains intraday
+        # information.
+        now_deal_day = trade_start_time.floor(freq="D")
+        if self.deal_day is None or now_deal_day > self.deal_day:
+            self.dealt_order_amount = defaultdict(float)
+            self.deal_day = now_deal_day
+
+        # execute the orders in a batch.
+        # NOTE: The trade_account and `self.dealt_order_amount` will be changed in this function
+        orders = self._get_order_iterator(trade_decision)
+        deal_results = self.trade_exchange.deal_orders(
+            orders,
+            trade_account=self.trade_account,
+            dealt_order_amount=self.dealt_order_amount,
+        )
+        for order, (trade_val, trade_cost, trade_price) in zip(orders, deal_results):
             execute_result.append((order, trade_val, trade_cost, trade_price))
 
-            self.dealt_order_amount[order.stock_id] += order.deal_amount
-
             if self.verbose:
                 print(
                     "[I {:%Y-%m-%d %H:%M:%S}]: {} {}, price {:.2f}, amount {}, deal_amount {}, factor {}, "
@@ -99,6 +99,41 @@ class BaseQuote:
 
         raise NotImplementedError(f"Please implement the `get_data` method")
 
+    def get_data_batch(
+        self,
+        stock_ids: List[str],
+        start_time: Union[pd.Timestamp, str],
+        end_time: Union[pd.Timestamp, str],
+        field: str,
+        method: str = "ts_data_last",
+    ) -> np.ndarray:
+        """get the specific field of a batch of stocks during start time and end_time (e.g. for all the orders of a
+        trade decision) and apply method to the data of each stock.
+
+        Parameters
+        ----------
+        stock_ids : List[str]
+            the stocks to fetch
+        start_time : Union[pd.Timestamp, str]
+            closed start time for backtest
+        end_time : Union[pd.Timestamp, str]
+            closed end time for backtest
+        field : str
+            the columns of data to fetch
+        method : str
+            the method apply to data, `None` is not supported.
+            e.g ["last", "all", "sum", "mean", "ts_data_last"]
+
+        Return
+        ----------
+        np.ndarray
+            the float values aligned with `stock_ids`. NaN takes the place of None returned by `get_data`.
+        """
+        if method is None:
+            raise ValueError("get_data_batch only supports aggregated data")
+        values = [self.get_data(stock_id, start_time, end_time, field, method) for stock_id in stock_ids]
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
 
 class PandasQuote(BaseQuote):
     def __init__(self, quote_df: pd.DataFrame, freq: str) -> None:
@@ -204,6 +239,148 @@ class NumpyQuote(BaseQuote):
             raise ValueError(f"{method} is not supported")
 
 
+class IndexedNumpyQuote(BaseQuote):
+    """
+    A quote whose fields are stored as dense (bar x instrument) float arrays.
+
+    The instruments are addressed by integer codes and a time range is resolved to a slice of bars by binary searches
+    on the sorted bar times, so no per-query slicing of indexed data (or cache) is needed.
+    It returns the same results as `NumpyQuote` and supports batched queries of many stocks at once.
+    """
+
+    def __init__(self, quote_df: pd.DataFrame, freq: str, region: str = "cn") -> None:
+        """IndexedNumpyQuote
+
+        Parameters
+        ----------
+        quote_df : pd.DataFrame
+            the init dataframe from qlib.
+        self.data : Dict(field, np.ndarray)
+            the (bar x instrument) array of each field, NaN is filled if the stock has no record at the bar.
+        """
+        super().__init__(quote_df=quote_df, freq=freq)
+        inst_codes, stocks = pd.factorize(quote_df.index.get_level_values("instrument"), sort=True)
+        bar_codes, bars = pd.factorize(quote_df.index.get_level_values("datetime"), sort=True)
+        self.stock_index = {stock_id: i for i, stock_id in enumerate(stocks)}
+        self.bars = pd.DatetimeIndex(bars)
+        self._bar_values = self.bars.values.view(np.int64)
+
+        shape = (len(bars), len(stocks))
+        # `exists` marks the records in `quote_df`; a record may still have NaN values
+        self.exists = np.zeros(shape, dtype=bool)
+        self.exists[bar_codes, inst_codes] = True
+        self.data = {}
+        for field in quote_df.columns:
+            values = np.full(shape, np.nan)
+            values[bar_codes, inst_codes] = quote_df[field].values.astype(np.float64)
+            self.data[field] = values
+
+        n, unit = Freq.parse(freq)
+        if unit in Freq.SUPPORT_CAL_LIST:
+            self.freq = Freq.get_timedelta(1, unit)
+        else:
+            raise ValueError(f"{freq} is not supported in IndexedNumpyQuote")
+        self.region = region
+
+    def get_all_stock(self):
+        return self.stock_index.keys()
+
+    def _get_bars(self, start_time: pd.Timestamp, end_time: pd.Timestamp) -> Union[int, slice, None]:
+        """
+        get the bars of the query.
+
+        Returns
+        -------
+        Union[int, slice, None]
+            - int: the bar of a single value query (the same as `NumpyQuote`, only the bar at `start_time` is selected)
+            - slice: the bars between start_time and end_time (both are included)
+            - None: the bar of the single value query does not exist
+        """
+        if is_single_value(start_time, end_time, self.freq, self.region):
+            i = self._bar_values.searchsorted(start_time.value)
+            if i == len(self._bar_values) or self._bar_values[i] != start_time.value:
+                return None
+            return int(i)
+        return slice(
+            self._bar_values.searchsorted(start_time.value, side="left"),
+            self._bar_values.searchsorted(end_time.value, side="right"),
+        )
+
+    def get_data(self, stock_id, start_time, end_time, field, method=None):
+        col = self.stock_index.get(stock_id)
+        if col is None:
+            return None
+        start_time, end_time = pd.Timestamp(start_time), pd.Timestamp(end_time)
+        bars = self._get_bars(start_time, end_time)
+        if bars is None:
+            return None
+        if isinstance(bars, int):
+            # single data, skip aggregating like `NumpyQuote`
+            return self.data[field][bars, col] if self.exists[bars, col] else None
+
+        exists = self.exists[bars, col]
+        if not exists.any():
+            return None
+        data = self.data[field][bars, col]
+        if not exists.all():
+            data = data[exists]
+        if method is None:
+            return idd.SingleData(data, self.bars[bars][exists])
+        return self._agg_data(data, method)
+
+    @staticmethod
+    def _agg_data(data: np.ndarray, method: str) -> Union[np.ndarray, float, None]:
+        """Agg data by specific method, it's consistent with `NumpyQuote._agg_data`"""
+        if method == "sum":
+            return np.nansum(data)
+        elif method == "mean":
+            return np.nanmean(data)
+        elif method == "last":
+            return data[-1]
+        elif method == "all":
+            return data.all()
+        elif method == "ts_data_last":
+            valid_data = data[~np.isnan(data)]
+            if len(valid_data) == 0:
+                return None
+            else:
+                return valid_data[-1]
+        else:
+            raise ValueError(f"{method} is not supported")
+
+    def get_data_batch(self, stock_ids, start_time, end_time, field, method="ts_data_last"):
+        if method is None:
+            raise ValueError("get_data_batch only supports aggregated data")
+        cols = np.array([self.stock_index.get(stock_id, -1) for stock_id in stock_ids], dtype=int)
+        res = np.full(len(cols), np.nan)
+        bars = self._get_bars(pd.Timestamp(start_time), pd.Timestamp(end_time))
+        known = cols >= 0
+        if bars is None or not known.any():
+            return res
+        cols = cols[known]
+        if isinstance(bars, int):
+            res[known] = np.where(self.exists[bars, cols], self.data[field][bars, cols], np.nan)
+            return res
+        data, exists = self.data[field][bars][:, cols], self.exists[bars][:, cols]
+        if len(data) == 0:
+            return res
+        if method == "sum":
+            values = np.nansum(data, axis=0)
+        elif method == "mean":
+            with np.errstate(invalid="ignore"):
+                values = np.nansum(data, axis=0) / (~np.isnan(data)).sum(axis=0)
+        elif method == "all":
+            values = data.all(axis=0).astype(np.float64)
+        elif method in ("last", "ts_data_last"):
+            valid = exists if method == "last" else ~np.isnan(data)
+            last = len(data) - 1 - valid[::-1].argmax(axis=0)
+            values = np.where(valid.any(axis=0), data[last, np.arange(len(cols))], np.nan)
+        else:
+            raise ValueError(f"{method} is not supported")
+        res[known] = np.where(exists.any(axis=0), values, np.nan)
+        return res
+
+
 class BaseSingleMetric:
     """
     The data structure of the single metric.
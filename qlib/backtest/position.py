@@ -3,8 +3,9 @@
 
 from __future__ import annotations
 
+import copy
 from datetime import timedelta
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, Iterator, List, Mapping, Union
 
 import numpy as np
 import pandas as pd
@@ -13,6 +14,30 @@ from ..data.data import D
 from .decision import Order
 
 
+def _get_latest_close(
+    stock_list: List[str], start_time: Union[str, pd.Timestamp], freq: str, last_days: int
+) -> Dict[str, float]:
+    """get the close price of the stocks in the latest `last_days` days before `start_time` from qlib"""
+    start_time = pd.Timestamp(start_time)
+    # note that start time is 2020-01-01 00:00:00 if raw start time is "2020-01-01"
+    price_end_time = start_time
+    price_start_time = start_time - timedelta(days=last_days)
+    price_df = D.features(
+        stock_list,
+        ["$close"],
+        price_start_time,
+        price_end_time,
+        freq=freq,
+        disk_cache=True,
+    ).dropna()
+    price_dict = price_df.groupby(["instrument"]).tail(1).reset_index(level=1, drop=True)["$close"].to_dict()
+
+    if len(price_dict) < len(stock_list):
+        lack_stock = set(stock_list) - set(price_dict)
+        raise ValueError(f"{lack_stock} doesn't have close price in qlib in the latest {last_days} days")
+    return price_dict
+
+
 class BasePosition:
     """
     The Position wants to maintain the position like a dictionary
@@ -299,24 +324,7 @@ class Position(BasePosition):
         if len(stock_list) == 0:
             return
 
-        start_time = pd.Timestamp(start_time)
-        # note that start time is 2020-01-01 00:00:00 if raw start time is "2020-01-01"
-        price_end_time = start_time
-        price_start_time = start_time - timedelta(days=last_days)
-        price_df = D.features(
-            stock_list,
-            ["$close"],
-            price_start_time,
-            price_end_time,
-            freq=freq,
-            disk_cache=True,
-        ).dropna()
-        price_dict = price_df.groupby(["instrument"]).tail(1).reset_index(level=1, drop=True)["$close"].to_dict()
-
-        if len(price_dict) < len(stock_list):
-            lack_stock = set(stock_list) - set(price_dict)
-            raise ValueError(f"{lack_stock} doesn't have close price in qlib in the latest {last_days} days")
-
+        price_dict = _get_latest_close(stock_list, start_time, freq, last_days)
         for stock in stock_list:
             self.position[stock]["price"] = price_dict[stock]
         self.position["now_account_value"] = self.calculate_value()
@@ -500,6 +508,296 @@ class Position(BasePosition):
             self._settle_type = self.ST_NO
 
 
+class ArrayPosition(BasePosition):
+    """
+    The position backed by NumPy arrays
+
+    The fields of the stocks (amount, price, weight and the holding bar counts) are kept in arrays aligned to an
+    append-only index of the instruments, and the value of the stocks is tracked incrementally, so valuing the position
+    is O(1) and the bar-end updates are vectorized. It behaves the same as `Position` except that `position` only
+    keeps the cash related items (i.e. "cash", "cash_delay" and "now_account_value"), the stocks must be accessed by
+    the methods. It is designed for the backtests with many bars (e.g. the nested minute-level executors).
+
+    The historical positions of the account are recorded by `ArrayPositionHistory` instead of deep copies.
+    """
+
+    def __init__(self, cash: float = 0, position_dict: Dict[str, Union[Dict[str, float], float]] = {}) -> None:
+        """
+        Parameters
+        ----------
+        cash : float, optional
+            initial cash in account, by default 0
+        position_dict :
+            initial stocks with parameters amount and price, please refer to `Position`
+        """
+        super().__init__()
+        self.init_cash = cash
+        self.position = {"cash": cash}
+        # NOTE: the slot of an instrument is never reused by other ones, so `_codes` is append-only
+        self._codes: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._held = np.zeros(0, dtype=bool)
+        self._amount = np.zeros(0)
+        self._price = np.zeros(0)
+        self._weight = np.zeros(0)
+        self._count: Dict[str, np.ndarray] = {}
+        self._stock_value = 0.0
+        for stock, value in position_dict.items():
+            if not isinstance(value, dict):
+                value = {"amount": value}
+            self._init_stock(stock, value["amount"], value.get("price", None))
+            self._weight[self._index[stock]] = value.get("weight", 0)
+        if not np.isnan(self._stock_value):
+            self.position["now_account_value"] = self.calculate_value()
+
+    def __deepcopy__(self, memo: dict) -> ArrayPosition:
+        new = copy.copy(self)
+        new.position = self.position.copy()
+        new._codes, new._index = self._codes.copy(), self._index.copy()
+        for attr in "_held", "_amount", "_price", "_weight":
+            setattr(new, attr, getattr(self, attr).copy())
+        new._count = {bar: count.copy() for bar, count in self._count.items()}
+        return new
+
+    def fill_stock_value(self, start_time: Union[str, pd.Timestamp], freq: str, last_days: int = 30) -> None:
+        """fill the stock value by the close price of latest last_days from qlib, please refer to `Position`"""
+        stock_list = [self._codes[i] for i in np.flatnonzero(self._held & np.isnan(self._price))]
+        if len(stock_list) == 0:
+            return
+        price_dict = _get_latest_close(stock_list, start_time, freq, last_days)
+        for stock in stock_list:
+            self._price[self._index[stock]] = price_dict[stock]
+        self._stock_value = self._sum_stock_value()
+        self.position["now_account_value"] = self.calculate_value()
+
+    def _sum_stock_value(self) -> float:
+        return float(np.sum(self._amount[self._held] * self._price[self._held]))
+
+    def _get_slot(self, stock_id: str) -> int:
+        """get the slot of the stock, a new slot will be created for the new stocks"""
+        if stock_id not in self._index:
+            slot = len(self._codes)
+            if slot == len(self._held):
+                # grow the arrays
+                size = max(2 * slot, 16)
+                for attr in "_held", "_amount", "_price", "_weight":
+                    arr = getattr(self, attr)
+                    setattr(self, attr, np.concatenate([arr, np.zeros(size - slot, dtype=arr.dtype)]))
+                for bar, count in self._count.items():
+                    self._count[bar] = np.concatenate([count, np.zeros(size - slot, dtype=count.dtype)])
+            self._codes.append(stock_id)
+            self._index[stock_id] = slot
+        return self._index[stock_id]
+
+    def _init_stock(self, stock_id: str, amount: float, price: float | None = None) -> None:
+        slot = self._get_slot(stock_id)
+        self._held[slot] = True
+        self._amount[slot] = amount
+        self._price[slot] = np.nan if price is None else price
+        self._weight[slot] = 0  # update the weight in the end of the trade date
+        for count in self._count.values():
+            count[slot] = 0
+        self._stock_value += amount * self._price[slot]
+
+    def _buy_stock(self, stock_id: str, trade_val: float, cost: float, trade_price: float) -> None:
+        trade_amount = trade_val / trade_price
+        if not self.check_stock(stock_id):
+            self._init_stock(stock_id=stock_id, amount=trade_amount, price=trade_price)
+        else:
+            # exist, add amount
+            slot = self._index[stock_id]
+            self._amount[slot] += trade_amount
+            self._stock_value += trade_amount * self._price[slot]
+
+        self.position["cash"] -= trade_val + cost
+
+    def _sell_stock(self, stock_id: str, trade_val: float, cost: float, trade_price: float) -> None:
+        trade_amount = trade_val / trade_price
+        if not self.check_stock(stock_id):
+            raise KeyError("{} not in current position".format(stock_id))
+        slot = self._index[stock_id]
+        if np.isclose(self._amount[slot], trade_amount):
+            # Selling all the stocks, please refer to `Position._sell_stock`
+            self._del_stock(stock_id)
+        else:
+            # decrease the amount of stock
+            self._amount[slot] -= trade_amount
+            self._stock_value -= trade_amount * self._price[slot]
+            # check if to delete
+            if self._amount[slot] < -1e-5:
+                raise ValueError(
+                    "only have {} {}, require {}".format(self._amount[slot] + trade_amount, stock_id, trade_amount),
+                )
+
+        new_cash = trade_val - cost
+        if self._settle_type == self.ST_CASH:
+            self.position["cash_delay"] += new_cash
+        elif self._settle_type == self.ST_NO:
+            self.position["cash"] += new_cash
+        else:
+            raise NotImplementedError(f"This type of input is not supported")
+
+    def _del_stock(self, stock_id: str) -> None:
+        slot = self._index[stock_id]
+        self._held[slot] = False
+        self._stock_value -= self._amount[slot] * self._price[slot]
+        if not self._held.any():
+            # avoid accumulating the float error when the position is empty
+            self._stock_value = 0.0
+
+    def check_stock(self, stock_id: str) -> bool:
+        return stock_id in self._index and bool(self._held[self._index[stock_id]])
+
+    def update_order(self, order: Order, trade_val: float, cost: float, trade_price: float) -> None:
+        if order.direction == Order.BUY:
+            self._buy_stock(order.stock_id, trade_val, cost, trade_price)
+        elif order.direction == Order.SELL:
+            self._sell_stock(order.stock_id, trade_val, cost, trade_price)
+        else:
+            raise NotImplementedError("do not support order direction {}".format(order.direction))
+
+    def update_stock_price(self, stock_id: str, price: float) -> None:
+        slot = self._index[stock_id]
+        self._stock_value += self._amount[slot] * (price - self._price[slot])
+        self._price[slot] = price
+        if np.isnan(self._stock_value):
+            # the price was missing before
+            self._stock_value = self._sum_stock_value()
+
+    def update_stock_count(self, stock_id: str, bar: str, count: float) -> None:
+        self._get_count(bar)[self._index[stock_id]] = count
+
+    def update_stock_weight(self, stock_id: str, weight: float) -> None:
+        self._weight[self._index[stock_id]] = weight
+
+    def calculate_stock_value(self) -> float:
+        return self._stock_value
+
+    def calculate_value(self) -> float:
+        return self._stock_value + self.position["cash"] + self.position.get("cash_delay", 0.0)
+
+    def get_stock_list(self) -> List[str]:
+        return [self._codes[i] for i in np.flatnonzero(self._held)]
+
+    def get_stock_price(self, code: str) -> float:
+        if not self.check_stock(code):
+            raise KeyError(code)
+        return float(self._price[self._index[code]])
+
+    def get_stock_amount(self, code: str) -> float:
+        return float(self._amount[self._index[code]]) if self.check_stock(code) else 0
+
+    def _get_count(self, bar: str) -> np.ndarray:
+        if bar not in self._count:
+            self._count[bar] = np.zeros(len(self._held), dtype=int)
+        return self._count[bar]
+
+    def get_stock_count(self, code: str, bar: str) -> float:
+        """the days the account has been hold, it may be used in some special strategies"""
+        if bar not in self._count:
+            return 0
+        return int(self._count[bar][self._index[code]])
+
+    def get_stock_weight(self, code: str) -> float:
+        return float(self._weight[self._index[code]])
+
+    def get_cash(self, include_settle: bool = False) -> float:
+        cash = self.position["cash"]
+        if include_settle:
+            cash += self.position.get("cash_delay", 0.0)
+        return cash
+
+    def get_stock_amount_dict(self) -> dict:
+        """generate stock amount dict {stock_id : amount of stock}"""
+        idx = np.flatnonzero(self._held)
+        return dict(zip([self._codes[i] for i in idx], self._amount[idx].tolist()))
+
+    def _get_weight(self, only_stock: bool = False) -> np.ndarray:
+        position_value = self.calculate_stock_value() if only_stock else self.calculate_value()
+        return self._amount * self._price / position_value
+
+    def get_stock_weight_dict(self, only_stock: bool = False) -> dict:
+        """generate stock weight dict {stock_id : value weight of stock in the position}, please refer to `Position`"""
+        idx = np.flatnonzero(self._held)
+        return dict(zip([self._codes[i] for i in idx], self._get_weight(only_stock)[idx].tolist()))
+
+    def add_count_all(self, bar: str) -> None:
+        self._get_count(bar)[self._held] += 1
+        # it is called at the end of each bar, so the float error of the incremental value is cleared here
+        self._stock_value = self._sum_stock_value()
+
+    def update_weight_all(self) -> None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._weight = np.where(self._held, self._get_weight(), self._weight)
+
+    def settle_start(self, settle_type: str) -> None:
+        assert self._settle_type == self.ST_NO, "Currently, settlement can't be nested!!!!!"
+        self._settle_type = settle_type
+        if settle_type == self.ST_CASH:
+            self.position["cash_delay"] = 0.0
+
+    def settle_commit(self) -> None:
+        if self._settle_type != self.ST_NO:
+            if self._settle_type == self.ST_CASH:
+                self.position["cash"] += self.position["cash_delay"]
+                del self.position["cash_delay"]
+            else:
+                raise NotImplementedError(f"This type of input is not supported")
+            self._settle_type = self.ST_NO
+
+
+class ArrayPositionHistory(Mapping):
+    """
+    The historical positions of `ArrayPosition`, i.e. {<trade_start_time>: <position>}
+
+    Each snapshot only keeps the held stocks as a few compact arrays (the slots in the append-only instrument index of
+    the position, the amount, the price, the weight and the holding bar counts) instead of a deep copy of the position.
+    The snapshots are converted to `Position` when they are accessed, so the results are the same as the ones of
+    `Position` for the analysis (e.g. `parse_position`).
+    """
+
+    def __init__(self) -> None:
+        self._snapshots: Dict[pd.Timestamp, tuple] = {}
+
+    def record(self, trade_start_time: pd.Timestamp, position: ArrayPosition) -> None:
+        idx = np.flatnonzero(position._held)
+        counts = {bar: count[idx] for bar, count in position._count.items()}
+        self._snapshots[trade_start_time] = (
+            position._codes,
+            idx,
+            position._amount[idx],
+            position._price[idx],
+            position._weight[idx],
+            counts,
+            position.position.copy(),
+            position.init_cash,
+            position._settle_type,
+        )
+
+    def __getitem__(self, trade_start_time: pd.Timestamp) -> Position:
+        codes, idx, amount, price, weight, counts, cash_items, init_cash, settle_type = self._snapshots[
+            trade_start_time
+        ]
+        counts = {f"count_{bar}": count.tolist() for bar, count in counts.items()}
+        position_dict = {}
+        for i, (slot, a, p, w) in enumerate(zip(idx, amount.tolist(), price.tolist(), weight.tolist())):
+            stock = {"amount": a, "price": p, "weight": w}
+            # the stocks are not counted before the end of their first bar
+            stock.update({key: count[i] for key, count in counts.items() if count[i] > 0})
+            position_dict[codes[slot]] = stock
+        position = Position(cash=cash_items["cash"], position_dict=position_dict)
+        position.position.update(cash_items)
+        position.init_cash = init_cash
+        position._settle_type = settle_type
+        return position
+
+    def __iter__(self) -> Iterator[pd.Timestamp]:
+        return iter(self._snapshots)
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+
 class InfPosition(BasePosition):
     """
     Position with infinite cash and amount.
@@ -5,7 +5,7 @@ from __future__ import annotations
 
 import pathlib
 from collections import OrderedDict
-from typing import Any, Dict, List, Optional, Text, Tuple, Type, Union, cast
+from typing import Any, Dict, List, Optional, Sequence, Text, Tuple, Type, Union, cast
 
 import numpy as np
 import pandas as pd
@@ -336,6 +336,32 @@ class Indicator:
         self._update_order_trade_info(trade_info=trade_info)
         self._update_order_fulfill_rate()
 
+    def update_order_indicators_by_array(
+        self,
+        stock_ids: Sequence[str],
+        amount: np.ndarray,
+        deal_amount: np.ndarray,
+        trade_price: np.ndarray,
+        trade_value: np.ndarray,
+        trade_cost: np.ndarray,
+        trade_dir: np.ndarray,
+    ) -> None:
+        """
+        The same as `update_order_indicators`, but the trade info is given by the arrays of the orders instead of
+        the `Order` objects (e.g. by `VectorizedBacktest`). The amounts and the values are unsigned like `Order`.
+        """
+        stock_ids = list(stock_ids)
+        sign = np.asarray(trade_dir) * 2 - 1
+        self.order_indicator.assign("amount", dict(zip(stock_ids, (amount * sign).tolist())))
+        self.order_indicator.assign("inner_amount", dict(zip(stock_ids, (amount * sign).tolist())))
+        self.order_indicator.assign("deal_amount", dict(zip(stock_ids, (deal_amount * sign).tolist())))
+        self.order_indicator.assign("trade_price", dict(zip(stock_ids, np.asarray(trade_price).tolist())))
+        self.order_indicator.assign("trade_value", dict(zip(stock_ids, (trade_value * sign).tolist())))
+        self.order_indicator.assign("trade_cost", dict(zip(stock_ids, np.asarray(trade_cost).tolist())))
+        self.order_indicator.assign("trade_dir", dict(zip(stock_ids, np.asarray(trade_dir).tolist())))
+        self.order_indicator.assign("pa", dict.fromkeys(stock_ids, 0))
+        self._update_order_fulfill_rate()
+
     def _agg_order_trade_info(self, inner_order_indicators: List[BaseOrderIndicator]) -> None:
         # calculate total trade amount with each inner order indicator.
         def trade_amount_func(deal_amount, trade_price):
@@ -0,0 +1,680 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+"""
+An array-backed engine of daily backtests.
+
+`backtest` simulates the trading order by order through the Python objects of `Exchange`, `Position` and `Account`,
+which is flexible but slow when thousands of backtests are run for strategy search. `VectorizedBacktest` aligns the
+quote of an `Exchange` into (date x instrument) NumPy arrays and keeps the position as arrays over the instruments,
+so each trading day of the strategies whose decisions can be vectorized is simulated with a few array operations.
+
+It follows the rules of `TopkDropoutStrategy`, `OrderGenWOInteract` (for the target weights of `WeightStrategyBase`),
+`SimulatorExecutor` and `Exchange` (limits, suspension, deal price, volume limits, trading unit rounding, the cost model
+and the cash limitation of the serial/parallel order execution), and produces the same `PortfolioMetrics` and
+`Indicator` results as `backtest` with a daily `SimulatorExecutor`. The results may be different in the float rounding
+errors because some values are summed in different orders.
+"""
+from __future__ import annotations
+
+import copy
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from ..data.data import Cal
+from ..utils import init_instance_by_config
+from ..utils.time import Freq, epsilon_change
+from .backtest import INDICATOR_METRIC, PORT_METRIC
+from .decision import OrderDir
+from .exchange import Exchange
+from .position import Position
+from .report import Indicator, PortfolioMetrics
+from .signal import Signal, SignalWCache, create_signal_from
+
+
+class _ArrayPosition:
+    """The position of `VectorizedBacktest`, which keeps the fields of the stocks as arrays over the instruments"""
+
+    def __init__(self, n_inst: int, cash: float) -> None:
+        self.held = np.zeros(n_inst, dtype=bool)
+        self.amount = np.zeros(n_inst)
+        self.price = np.zeros(n_inst)
+        self.count = np.zeros(n_inst, dtype=int)
+        self.cash = cash
+        # accumulated cost and turnover, please refer to `AccumulatedInfo`
+        self.cost = 0.0
+        self.turnover = 0.0
+
+    def copy(self) -> _ArrayPosition:
+        new = copy.copy(self)
+        for attr in "held", "amount", "price", "count":
+            setattr(new, attr, getattr(self, attr).copy())
+        return new
+
+    def calculate_stock_value(self) -> float:
+        return np.sum(self.amount[self.held] * self.price[self.held])
+
+
+class VectorizedBacktest:
+    """
+    The array-backed engine of daily backtests
+
+    The quote is aligned once when the engine is created, so multiple backtests (e.g. with different strategy
+    parameters) can be run by the same engine. Each `run_*` method runs a backtest from the initial account and
+    returns the results in the format of `backtest`. The engine keeps no reference to the exchange, so it is cheap to
+    be sent to other processes (the arrays of the quote can be shared by memmaps, e.g. by joblib).
+
+    Only a daily `SimulatorExecutor` without the settlement delay is supported, and the volume limits of `Exchange` are
+    applied as if each stock is traded at most once in a day (which is true for the supported strategies).
+    """
+
+    # the configs which can be changed by `replace` without reloading the quote
+    REPLACEABLE = ("open_cost", "close_cost", "min_cost", "impact_cost", "trade_unit", "limit_threshold", "trade_type")
+
+    def __init__(
+        self,
+        trade_exchange: Exchange,
+        start_time: Union[pd.Timestamp, str],
+        end_time: Union[pd.Timestamp, str],
+        benchmark: Union[str, list, pd.Series, None] = "SH000300",
+        account: Union[float, int, dict] = 1e9,
+        trade_type: str = "serial",
+        generate_portfolio_metrics: bool = True,
+        indicator_config: dict = {},
+    ) -> None:
+        """
+        Parameters
+        ----------
+        trade_exchange : Exchange
+            the exchange that provides the quote and the trading rules, its `freq` must be "day"
+        start_time : Union[pd.Timestamp, str]
+            closed start time for backtest
+        end_time : Union[pd.Timestamp, str]
+            closed end time for backtest
+        benchmark : Union[str, list, pd.Series, None]
+            the benchmark for reporting, please refer to the docs of `PortfolioMetrics`
+        account : Union[float, int, dict]
+            information for describing how to create the account, please refer to `create_account_instance`
+        trade_type : str
+            please refer to the docs of `SimulatorExecutor`
+        generate_portfolio_metrics : bool
+            generate the portfolio metrics and the historical positions or not, like the executor
+        indicator_config : dict
+            the config of the trade indicators, please refer to the docs of `BaseExecutor`
+        """
+        if Freq.parse(trade_exchange.freq) != (1, Freq.NORM_FREQ_DAY):
+            raise NotImplementedError(f"VectorizedBacktest only supports daily exchange, {trade_exchange.freq} given")
+        if trade_type not in ("serial", "parallel"):
+            raise NotImplementedError(f"This type of input is not supported")
+        self.trade_type = trade_type
+        self.generate_portfolio_metrics = generate_portfolio_metrics
+        self.indicator_config = indicator_config
+
+        # the trading rules of the exchange
+        for attr in "open_cost", "close_cost", "min_cost", "impact_cost", "trade_unit", "trade_w_adj_price":
+            setattr(self, attr, getattr(trade_exchange, attr))
+        self.limit_threshold = trade_exchange.limit_threshold
+        self.buy_vol_limit, self.sell_vol_limit = trade_exchange.buy_vol_limit, trade_exchange.sell_vol_limit
+
+        # the trading steps, the row `i + 1` of the arrays is the `i`-th step and the row `i` is the time of its
+        # prediction (i.e. the previous step)
+        calendar = Cal.calendar(freq="day", future=True)
+        _, _, start_index, end_index = Cal.locate_index(start_time, end_time, freq="day", future=True)
+        self.start_time, self.end_time = start_time, end_time
+        self.trade_times = pd.DatetimeIndex(calendar[start_index : end_index + 1])
+        self.trade_end_times = [epsilon_change(t) for t in calendar[start_index + 1 : end_index + 2]]
+        pred_time = [calendar[start_index - 1]] if start_index > 0 else [pd.NaT]
+        self.times = pd.DatetimeIndex(pred_time).append(self.trade_times)
+
+        if isinstance(account, (int, float)):
+            self.init_cash, position_dict = account, {}
+        elif isinstance(account, dict):
+            account = account.copy()
+            self.init_cash, position_dict = account.pop("cash"), account
+        else:
+            raise ValueError("account must be in (int, float, dict)")
+        init_position = Position(cash=self.init_cash, position_dict=copy.deepcopy(position_dict))
+        if len(position_dict) > 0:
+            init_position.fill_stock_value(start_time, "day")
+        # the amount and the price of the initial stocks
+        self.init_stocks = {
+            code: (init_position.get_stock_amount(code), init_position.get_stock_price(code))
+            for code in init_position.get_stock_list()
+        }
+
+        # please refer to `create_account_instance`
+        self.bench = PortfolioMetrics._cal_benchmark(
+            {} if benchmark is None else {"benchmark": benchmark, "start_time": start_time, "end_time": end_time},
+            "day",
+        )
+        self.instruments = pd.Index(sorted(trade_exchange.quote.get_all_stock()))
+        self._quote = self._pivot_quote(trade_exchange)
+        self._quote_cache: Dict[tuple, Dict[str, Any]] = {}
+
+    def replace(self, **kwargs: Any) -> VectorizedBacktest:
+        """
+        create an engine sharing the quote with some configs replaced
+
+        Parameters
+        ----------
+        kwargs :
+            the new values of the configs in `REPLACEABLE`, i.e. the costs, `trade_unit` and `limit_threshold` of the
+            exchange and the `trade_type` of the executor. The limit expressions must be the ones of the exchange.
+        """
+        for key, value in kwargs.items():
+            if key not in self.REPLACEABLE:
+                raise ValueError(f"{key} can not be replaced, the replaceable configs are {self.REPLACEABLE}")
+            if key == "trade_type" and value not in ("serial", "parallel"):
+                raise NotImplementedError(f"This type of input is not supported")
+            if key == "limit_threshold" and isinstance(value, tuple) and value != self.limit_threshold:
+                raise ValueError(f"Only the limit expressions of the exchange are available, {value} given")
+        engine = copy.copy(self)
+        engine.__dict__.update(kwargs)
+        return engine
+
+    def _pivot_quote(self, trade_exchange: Exchange) -> Dict[str, np.ndarray]:
+        """pivot the quote of the exchange into (date x instrument) arrays, the missing values are NaN"""
+        quote_df = trade_exchange.quote_df
+        row = self.times.get_indexer(quote_df.index.get_level_values("datetime"))
+        col = self.instruments.get_indexer(quote_df.index.get_level_values("instrument"))
+        mask = (row >= 0) & (col >= 0)
+        row, col = row[mask], col[mask]
+
+        def _pivot(values: np.ndarray) -> np.ndarray:
+            arr = np.full((len(self.times), len(self.instruments)), np.nan)
+            arr[row, col] = values[mask]
+            return arr
+
+        quote = {"close": _pivot(quote_df["$close"].values)}
+        for attr in "buy_price", "sell_price":
+            price = _pivot(quote_df[getattr(trade_exchange, attr)].values)
+            # the deal price will be the close price if it is invalid, please refer to `Exchange.get_deal_price`
+            quote[attr] = np.where(np.isnan(price) | (price <= 1e-08), quote["close"], price)
+        for field in ["$volume", "$factor", "$change"] + [
+            limit[1] for limit in (self.buy_vol_limit or []) + (self.sell_vol_limit or [])
+        ]:
+            quote[field] = _pivot(quote_df[field].values)
+        if isinstance(self.limit_threshold, tuple):
+            # astype bool is necessary, because quote_df is an expression and could be float
+            for field, limit in zip(self.limit_threshold, ("limit_buy", "limit_sell")):
+                quote[limit] = _pivot(quote_df[field].astype(bool).values.astype(float))
+        return quote
+
+    def _get_quote(self, instruments: pd.Index) -> Dict[str, Any]:
+        """get the (date x instrument) arrays of the quote of the instruments with the trading limits"""
+        key = (tuple(instruments), self.limit_threshold)
+        if key in self._quote_cache:
+            return self._quote_cache[key]
+        col = self.instruments.get_indexer(instruments)
+        quote: Dict[str, Any] = {}
+        for field, arr in self._quote.items():
+            quote[field] = arr[:, col]
+            quote[field][:, col < 0] = np.nan
+
+        # please refer to `Exchange._update_limit`
+        suspended = np.isnan(quote["close"])
+        if self.limit_threshold is None:
+            limit_buy = limit_sell = np.zeros_like(suspended)
+        elif isinstance(self.limit_threshold, tuple):
+            limit_buy, limit_sell = quote["limit_buy"] == 1, quote["limit_sell"] == 1
+        else:
+            limit_buy = quote["$change"] >= self.limit_threshold
+            limit_sell = quote["$change"] <= -self.limit_threshold
+        quote["tradable"] = ~(suspended | limit_buy | limit_sell)
+        quote["tradable_buy"] = ~(suspended | limit_buy)
+        quote["tradable_sell"] = ~(suspended | limit_sell)
+        quote["suspended"] = suspended
+        self._quote_cache[key] = quote
+        return quote
+
+    def _get_instruments(self, *extra: pd.Index) -> pd.Index:
+        instruments = self.instruments.union(pd.Index(list(self.init_stocks)))
+        for inst in extra:
+            instruments = instruments.union(inst)
+        return instruments
+
+    def _pivot_signal(self, signal: Union[Signal, pd.Series, pd.DataFrame], instruments: pd.Index) -> np.ndarray:
+        """
+        align the signal to the (date x instrument) array like the `SignalWCache.get_signal` of each step (i.e. the
+        last valid value in the time range of each step), the missing values are NaN
+        """
+        if isinstance(signal, (pd.DataFrame, pd.Series)):
+            signal = create_signal_from(signal)
+        if not isinstance(signal, SignalWCache):
+            raise NotImplementedError(f"Only the signals with pandas cache are supported, {type(signal)} given")
+        sig = signal.signal_cache
+        if isinstance(sig, pd.DataFrame):
+            sig = sig.iloc[:, 0]
+        sig = sig.dropna()
+        dt = sig.index.get_level_values("datetime")
+        # the step of each datetime, NOTE: the step of the last time is until the end of the last trading step
+        bounds = self.times.append(pd.DatetimeIndex([self.trade_end_times[-1]]))
+        row = bounds[1:].searchsorted(dt, side="right")
+        col = instruments.get_indexer(sig.index.get_level_values("instrument"))
+        mask = (dt >= bounds[0]) & (row < len(self.times)) & (col >= 0)
+        # keep the last value of each instrument in each step
+        order = np.argsort(dt.values[mask], kind="stable")[::-1]
+        row, col, values = row[mask][order], col[mask][order], sig.values[mask][order]
+        _, first = np.unique(row * len(instruments) + col, return_index=True)
+        arr = np.full((len(self.times), len(instruments)), np.nan)
+        arr[row[first], col[first]] = values[first]
+        return arr
+
+    def _round_amount_by_trade_unit(self, amount: np.ndarray, factor: np.ndarray) -> np.ndarray:
+        """the vectorized `Exchange.round_amount_by_trade_unit`"""
+        if not self.trade_w_adj_price and self.trade_unit is not None:
+            return (amount * factor + 0.1) // self.trade_unit * self.trade_unit / factor
+        return amount
+
+    def _clip_amount_by_volume(self, quote: dict, r: int, idx: np.ndarray, amount: np.ndarray, buy: bool) -> np.ndarray:
+        """the vectorized `Exchange._clip_amount_by_volume` for the first order of the stocks in a day"""
+        vol_limit = self.buy_vol_limit if buy else self.sell_vol_limit
+        if vol_limit is None:
+            return amount
+        for limit in vol_limit:
+            if limit[0] not in ("current", "cum"):
+                raise ValueError(f"{limit[0]} is not supported")
+        limit_min = np.min([quote[limit[1]][r, idx] for limit in vol_limit], axis=0)
+        return np.maximum(np.minimum(limit_min, amount), 0)
+
+    def _get_buy_amount_by_cash_limit(self, trade_price: float, cash: float, cost_ratio: float) -> float:
+        """the same as `Exchange._get_buy_amount_by_cash_limit`"""
+        max_trade_amount = 0.0
+        if cash >= self.min_cost:
+            # critical_price means the stock transaction price when the service fee is equal to min_cost.
+            critical_price = self.min_cost / cost_ratio + self.min_cost
+            if cash >= critical_price:
+                # the service fee is equal to cost_ratio * trade_amount
+                max_trade_amount = cash / (1 + cost_ratio) / trade_price
+            else:
+                # the service fee is equal to min_cost
+                max_trade_amount = (cash - self.min_cost) / trade_price
+        return max_trade_amount
+
+    def _deal_orders(
+        self, quote: dict, r: int, pos: _ArrayPosition, idx: np.ndarray, amount: np.ndarray, buy: bool
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        deal the orders of the same direction one by one like `Exchange.deal_order` and update the position
+
+        The orders are evaluated together with array operations. The cash limitation depends on the previous orders,
+        so the orders are accepted until the first one whose cash is not enough, which will be dealt separately.
+
+        Parameters
+        ----------
+        quote : dict
+            the arrays of the quote
+        r : int
+            the row of the trading step
+        pos : _ArrayPosition
+            the position, which will be updated
+        idx : np.ndarray
+            the instruments of the orders, which must be different and tradable in the direction
+        amount : np.ndarray
+            the amount of the orders
+        buy : bool
+            the direction of the orders
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+            the deal amount, trade price, trade value and trade cost of the orders
+        """
+        price = quote["buy_price" if buy else "sell_price"][r, idx]
+        factor = quote["$factor"][r, idx]
+        deal_amount = self._clip_amount_by_volume(quote, r, idx, amount, buy)
+        trade_val = deal_amount * price
+        total_trade_val = quote["$volume"][r, idx] * price
+        with np.errstate(divide="ignore", invalid="ignore"):
+            adj_cost_ratio = np.where(
+                (total_trade_val == 0) | np.isnan(total_trade_val),
+                self.impact_cost,
+                self.impact_cost * (trade_val / total_trade_val) ** 2,
+            )
+        cost_ratio = (self.open_cost if buy else self.close_cost) + adj_cost_ratio
+
+        if buy:
+            # the deal amount when the money is enough
+            rounded = self._round_amount_by_trade_unit(deal_amount, factor)
+            min_cash = trade_val + np.maximum(trade_val * cost_ratio, self.min_cost)
+        else:
+            current = np.where(pos.held[idx], pos.amount[idx], 0.0)
+            rounded = np.where(
+                np.isclose(deal_amount, current),
+                deal_amount,
+                self._round_amount_by_trade_unit(np.minimum(current, deal_amount), factor),
+            )
+            trade_val = rounded * price
+            min_cash = np.maximum(trade_val * cost_ratio, self.min_cost) - trade_val
+
+        final = rounded.copy()
+        cash_delta = np.zeros(len(idx))
+        cash, start = pos.cash, 0
+        while True:
+            val = final[start:] * price[start:]
+            cost = np.where(val <= 1e-5, 0.0, np.maximum(val * cost_ratio[start:], self.min_cost))
+            # nothing is updated if the dealt value is zero
+            cash_delta[start:] = np.where(val > 1e-5, -(val + cost) if buy else val - cost, 0.0)
+            cash_before = np.cumsum(np.r_[cash, cash_delta[start:]])[:-1]
+            short = np.flatnonzero(cash_before < min_cash[start:])
+            if len(short) == 0:
+                break
+            i = start + short[0]
+            cash = cash_before[short[0]]
+            if not buy or cash < max(trade_val[i] * cost_ratio[i], self.min_cost):
+                # the cash can't cover the cost
+                final[i] = 0.0
+            else:
+                max_buy_amount = self._get_buy_amount_by_cash_limit(price[i], cash, cost_ratio[i])
+                final[i] = self._round_amount_by_trade_unit(min(max_buy_amount, deal_amount[i]), factor[i])
+            val_i = final[i] * price[i]
+            cost_i = 0.0 if val_i <= 1e-5 else max(val_i * cost_ratio[i], self.min_cost)
+            cash_delta[i] = (-(val_i + cost_i) if buy else val_i - cost_i) if val_i > 1e-5 else 0.0
+            cash += cash_delta[i]
+            start = i + 1
+            if start == len(idx):
+                break
+
+        trade_val = final * price
+        trade_cost = np.where(trade_val <= 1e-5, 0.0, np.maximum(trade_val * cost_ratio, self.min_cost))
+        dealt = trade_val > 1e-5
+        pos.cash = np.cumsum(np.r_[pos.cash, cash_delta])[-1]
+        pos.cost = np.cumsum(np.r_[pos.cost, trade_cost[dealt]])[-1]
+        pos.turnover = np.cumsum(np.r_[pos.turnover, trade_val[dealt]])[-1]
+
+        # update the stocks, please refer to `Position.update_order`
+        idx, trade_amount = idx[dealt], trade_val[dealt] / price[dealt]
+        if buy:
+            new = ~pos.held[idx]
+            pos.amount[idx] = np.where(new, trade_amount, pos.amount[idx] + trade_amount)
+            pos.price[idx[new]] = price[dealt][new]
+            pos.count[idx[new]] = 0
+            pos.held[idx] = True
+        else:
+            sold_out = np.isclose(pos.amount[idx], trade_amount)
+            pos.amount[idx] = np.where(sold_out, 0.0, pos.amount[idx] - trade_amount)
+            pos.held[idx[sold_out]] = False
+        return final, price, trade_val, trade_cost
+
+    def _execute(
+        self, quote: dict, r: int, pos: _ArrayPosition, sell: Tuple[np.ndarray, np.ndarray], buy: Tuple[np.ndarray, ...]
+    ) -> List[tuple]:
+        """execute the sell orders and the buy orders like `SimulatorExecutor` and return the trade info of them"""
+        info = []
+        steps = [(sell, False), (buy, True)]
+        if self.trade_type == "parallel":
+            # the buying goes first, please refer to `SimulatorExecutor._get_order_iterator`
+            steps = steps[::-1]
+        for (idx, amount), is_buy in steps:
+            if len(idx) > 0:
+                res = self._deal_orders(quote, r, pos, idx, amount, is_buy)
+                info.append((idx, amount, *res, np.full(len(idx), OrderDir.BUY if is_buy else OrderDir.SELL)))
+        return info
+
+    def _run(self, instruments: pd.Index, generate_orders) -> Tuple[PORT_METRIC, INDICATOR_METRIC]:
+        """run the backtest with `generate_orders(quote, r, pos)` that returns the sell orders and the buy orders"""
+        quote = self._get_quote(instruments)
+        pos = _ArrayPosition(len(instruments), self.init_cash)
+        for code, (amount, price) in self.init_stocks.items():
+            i = instruments.get_loc(code)
+            pos.held[i], pos.amount[i], pos.price[i] = True, amount, price
+
+        portfolio_metrics = PortfolioMetrics("day", {"benchmark": self.bench})
+        hist_positions = {}
+        indicator = Indicator()
+        if self.bench is not None:
+            bench_time = pd.DatetimeIndex(self.bench.index)
+            bench_values = self.bench.values
+
+        for step, (trade_start_time, trade_end_time) in enumerate(zip(self.trade_times, self.trade_end_times)):
+            r = step + 1
+            sell, buy = generate_orders(quote, r, pos)
+            info = self._execute(quote, r, pos, sell, buy)
+
+            # update the position at the bar end, please refer to `Account.update_current_position`
+            updated = pos.held & ~quote["suspended"][r]
+            pos.price[updated] = quote["close"][r, updated]
+            pos.count[pos.held] += 1
+
+            if self.generate_portfolio_metrics:
+                if portfolio_metrics.is_empty():
+                    last_account_value, last_total_cost, last_total_turnover = self.init_cash, 0, 0
+                else:
+                    last_account_value = portfolio_metrics.get_latest_account_value()
+                    last_total_cost = portfolio_metrics.get_latest_total_cost()
+                    last_total_turnover = portfolio_metrics.get_latest_total_turnover()
+                stock_value = pos.calculate_stock_value()
+                account_value = stock_value + pos.cash
+                now_cost = pos.cost - last_total_cost
+                if self.bench is None:
+                    bench_value = None
+                else:
+                    # please refer to `PortfolioMetrics._sample_benchmark`
+                    lo = bench_time.searchsorted(trade_start_time, side="left")
+                    hi = bench_time.searchsorted(trade_end_time, side="right")
+                    bench_value = np.nanprod(bench_values[lo:hi] + 1) - 1 if hi > lo else 0.0
+                portfolio_metrics.update_portfolio_metrics_record(
+                    trade_start_time=trade_start_time,
+                    trade_end_time=trade_end_time,
+                    account_value=account_value,
+                    cash=pos.cash,
+                    return_rate=(account_value - last_account_value + now_cost) / last_account_value,
+                    total_turnover=pos.turnover,
+                    turnover_rate=(pos.turnover - last_total_turnover) / last_account_value,
+                    total_cost=pos.cost,
+                    cost_rate=now_cost / last_account_value,
+                    stock_value=stock_value,
+                    bench_value=bench_value,
+                )
+                hist_positions[trade_start_time] = self._get_position(instruments, pos, account_value)
+
+            indicator.reset()
+            info = [np.concatenate(v) for v in zip(*info)] if len(info) > 0 else [np.array([])] * 7
+            indicator.update_order_indicators_by_array(instruments[info[0].astype(int)], *info[1:])
+            indicator.cal_trade_indicators(trade_start_time, "day", self.indicator_config)
+            indicator.record(trade_start_time)
+
+        portfolio_dict: PORT_METRIC = {}
+        if self.generate_portfolio_metrics:
+            portfolio_dict["1day"] = (portfolio_metrics.generate_portfolio_metrics_dataframe(), hist_positions)
+        indicator_dict: INDICATOR_METRIC = {"1day": (indicator.generate_trade_indicators_dataframe(), indicator)}
+        return portfolio_dict, indicator_dict
+
+    def _get_position(self, instruments: pd.Index, pos: _ArrayPosition, account_value: float) -> Position:
+        """create the `Position` of the historical positions"""
+        idx = np.flatnonzero(pos.held)
+        amount, price, count = pos.amount[idx], pos.price[idx], pos.count[idx]
+        weight = amount * price / account_value
+        position_dict = {
+            code: {"amount": a, "price": p, "weight": w, "count_day": c}
+            for code, a, p, w, c in zip(
+                instruments[idx], amount.tolist(), price.tolist(), weight.tolist(), count.tolist()
+            )
+        }
+        position = Position(cash=pos.cash, position_dict=position_dict)
+        position.init_cash = self.init_cash
+        position.position["now_account_value"] = account_value
+        return position
+
+    def run_topk_dropout(
+        self,
+        signal: Union[Signal, pd.Series, pd.DataFrame],
+        topk: int,
+        n_drop: int,
+        method_sell: str = "bottom",
+        method_buy: str = "top",
+        hold_thresh: int = 1,
+        only_tradable: bool = False,
+        forbid_all_trade_at_limit: bool = True,
+        risk_degree: float = 0.95,
+    ) -> Tuple[PORT_METRIC, INDICATOR_METRIC]:
+        """
+        backtest `TopkDropoutStrategy`, please refer to its docs for the parameters
+
+        Only the deterministic methods ("bottom" for `method_sell` and "top" for `method_buy`) are supported. The
+        NaN values of the signal are ignored.
+        """
+        if method_sell != "bottom" or method_buy != "top":
+            raise NotImplementedError(f"Only the `bottom` and `top` methods are supported")
+        sig = signal.signal_cache if isinstance(signal, SignalWCache) else signal
+        instruments = self._get_instruments(pd.Index(sig.index.get_level_values("instrument").unique()))
+        score = self._pivot_signal(signal, instruments)
+
+        def generate_orders(quote: dict, r: int, pos: _ArrayPosition):
+            empty = (np.array([], dtype=int), np.array([]))
+            s = score[r - 1]
+            if np.isnan(s).all():
+                return empty, empty
+            tradable = quote["tradable"][r]
+
+            def get_first_n(li: np.ndarray, n: int) -> np.ndarray:
+                if only_tradable:
+                    li = li[tradable[li]]
+                    return li[: max(n, 1)]
+                return li[:n]
+
+            def get_last_n(li: np.ndarray, n: int) -> np.ndarray:
+                if only_tradable:
+                    li = li[tradable[li]]
+                    return li[max(len(li) - max(n, 1), 0) :]
+                return li[-n:]
+
+            last = np.flatnonzero(pos.held)
+            # the new stocks today want to buy **at most**
+            candi = np.flatnonzero(~np.isnan(s) & ~pos.held)
+            today = get_first_n(candi[np.argsort(-s[candi], kind="stable")], n_drop + topk - len(last))
+            # combine(new stocks + last stocks), NaN scores are the last ones
+            comb = np.union1d(last, today)
+            comb = comb[np.argsort(-s[comb], kind="stable")]
+            sell = last[np.isin(last, get_last_n(comb, n_drop))]
+            buy = today[: len(sell) + topk - len(last)]
+
+            sell_tradable = tradable if forbid_all_trade_at_limit else quote["tradable_sell"][r]
+            sell = sell[sell_tradable[sell] & quote["tradable_sell"][r, sell] & (pos.count[sell] >= hold_thresh)]
+            sell = (sell, pos.amount[sell])
+            # estimate the cash after selling
+            temp = pos.copy()
+            if len(sell[0]) > 0:
+                self._deal_orders(quote, r, temp, *sell, buy=False)
+            value = temp.cash * risk_degree / len(buy) if len(buy) > 0 else 0
+            buy = buy[(tradable if forbid_all_trade_at_limit else quote["tradable_buy"][r])[buy]]
+            buy_amount = self._round_amount_by_trade_unit(value / quote["buy_price"][r, buy], quote["$factor"][r, buy])
+            return sell, (buy, buy_amount)
+
+        return self._run(instruments, generate_orders)
+
+    def run_target_weight(
+        self, weight: Union[Signal, pd.Series, pd.DataFrame], risk_degree: float = 0.95
+    ) -> Tuple[PORT_METRIC, INDICATOR_METRIC]:
+        """
+        backtest the target weights like `WeightStrategyBase` with `OrderGenWOInteract`
+
+        Parameters
+        ----------
+        weight : Union[Signal, pd.Series, pd.DataFrame]
+            the target weight of the stocks, it is used like the signal of `WeightStrategyBase`, i.e. the weights at
+            the previous step are the target of the current step. The NaN values are ignored.
+        risk_degree : float
+            position percentage of total value
+        """
+        sig = weight.signal_cache if isinstance(weight, SignalWCache) else weight
+        instruments = self._get_instruments(pd.Index(sig.index.get_level_values("instrument").unique()))
+        target_weight = self._pivot_signal(weight, instruments)
+        perms: Dict[int, np.ndarray] = {}
+
+        def generate_orders(quote: dict, r: int, pos: _ArrayPosition):
+            empty = (np.array([], dtype=int), np.array([]))
+            w = target_weight[r - 1]
+            if np.isnan(w).all():
+                return empty, empty
+            # please refer to `OrderGenWOInteract.generate_order_list_from_target_weight_position`
+            risk_total_value = risk_degree * (pos.calculate_stock_value() + pos.cash)
+            tradable = quote["tradable"][r]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                target = np.where(
+                    tradable & quote["tradable"][r - 1],
+                    risk_total_value * w / quote["close"][r - 1],
+                    np.where(pos.held, risk_total_value * w / pos.price, np.nan),
+                )
+            target = np.where(pos.held, np.nan_to_num(target), target)
+
+            # please refer to `Exchange.generate_order_for_target_amount_position`
+            ids = np.flatnonzero(~np.isnan(target))
+            if len(ids) not in perms:
+                perm = list(range(len(ids)))
+                random.Random(0).shuffle(perm)
+                perms[len(ids)] = np.array(perm, dtype=int)
+            ids = ids[perms[len(ids)]]
+            ids = ids[tradable[ids]]
+            target, current, factor = target[ids], pos.amount[ids], quote["$factor"][r, ids]
+            deal_amount = np.where(
+                current < target,
+                self._round_amount_by_trade_unit(target - current, factor),
+                np.where(target == 0, -current, -self._round_amount_by_trade_unit(current - target, factor)),
+            )
+            deal_amount[current == target] = 0
+            sell, buy = deal_amount < 0, deal_amount > 0
+            return (ids[sell], -deal_amount[sell]), (ids[buy], deal_amount[buy])
+
+        return self._run(instruments, generate_orders)
+
+
+def vectorized_backtest(
+    start_time: Union[pd.Timestamp, str],
+    end_time: Union[pd.Timestamp, str],
+    strategy: Union[str, dict, object, Path],
+    executor: Union[str, dict, object, Path],
+    benchmark: str = "SH000300",
+    account: Union[float, int, dict] = 1e9,
+    exchange_kwargs: dict = {},
+) -> Tuple[PORT_METRIC, INDICATOR_METRIC]:
+    """
+    the same as `backtest`, but the backtest is run by `VectorizedBacktest`
+
+    The strategy must be a `TopkDropoutStrategy` and the executor must be a daily `SimulatorExecutor`. Please refer to
+    the docs of `backtest` for the parameters.
+    """
+    # NOTE: for avoiding recursive import
+    from ..contrib.strategy.signal_strategy import TopkDropoutStrategy  # pylint: disable=C0415
+    from . import get_exchange  # pylint: disable=C0415
+    from .executor import BaseExecutor, SimulatorExecutor  # pylint: disable=C0415
+    from .position import BasePosition  # pylint: disable=C0415
+
+    strategy = init_instance_by_config(strategy)
+    executor = init_instance_by_config(executor, accept_types=BaseExecutor)
+    if type(strategy) is not TopkDropoutStrategy:  # pylint: disable=C0123
+        raise NotImplementedError(f"Only TopkDropoutStrategy is supported, {type(strategy)} given")
+    if (
+        type(executor) is not SimulatorExecutor  # pylint: disable=C0123
+        or Freq.parse(executor.time_per_step) != (1, Freq.NORM_FREQ_DAY)
+        or executor._settle_type != BasePosition.ST_NO
+    ):
+        raise NotImplementedError(f"Only the daily SimulatorExecutor without settlement is supported")
+
+    exchange_kwargs = copy.copy(exchange_kwargs)
+    exchange_kwargs.setdefault("start_time", start_time)
+    exchange_kwargs.setdefault("end_time", end_time)
+    engine = VectorizedBacktest(
+        get_exchange(**exchange_kwargs),
+        start_time,
+        end_time,
+        benchmark=benchmark,
+        account=account,
+        trade_type=executor.trade_type,
+        generate_portfolio_metrics=executor.generate_portfolio_metrics,
+        indicator_config=executor.indicator_config,
+    )
+    return engine.run_topk_dropout(
+        strategy.signal,
+        topk=strategy.topk,
+        n_drop=strategy.n_drop,
+        method_sell=strategy.method_sell,
+        method_buy=strategy.method_buy,
+        hold_thresh=strategy.hold_thresh,
+        only_tradable=strategy.only_tradable,
+        forbid_all_trade_at_limit=strategy.forbid_all_trade_at_limit,
+        risk_degree=strategy.get_risk_degree(),
+    )
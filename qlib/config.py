@@ -124,6 +124,16 @@ _default_config = {
     "calendar_cache": None,
     # for simple dataset cache
     "local_cache_path": None,
+    # The dtype of the expressions calculated by `D.features` (e.g. "float64" for a higher precision, the data in the
+    # `.bin` files are stored as float32)
+    "expression_dtype": "float32",
+    # The disk cache of the processed handler data (`setup_data(enable_cache=True)`), "<local_cache_path>/handler_cache"
+    # (or "~/.cache/qlib_handler_cache") by default. The least recently used data are evicted when the total bytes exceed
+    # `handler_cache_size_limit`, 0 means no limit.
+    "handler_cache_path": None,
+    "handler_cache_size_limit": 0,
+    # Compress the data of the handler cache by zlib, which saves the disk space but costs more time to load
+    "handler_cache_compress": False,
     # kernels can be a fixed value or a callable function lie `def (freq: str) -> int`
     # If the kernels are arctic_kernels, `min(NUM_USABLE_CPU, 30)` may be a good value
     "kernels": NUM_USABLE_CPU,
@@ -134,11 +144,24 @@ _default_config = {
     # If joblib_backend is None, use loky
     "joblib_backend": "multiprocessing",
     "default_disk_cache": 1,  # 0:skip/1:use
+    # The size limit of each unit of the memory cache `H`, 0 means no limit. The unit of the limit depends on
+    # `mem_cache_limit_type`: "length" (the number of items), "sizeof" (`sys.getsizeof`) or "nbytes" (the bytes of the
+    # data, e.g. `"mem_cache_size_limit": 8 * 1024**3` with "nbytes" limits the cache to about 8GB).
     "mem_cache_size_limit": 500,
     "mem_cache_limit_type": "length",
+    # The eviction policy of the memory cache: "lru", "lfu" or "arc"
+    "mem_cache_policy": "lru",
     # memory cache expire second, only in used 'DatasetURICache' and 'client D.calendar'
     # default 1 hour
     "mem_cache_expire": 60 * 60,
+    # Share the data of the expressions with the sub-processes (e.g. the workers of `dataset_processor`), so they can
+    # reuse the results calculated by each other. Accepted values:
+    # - None/False: disabled
+    # - True: a temporary directory (on /dev/shm if available) is created by `qlib.init` and removed at exit
+    # - str: the directory of the shared cache, which should be on a memory file system
+    "shared_mem_cache": None,
+    # The max total bytes of the files in the shared memory cache, the oldest files are removed beyond it. 0 means no limit
+    "shared_mem_cache_size_limit": 2 * 1024**3,
     # cache dir name
     "dataset_cache_dir_name": "dataset_cache",
     "features_cache_dir_name": "features_cache",
@@ -148,6 +171,10 @@ _default_config = {
     "redis_port": 6379,
     "redis_task_db": 1,
     "redis_password": None,
+    # The locks of the disk caches (DiskExpressionCache and DiskDatasetCache):
+    # - "redis": the locks are kept in the redis server, the caches are disabled if it is not reachable
+    # - "file": the locks are local files, which are shared by the processes on the same host without redis
+    "disk_cache_lock": "redis",
     # This value can be reset via qlib.init
     "logging_level": logging.INFO,
     # Global configuration of qlib log
@@ -425,7 +452,10 @@ class QlibConfig(Config):
 
         self.resolve_path()
 
-        if not (self["expression_cache"] is None and self["dataset_cache"] is None):
+        if (
+            not (self["expression_cache"] is None and self["dataset_cache"] is None)
+            and self["disk_cache_lock"] == "redis"
+        ):
             # check redis
             if not can_use_cache():
                 log_str = ""
@@ -440,18 +470,21 @@ class QlibConfig(Config):
                 if log_str:
                     logger.warning(
                         f"redis connection failed(host={self['redis_host']} port={self['redis_port']}), "
-                        f"{log_str} will not be used!"
+                        f"{log_str} will not be used! Set `disk_cache_lock='file'` to use them without redis."
                     )
 
     def register(self):
         from .utils import init_instance_by_config  # pylint: disable=C0415
         from .data.ops import register_all_ops  # pylint: disable=C0415
         from .data.data import register_all_wrappers  # pylint: disable=C0415
+        from .data.cache import H  # pylint: disable=C0415
         from .workflow import R, QlibRecorder  # pylint: disable=C0415
         from .workflow.utils import experiment_exit_handler  # pylint: disable=C0415
 
         register_all_ops(self)
         register_all_wrappers(self)
+        H.reset(self["mem_cache_size_limit"], self["mem_cache_limit_type"], self["mem_cache_policy"])
+        H.set_shared_cache(self["shared_mem_cache"] or None)
         # set up QlibRecorder
         exp_manager = init_instance_by_config(self["exp_manager"])
         qr = QlibRecorder(exp_manager)
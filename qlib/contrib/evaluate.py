@@ -7,13 +7,18 @@ from __future__ import print_function
 import numpy as np
 import pandas as pd
 import warnings
-from typing import Union
+from itertools import product
+from typing import List, Union
+
+from joblib import delayed
 
 from ..log import get_module_logger
-from ..utils import get_date_range
+from ..utils import get_date_range, flatten_dict
+from ..utils.paral import ParallelExt
 from ..utils.resam import Freq
 from ..strategy.base import BaseStrategy
 from ..backtest import get_exchange, position, backtest as backtest_func, executor as _executor
+from ..backtest.vectorized import VectorizedBacktest
 
 
 from ..data import D
@@ -258,6 +263,101 @@ def backtest_daily(
     return report_normal, positions_normal
 
 
+def _run_sweep_config(engine: VectorizedBacktest, signal: pd.Series, params: dict) -> dict:
+    """run the backtest of one config of `backtest_sweep` and summarize it like `PortAnaRecord`"""
+    replaced = {k: v for k, v in params.items() if k in VectorizedBacktest.REPLACEABLE}
+    strategy_kwargs = {k: v for k, v in params.items() if k not in VectorizedBacktest.REPLACEABLE}
+    portfolio_metric_dict, indicator_dict = engine.replace(**replaced).run_topk_dropout(signal, **strategy_kwargs)
+    report, _ = portfolio_metric_dict["1day"]
+    analysis = {
+        "excess_return_without_cost": risk_analysis(report["return"] - report["bench"], freq="day"),
+        "excess_return_with_cost": risk_analysis(report["return"] - report["bench"] - report["cost"], freq="day"),
+    }
+    res = flatten_dict({key: df["risk"].to_dict() for key, df in analysis.items()})
+    res["turnover"] = report["turnover"].mean()
+    res.update(indicator_analysis(indicator_dict["1day"][0])["value"].to_dict())
+    return res
+
+
+def backtest_sweep(
+    signal: Union[pd.Series, pd.DataFrame],
+    param_grid: Union[dict, List[dict]],
+    start_time: Union[str, pd.Timestamp],
+    end_time: Union[str, pd.Timestamp],
+    account: Union[float, int, dict] = 1e8,
+    benchmark: str = "SH000300",
+    exchange_kwargs: dict = None,
+    n_jobs: int = None,
+) -> pd.DataFrame:
+    """backtest `TopkDropoutStrategy` with a daily `SimulatorExecutor` for a grid of configs in parallel
+
+    The quote is loaded and aligned only once by `VectorizedBacktest`, and the engine is shared by the processes of
+    joblib (its arrays are passed by memmaps), so each config only pays for its own simulation.
+
+    Parameters
+    ----------
+    signal : Union[pd.Series, pd.DataFrame]
+        the prediction scores of `TopkDropoutStrategy`
+    param_grid : Union[dict, List[dict]]
+        the configs to backtest, a dict of `{name: [values]}` for all the combinations of the values (or a list of
+        such dicts). The names can be
+
+        - the arguments of `TopkDropoutStrategy` (e.g. topk, n_drop, hold_thresh, risk_degree) other than the signal;
+          only the "bottom" `method_sell` and the "top" `method_buy` are supported
+        - `VectorizedBacktest.REPLACEABLE`, i.e. the costs, `trade_unit` and `limit_threshold` (None for no
+          limitation) of the exchange and the `trade_type` of the executor
+
+        E.g.
+
+        .. code-block:: python
+
+            param_grid = {"topk": [30, 50], "n_drop": [3, 5], "open_cost": [0.0005, 0.001]}
+    account : Union[float, int, dict]
+        information for describing how to create the account
+    benchmark : str
+        the benchmark for reporting.
+    exchange_kwargs : dict
+        the kwargs for initializing Exchange, the same as `backtest_daily`
+    n_jobs : int
+        the number of the processes, `C.kernels` will be used if it is None
+
+    Returns
+    -------
+    pd.DataFrame
+        one row for each config, the columns are the parameters of the configs and the analysis of the backtest
+        (e.g. "excess_return_with_cost.information_ratio", "turnover", "ffr")
+    """
+    if isinstance(param_grid, dict):
+        param_grid = [param_grid]
+    configs = []
+    for grid in param_grid:
+        keys = list(grid)
+        configs.extend(dict(zip(keys, values)) for values in product(*(grid[k] for k in keys)))
+
+    _exchange_kwargs = {
+        "freq": "day",
+        "limit_threshold": None,
+        "deal_price": None,
+        "open_cost": 0.0005,
+        "close_cost": 0.0015,
+        "min_cost": 5,
+        "start_time": start_time,
+        "end_time": end_time,
+    }
+    if exchange_kwargs is not None:
+        _exchange_kwargs.update(exchange_kwargs)
+    engine = VectorizedBacktest(get_exchange(**_exchange_kwargs), start_time, end_time, benchmark, account)
+
+    n_jobs = C.get_kernels("day") if n_jobs is None else n_jobs
+    if n_jobs == 1 or len(configs) <= 1:
+        res_l = [_run_sweep_config(engine, signal, params) for params in configs]
+    else:
+        res_l = ParallelExt(n_jobs=n_jobs, backend=C.joblib_backend, maxtasksperchild=C.maxtasksperchild)(
+            delayed(_run_sweep_config)(engine, signal, params) for params in configs
+        )
+    return pd.concat([pd.DataFrame(configs), pd.DataFrame(res_l)], axis=1)
+
+
 def long_short_backtest(
     pred,
     topk=50,
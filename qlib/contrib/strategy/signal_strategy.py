@@ -13,7 +13,7 @@ from qlib.data import D
 from qlib.data.dataset import Dataset
 from qlib.model.base import BaseModel
 from qlib.strategy.base import BaseStrategy
-from qlib.backtest.position import Position
+from qlib.backtest.position import ArrayPosition, Position
 from qlib.backtest.signal import Signal, create_signal_from
 from qlib.backtest.decision import Order, OrderDir, TradeDecisionWO
 from qlib.log import get_module_logger
@@ -354,7 +354,7 @@ class WeightStrategyBase(BaseSignalStrategy):
         if pred_score is None:
             return TradeDecisionWO([], self)
         current_temp = copy.deepcopy(self.trade_position)
-        assert isinstance(current_temp, Position)  # Avoid InfPosition
+        assert isinstance(current_temp, (Position, ArrayPosition))  # Avoid InfPosition
 
         target_weight_position = self.generate_target_weight_position(
             score=pred_score, current=current_temp, trade_start_time=trade_start_time, trade_end_time=trade_end_time
@@ -127,6 +127,51 @@ cdef class Rsquare(Expanding):
         return rvalue * rvalue
 
 
+cdef class WMA(Expanding):
+    """1-D array expanding weighted moving average"""
+    cdef double wsum
+    def __init__(self):
+        super(WMA, self).__init__()
+        self.wsum = 0
+
+    cdef double update(self, double val):
+        self.barv.push_back(val)
+        cdef size_t size = self.barv.size()
+        if isnan(val):
+            self.na_count += 1
+        else:
+            self.wsum += size * val
+        return self.wsum / (size * (size + 1) / 2.0 * (size - self.na_count))
+
+
+cdef class EMA(Expanding):
+    """1-D array expanding exponential moving average
+
+    The span of the weights is the length of the expanding window, so the weights of all the history are changed
+    by each new value and the sum has to be recalculated (in O(size) by Horner's method).
+    """
+    def __init__(self):
+        super(EMA, self).__init__()
+
+    cdef double update(self, double val):
+        self.barv.push_back(val)
+        if isnan(val):
+            self.na_count += 1
+        cdef size_t size = self.barv.size()
+        if size == self.na_count:
+            return NAN
+        cdef double alpha = 1 - 2.0 / (1 + size)
+        cdef double vsum = 0
+        cdef double wsum = 0
+        cdef double _val
+        for _val in self.barv:
+            vsum *= alpha
+            wsum = wsum * alpha + 1
+            if not isnan(_val):
+                vsum += _val
+        return vsum / wsum
+
+
 cdef np.ndarray[double, ndim=1] expanding(Expanding r, np.ndarray a):
     cdef int  i
     cdef int  N = len(a)
@@ -150,3 +195,11 @@ def expanding_rsquare(np.ndarray a):
 def expanding_resi(np.ndarray a):
     cdef Resi r = Resi()
     return expanding(r, a)
+
+def expanding_wma(np.ndarray a):
+    cdef WMA r = WMA()
+    return expanding(r, a)
+
+def expanding_ema(np.ndarray a):
+    cdef EMA r = EMA()
+    return expanding(r, a)
@@ -4,8 +4,9 @@ cimport cython
 cimport numpy as np
 import numpy as np
 
-from libc.math cimport sqrt, isnan, NAN
+from libc.math cimport sqrt, floor, isnan, NAN
 from libcpp.deque cimport deque
+from libcpp.vector cimport vector
 
 
 cdef class Rolling:
@@ -181,7 +182,176 @@ cdef class Rsquare(Rolling):
             sqrt((N*self.x2_sum - self.x_sum*self.x_sum) * (N*self.y2_sum - self.y_sum*self.y_sum))
         return rvalue * rvalue
 
-    
+
+
+cdef class WMA(Rolling):
+    """1-D array rolling weighted moving average
+
+    The i-th valid value of the window has the weight i, the result is the mean of the weighted valid values.
+    """
+    cdef int size
+    cdef double vsum
+    cdef double wsum
+    def __init__(self, int window):
+        super(WMA, self).__init__(window)
+        self.size = 0
+        self.vsum = 0
+        self.wsum = 0
+
+    cdef double update(self, double val):
+        self.barv.push_back(val)
+        cdef double _val = self.barv.front()
+        if self.size < self.window:
+            # the window is not full, the weights of the values in the window are unchanged
+            self.size += 1
+        else:
+            # the weight of each value in the window decreases by 1
+            self.wsum -= self.vsum
+            if not isnan(_val):
+                self.vsum -= _val
+        if isnan(_val):
+            self.na_count -= 1
+        self.barv.pop_front()
+        if isnan(val):
+            self.na_count += 1
+        else:
+            self.vsum += val
+            self.wsum += self.size * val
+        return self.wsum / (self.size * (self.size + 1) / 2.0 * (self.window - self.na_count))
+
+
+cdef class OrderedWindow:
+    """The valid values in the rolling window of a 1-D array, supporting order statistics in O(log n)
+
+    The values are indexed by their ranks in the whole array. Two Fenwick trees keep the count and the sum of the
+    values in the window for each rank.
+    """
+    cdef vector[double] values  # the sorted unique values of the array
+    cdef vector[int] cnt_tree
+    cdef vector[double] sum_tree
+    cdef int n
+    cdef int top
+    cdef int count
+    cdef double total
+    def __init__(self, np.ndarray values):
+        cdef double v
+        for v in values:
+            self.values.push_back(v)
+        self.n = len(values)
+        self.cnt_tree.resize(self.n + 1, 0)
+        self.sum_tree.resize(self.n + 1, 0)
+        self.top = 1
+        while self.top * 2 <= self.n:
+            self.top *= 2
+        self.count = 0
+        self.total = 0
+
+    cdef void add(self, int rank, int sign):
+        cdef double val = self.values[rank]
+        self.count += sign
+        self.total += sign * val
+        rank += 1
+        while rank <= self.n:
+            self.cnt_tree[rank] += sign
+            self.sum_tree[rank] += sign * val
+            rank += rank & (-rank)
+
+    cdef int count_lt(self, int rank):
+        """the count of the values with rank less than `rank`"""
+        cdef int ret = 0
+        while rank > 0:
+            ret += self.cnt_tree[rank]
+            rank -= rank & (-rank)
+        return ret
+
+    cdef double sum_lt(self, int rank):
+        """the sum of the values with rank less than `rank`"""
+        cdef double ret = 0
+        while rank > 0:
+            ret += self.sum_tree[rank]
+            rank -= rank & (-rank)
+        return ret
+
+    cdef double kth(self, int k):
+        """the k-th (0-based) smallest value in the window"""
+        cdef int pos = 0
+        cdef int step = self.top
+        while step > 0:
+            if pos + step <= self.n and self.cnt_tree[pos + step] <= k:
+                pos += step
+                k -= self.cnt_tree[pos]
+            step //= 2
+        return self.values[pos]
+
+    cdef int upper_bound(self, double val):
+        """the count of the unique values not greater than `val`"""
+        cdef int lo = 0
+        cdef int hi = self.n
+        cdef int mid
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.values[mid] <= val:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+
+cdef double rank_pct(OrderedWindow w, int rank):
+    # the average rank of the ties divided by the count, the same as `pandas.Series.rank(pct=True)`
+    cdef int lt = w.count_lt(rank)
+    cdef int le = w.count_lt(rank + 1)
+    return (lt + le + 1) / (2.0 * w.count)
+
+
+cdef double mad(OrderedWindow w):
+    cdef double mean, lo_sum
+    cdef int lo_count
+    if w.kth(0) == w.kth(w.count - 1):
+        # avoid the rounding error when all the values are the same
+        return 0
+    mean = w.total / w.count
+    lo_count = w.upper_bound(mean)
+    lo_sum = w.sum_lt(lo_count)
+    lo_count = w.count_lt(lo_count)
+    return (mean * lo_count - lo_sum + (w.total - lo_sum) - mean * (w.count - lo_count)) / w.count
+
+
+cdef double quantile(OrderedWindow w, double qscore):
+    # linear interpolation, the same as `pandas.Series.quantile`
+    cdef double idx = qscore * (w.count - 1)
+    cdef int lo = <int>floor(idx)
+    cdef double vlow = w.kth(lo)
+    if idx == lo:
+        return vlow
+    return vlow + (w.kth(lo + 1) - vlow) * (idx - lo)
+
+
+cdef np.ndarray[double, ndim=1] rolling_order(np.ndarray a, int window, int stat, double qscore):
+    cdef np.ndarray[double, ndim=1] x = np.asarray(a, dtype=np.float64)
+    cdef np.ndarray[np.uint8_t, ndim=1, cast=True] na = np.isnan(x)
+    cdef np.ndarray values = np.unique(x[~na])
+    cdef np.ndarray[np.int64_t, ndim=1] ranks = np.searchsorted(values, x).astype(np.int64)
+    cdef OrderedWindow w = OrderedWindow(values)
+    cdef int i
+    cdef int N = len(x)
+    cdef np.ndarray[double, ndim=1] ret = np.empty(N)
+    for i in range(N):
+        if i >= window and not na[i - window]:
+            w.add(ranks[i - window], -1)
+        if not na[i]:
+            w.add(ranks[i], 1)
+        if w.count == 0:
+            ret[i] = NAN
+        elif stat == 0:
+            ret[i] = NAN if na[i] else rank_pct(w, ranks[i])
+        elif stat == 1:
+            ret[i] = mad(w)
+        else:
+            ret[i] = quantile(w, qscore)
+    return ret
+
+
 cdef np.ndarray[double, ndim=1] rolling(Rolling r, np.ndarray a):
     cdef int  i
     cdef int  N = len(a)
@@ -205,3 +375,16 @@ def rolling_rsquare(np.ndarray a, int window):
 def rolling_resi(np.ndarray a, int window):
     cdef Resi r = Resi(window)
     return rolling(r, a)
+
+def rolling_wma(np.ndarray a, int window):
+    cdef WMA r = WMA(window)
+    return rolling(r, a)
+
+def rolling_rank(np.ndarray a, int window):
+    return rolling_order(a, window, 0, 0)
+
+def rolling_mad(np.ndarray a, int window):
+    return rolling_order(a, window, 1, 0)
+
+def rolling_quantile(np.ndarray a, int window, double qscore):
+    return rolling_order(a, window, 2, qscore)
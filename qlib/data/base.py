@@ -6,10 +6,49 @@ from __future__ import division
 from __future__ import print_function
 
 import abc
+import numpy as np
 import pandas as pd
 from ..log import get_module_logger
 
 
+class InstrumentPanel(tuple):
+    """A group of instruments whose expressions are calculated together on a (time x instrument) panel
+
+    The rows of a panel cover the history of all the instruments, so some rows are out of the history of an
+    instrument. They are NaN in the loaded features, but operators may turn NaN into values (e.g. `$close > $open`
+    gives False). `history` is used to keep such values from leaking into the rolling windows of the instrument.
+
+    Parameters
+    ----------
+    instruments : Iterable[str]
+        the instruments in the group.
+    history : dict
+        instrument -> (first, last) calendar index of its data. An instrument without data is always out of history.
+        If `history` is None, all the rows are regarded as in the history.
+    """
+
+    def __new__(cls, instruments, history=None):
+        obj = super().__new__(cls, instruments)
+        obj.history = history
+        return obj
+
+    def history_mask(self, data: pd.DataFrame) -> np.ndarray:
+        """bool array with the same shape as `data`, True for the rows in the history of the instruments"""
+        if self.history is None:
+            return np.ones(data.shape, dtype=bool)
+        first, last = np.array([self.history.get(inst, (0, -1)) for inst in data.columns]).reshape(-1, 2).T
+        index = data.index.values.reshape(-1, 1)
+        return (index >= first) & (index <= last)
+
+    def mask(self, data: pd.DataFrame) -> pd.DataFrame:
+        """set the values out of the history of the instruments to NaN"""
+        if self.history is None:
+            return data
+        if data.dtypes.eq(bool).any():
+            data = data.astype(np.float64)
+        return data.where(self.history_mask(data))
+
+
 class Expression(abc.ABC):
     """
     Expression base class
@@ -139,7 +178,7 @@ class Expression(abc.ABC):
 
         return Or(other, self)
 
-    def load(self, instrument, start_index, end_index, *args):
+    def load(self, instrument, start_index, end_index, *args, shared: bool = False):
         """load  feature
         This function is responsible for loading feature/expression based on the expression engine.
 
@@ -157,8 +196,10 @@ class Expression(abc.ABC):
 
         Parameters
         ----------
-        instrument : str
+        instrument : Union[str, tuple]
             instrument code.
+            If a tuple of instrument codes is given, the expression is evaluated on a (time x instrument) panel and a
+            pd.DataFrame with one column for each instrument will be returned.
         start_index : str
             feature start index [in calendar].
         end_index : str
@@ -176,16 +217,20 @@ class Expression(abc.ABC):
                 This is used for query specific period.
                 The period is represented with int in Qlib. (e.g. 202001 may represent the first quarter in 2020)
 
+        shared : bool
+            look up and publish the result in the cache shared with other processes (see `SharedMemCache`). It is only
+            enabled for the root expressions of the queries, so the intermediate results are not shared.
+
         Returns
         ----------
-        pd.Series
+        Union[pd.Series, pd.DataFrame]
             feature series: The index of the series is the calendar index
         """
         from .cache import H  # pylint: disable=C0415
 
         # cache
         cache_key = str(self), instrument, start_index, end_index, *args
-        if cache_key in H["f"]:
+        if H["f"].contains(cache_key, shared=shared):
             return H["f"][cache_key]
         if start_index is not None and end_index is not None and start_index > end_index:
             raise ValueError("Invalid index range: {} {}".format(start_index, end_index))
@@ -198,8 +243,9 @@ class Expression(abc.ABC):
                 f"error info: {str(e)}"
             )
             raise
-        series.name = str(self)
-        H["f"][cache_key] = series
+        if isinstance(series, pd.Series):
+            series.name = str(self)
+        H["f"].set(cache_key, series, shared=shared)
         return series
 
     @abc.abstractmethod
@@ -254,6 +300,8 @@ class Feature(Expression):
         # load
         from .data import FeatureD  # pylint: disable=C0415
 
+        if isinstance(instrument, tuple):
+            return FeatureD.feature_panel(instrument, str(self), start_index, end_index, freq)
         return FeatureD.feature(instrument, str(self), start_index, end_index, freq)
 
     def get_longest_back_rolling(self):
@@ -270,6 +318,8 @@ class PFeature(Feature):
     def _load_internal(self, instrument, start_index, end_index, cur_time, period=None):
         from .data import PITD  # pylint: disable=C0415
 
+        if isinstance(instrument, tuple):
+            raise NotImplementedError("Point-in-time data can't be loaded as a panel")
         return PITD.period_feature(instrument, str(self), start_index, end_index, cur_time, period)
 
 
@@ -9,9 +9,14 @@ import os
 import sys
 import stat
 import time
+import atexit
+import shutil
 import pickle
+import hashlib
+import tempfile
 import traceback
 import redis_lock
+import filelock
 import contextlib
 import abc
 from pathlib import Path
@@ -20,6 +25,12 @@ import pandas as pd
 from typing import Union, Iterable
 from collections import OrderedDict
 
+try:
+    import fcntl
+except ImportError:
+    # fcntl is not available on Windows, an exclusive `filelock.FileLock` is used for both readers and writers
+    fcntl = None
+
 from ..config import C
 from ..utils import (
     hash_args,
@@ -40,37 +51,273 @@ class QlibCacheException(RuntimeError):
     pass
 
 
+class MemCachePolicy(abc.ABC):
+    """The eviction policy of a `MemCacheUnit`, which tracks the keys (and their sizes) in the unit"""
+
+    def __init__(self):
+        # the size limit of the unit, 0 means no limit
+        self.capacity = 0
+
+    @abc.abstractmethod
+    def insert(self, key, size):
+        """`key` is set (added or updated) in the unit"""
+
+    @abc.abstractmethod
+    def access(self, key):
+        """`key` is read from the unit"""
+
+    @abc.abstractmethod
+    def remove(self, key):
+        """`key` is removed from the unit explicitly"""
+
+    @abc.abstractmethod
+    def evict(self):
+        """stop tracking the next victim and return its key"""
+
+    @abc.abstractmethod
+    def clear(self):
+        pass
+
+
+class LRUPolicy(MemCachePolicy):
+    """Evict the least recently used key"""
+
+    def __init__(self):
+        super().__init__()
+        self.od = OrderedDict()
+
+    def insert(self, key, size):
+        self.od[key] = size
+        self.od.move_to_end(key)
+
+    def access(self, key):
+        self.od.move_to_end(key)
+
+    def remove(self, key):
+        self.od.pop(key, None)
+
+    def evict(self):
+        return self.od.popitem(last=False)[0]
+
+    def clear(self):
+        self.od.clear()
+
+
+class LFUPolicy(MemCachePolicy):
+    """Evict the least frequently used key; the least recently used one is evicted among the keys with the same
+    frequency"""
+
+    def __init__(self):
+        super().__init__()
+        self.freq = {}
+        # frequency -> the keys with the frequency, ordered by the recency
+        self.buckets = {}
+        self.min_freq = 0
+
+    def _move(self, key, freq):
+        old_freq = self.freq.get(key)
+        if old_freq is not None:
+            bucket = self.buckets[old_freq]
+            del bucket[key]
+            if not bucket:
+                del self.buckets[old_freq]
+        self.freq[key] = freq
+        self.buckets.setdefault(freq, OrderedDict())[key] = None
+
+    def insert(self, key, size):
+        freq = self.freq.get(key, 0) + 1
+        self._move(key, freq)
+        if freq == 1 or self.min_freq not in self.buckets:
+            self.min_freq = min(self.buckets)
+
+    def access(self, key):
+        freq = self.freq[key]
+        self._move(key, freq + 1)
+        if self.min_freq == freq and freq not in self.buckets:
+            self.min_freq = freq + 1
+
+    def remove(self, key):
+        freq = self.freq.pop(key, None)
+        if freq is not None:
+            bucket = self.buckets[freq]
+            del bucket[key]
+            if not bucket:
+                del self.buckets[freq]
+
+    def evict(self):
+        if self.min_freq not in self.buckets:
+            self.min_freq = min(self.buckets)
+        bucket = self.buckets[self.min_freq]
+        key, _ = bucket.popitem(last=False)
+        if not bucket:
+            del self.buckets[self.min_freq]
+        del self.freq[key]
+        return key
+
+    def clear(self):
+        self.freq.clear()
+        self.buckets.clear()
+        self.min_freq = 0
+
+
+class ARCPolicy(MemCachePolicy):
+    """Adaptive Replacement Cache (Megiddo & Modha, 2003) weighted by the sizes of the values.
+
+    The keys used once recently are kept in `t1` and the keys used at least twice are kept in `t2`. The ghost lists
+    `b1` and `b2` remember the keys recently evicted from them. A hit in a ghost list adapts `p`, the target size of
+    `t1`, so the cache balances between recency and frequency according to the workload.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.t1, self.t2, self.b1, self.b2 = OrderedDict(), OrderedDict(), OrderedDict(), OrderedDict()
+        self.sizes = {"t1": 0, "t2": 0, "b1": 0, "b2": 0}
+        self.p = 0
+
+    def _pop(self, name, key=None):
+        od = getattr(self, name)
+        if key is None:
+            key, size = od.popitem(last=False)
+        else:
+            size = od.pop(key)
+        self.sizes[name] -= size
+        return key, size
+
+    def _push(self, name, key, size):
+        getattr(self, name)[key] = size
+        self.sizes[name] += size
+
+    def _trim_ghosts(self):
+        if self.capacity <= 0:
+            return
+        while self.b1 and self.sizes["t1"] + self.sizes["b1"] > self.capacity:
+            self._pop("b1")
+        while self.b2 and sum(self.sizes.values()) > 2 * self.capacity:
+            self._pop("b2")
+
+    def insert(self, key, size):
+        if key in self.t1:
+            self._pop("t1", key)
+        elif key in self.t2:
+            self._pop("t2", key)
+        elif key in self.b1:
+            # the key was evicted from the recency list too early
+            # NOTE: the ghost lists may hold only zero-byte values (e.g. empty series)
+            delta = max(self.sizes["b2"] / max(self.sizes["b1"], 1), 1) * size
+            self.p = min(self.p + delta, self.capacity)
+            self._pop("b1", key)
+        elif key in self.b2:
+            # the key was evicted from the frequency list too early
+            delta = max(self.sizes["b1"] / max(self.sizes["b2"], 1), 1) * size
+            self.p = max(self.p - delta, 0)
+            self._pop("b2", key)
+        else:
+            self._push("t1", key, size)
+            self._trim_ghosts()
+            return
+        self._push("t2", key, size)
+        self._trim_ghosts()
+
+    def access(self, key):
+        if key in self.t1:
+            self._push("t2", *self._pop("t1", key))
+        else:
+            self.t2.move_to_end(key)
+
+    def remove(self, key):
+        for name in ("t1", "t2"):
+            if key in getattr(self, name):
+                self._pop(name, key)
+                return
+
+    def evict(self):
+        if self.t1 and (self.sizes["t1"] > self.p or not self.t2):
+            key, size = self._pop("t1")
+            self._push("b1", key, size)
+        else:
+            key, size = self._pop("t2")
+            self._push("b2", key, size)
+        self._trim_ghosts()
+        return key
+
+    def clear(self):
+        for name in self.sizes:
+            getattr(self, name).clear()
+            self.sizes[name] = 0
+        self.p = 0
+
+
+MEM_CACHE_POLICIES = {"lru": LRUPolicy, "lfu": LFUPolicy, "arc": ARCPolicy}
+
+
 class MemCacheUnit(abc.ABC):
     """Memory Cache Unit."""
 
     def __init__(self, *args, **kwargs):
-        self.size_limit = kwargs.pop("size_limit", 0)
+        policy = kwargs.pop("policy", "lru")
+        if policy not in MEM_CACHE_POLICIES:
+            raise ValueError(f"policy must be one of {list(MEM_CACHE_POLICIES)}, your policy is {policy}")
+        self.policy = MEM_CACHE_POLICIES[policy]()
+        self.set_limit_size(kwargs.pop("size_limit", 0))
         self._size = 0
         self.od = OrderedDict()
+        # the size of each value, so it doesn't need to be calculated again when the value is removed
+        self._sizes = {}
+        # the cache shared with other processes (see `SharedMemCache`)
+        self.shared = None
+        self.reset_stats()
 
     def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value, shared: bool = False):
+        """`unit[key] = value`, the value is also published to the shared cache (see `SharedMemCache`) if `shared`"""
+        self._set_local(key, value)
+        if shared and self.shared is not None:
+            self.shared[key] = value
+
+    def _set_local(self, key, value):
         # TODO: thread safe?__setitem__ failure might cause inconsistent size?
 
         # precalculate the size after od.__setitem__
-        self._adjust_size(key, value)
+        size = self._get_value_size(value)
+        self._size += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
 
         self.od.__setitem__(key, value)
 
         # move the key to end,make it latest
         self.od.move_to_end(key)
+        self.policy.insert(key, size)
 
         if self.limited:
-            # pop the oldest items beyond size limit
-            while self._size > self.size_limit:
-                self.popitem(last=False)
+            # evict the items chosen by the policy beyond size limit
+            while self._size > self.size_limit and self.od:
+                self._evict()
 
     def __getitem__(self, key):
         v = self.od.__getitem__(key)
         self.od.move_to_end(key)
+        self.policy.access(key)
         return v
 
     def __contains__(self, key):
-        return key in self.od
+        return self.contains(key)
+
+    def contains(self, key, shared: bool = False) -> bool:
+        """`key in unit`, the shared cache (see `SharedMemCache`) is also looked up if `shared`"""
+        if key in self.od:
+            self.hits += 1
+            return True
+        if shared and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                # keep the value published by other processes in the local cache
+                self.shared_hits += 1
+                self._set_local(key, value)
+                return True
+        self.misses += 1
+        return False
 
     def __len__(self):
         return self.od.__len__()
@@ -80,6 +327,7 @@ class MemCacheUnit(abc.ABC):
 
     def set_limit_size(self, limit):
         self.size_limit = limit
+        self.policy.capacity = limit
 
     @property
     def limited(self):
@@ -93,24 +341,53 @@ class MemCacheUnit(abc.ABC):
     def clear(self):
         self._size = 0
         self.od.clear()
+        self._sizes.clear()
+        self.policy.clear()
 
     def popitem(self, last=True):
         k, v = self.od.popitem(last=last)
-        self._size -= self._get_value_size(v)
+        self._size -= self._sizes.pop(k)
+        self.policy.remove(k)
 
         return k, v
 
     def pop(self, key):
         v = self.od.pop(key)
-        self._size -= self._get_value_size(v)
+        self._size -= self._sizes.pop(key)
+        self.policy.remove(key)
 
         return v
 
-    def _adjust_size(self, key, value):
-        if key in self.od:
-            self._size -= self._get_value_size(self.od[key])
+    def _evict(self):
+        key = self.policy.evict()
+        del self.od[key]
+        self._size -= self._sizes.pop(key)
+        self.evictions += 1
+
+    def reset_stats(self):
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
 
-        self._size += self._get_value_size(value)
+    def stats(self) -> dict:
+        """The statistics of the unit since it is created or `reset_stats` is called
+
+        - hits/misses: the results of the lookups (i.e. `key in unit`); the lookups served by the shared cache are
+          counted in shared_hits instead of hits
+        - evictions: the number of values evicted because of the size limit
+        """
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else float("nan"),
+            "length": len(self.od),
+            "size": self._size,
+            "size_limit": self.size_limit,
+        }
 
     @abc.abstractmethod
     def _get_value_size(self, value):
@@ -118,25 +395,201 @@ class MemCacheUnit(abc.ABC):
 
 
 class MemCacheLengthUnit(MemCacheUnit):
-    def __init__(self, size_limit=0):
-        super().__init__(size_limit=size_limit)
+    def __init__(self, size_limit=0, policy="lru"):
+        super().__init__(size_limit=size_limit, policy=policy)
 
     def _get_value_size(self, value):
         return 1
 
 
 class MemCacheSizeofUnit(MemCacheUnit):
-    def __init__(self, size_limit=0):
-        super().__init__(size_limit=size_limit)
+    def __init__(self, size_limit=0, policy="lru"):
+        super().__init__(size_limit=size_limit, policy=policy)
 
     def _get_value_size(self, value):
         return sys.getsizeof(value)
 
 
+class MemCacheNbytesUnit(MemCacheUnit):
+    """The size of a value is the number of bytes of its data (including the index of the pandas objects and the
+    elements of the containers), so the size limit is a memory budget in bytes"""
+
+    def __init__(self, size_limit=0, policy="lru"):
+        super().__init__(size_limit=size_limit, policy=policy)
+
+    def _get_value_size(self, value):
+        return get_nbytes(value)
+
+
+def get_nbytes(value) -> int:
+    """The number of bytes used by `value`, `sys.getsizeof` doesn't count the buffers of numpy/pandas objects"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(get_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(get_nbytes(k) + get_nbytes(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class SharedMemCache:
+    """Memory cache of the expression data shared by the processes on the same machine.
+
+    Each series is saved in a file named by the hash of its key under `path`, which is expected to be on a memory
+    file system (e.g. /dev/shm). The files are written once and renamed atomically, so no lock is needed; the other
+    processes read them as raw arrays instead of unpickling the data.
+
+    Only the float series with contiguous integer index (i.e. the data of an instrument) are shared. Only the root
+    expressions of the queries are published (see `Expression.load`), so each lookup of the intermediate results
+    doesn't probe the file system.
+
+    The total size of the files is bounded by `size_limit`. When the size a process has seen exceeds it, the process
+    scans the directory and removes the oldest files. The values which can't be written (e.g. the memory file system
+    is full) are not shared.
+    """
+
+    # int64 header: start index, item size of the value
+    HEADER_DTYPE = np.dtype("<i8")
+    HEADER_SIZE = 2 * HEADER_DTYPE.itemsize
+    VALUE_DTYPES = {4: np.dtype("<f4"), 8: np.dtype("<f8")}
+
+    # the ratio of `size_limit` the files are evicted down to, so the directory is not scanned on each write
+    EVICT_RATIO = 0.8
+
+    def __init__(self, path: Union[str, Path], size_limit: int = None):
+        """
+        Parameters
+        ----------
+        path : Union[str, Path]
+            the directory of the cache
+        size_limit : int
+            the max total bytes of the files, defaults to `C.shared_mem_cache_size_limit`. 0 means no limit.
+        """
+        self.path = Path(path).expanduser().resolve()
+        self.path.mkdir(parents=True, exist_ok=True)
+        # the same directory may be reused by the qlib initialized with other data
+        self._namespace = str(C.get("provider_uri"))
+        self.size_limit = C.get("shared_mem_cache_size_limit", 0) if size_limit is None else size_limit
+        # the total size of the files, which is scanned before the first write
+        self._size = None
+
+    @staticmethod
+    def make_temp_dir() -> str:
+        """Make a temporary directory for the cache, which is removed when the current process exits"""
+        shm_dir = Path("/dev/shm")
+        path = tempfile.mkdtemp(prefix="qlib_shared_cache_", dir=str(shm_dir) if shm_dir.is_dir() else None)
+        atexit.register(shutil.rmtree, path, ignore_errors=True)
+        return path
+
+    def _get_path(self, key) -> Union[Path, None]:
+        # The data of instrument panels are not shared
+        if not isinstance(key, tuple) or len(key) < 2 or not isinstance(key[1], str):
+            return None
+        # `hash_args` is too slow to be called on each loading
+        return self.path.joinpath(hashlib.md5(repr((self._namespace, *key)).encode()).hexdigest())
+
+    def get(self, key) -> Union[pd.Series, None]:
+        path = self._get_path(key)
+        if path is None:
+            return None
+        try:
+            # the data are read into memory instead of being memory-mapped, otherwise each series holding a map (and
+            # its file descriptor) would exhaust the file descriptors of the process
+            buf = np.fromfile(path, dtype=np.uint8)
+        except FileNotFoundError:
+            return None
+        start_index, itemsize = buf[: self.HEADER_SIZE].view(self.HEADER_DTYPE)
+        data = buf[self.HEADER_SIZE :].view(self.VALUE_DTYPES[itemsize])
+        return pd.Series(data, index=pd.RangeIndex(start_index, start_index + len(data)), name=key[0], copy=False)
+
+    def __setitem__(self, key, value):
+        if not isinstance(value, pd.Series) or value.empty or value.dtype.kind != "f":
+            return
+        itemsize = value.dtype.itemsize
+        index = value.index
+        if isinstance(index, pd.RangeIndex):
+            contiguous = index.step == 1
+        else:
+            contiguous = (
+                pd.api.types.is_integer_dtype(index.dtype)
+                and index[-1] - index[0] + 1 == len(index)
+                and index.is_monotonic_increasing
+            )
+        path = self._get_path(key)
+        if path is None or not contiguous or itemsize not in self.VALUE_DTYPES:
+            return
+        nbytes = self.HEADER_SIZE + len(value) * itemsize
+        if self.size_limit:
+            if nbytes > self.size_limit * self.EVICT_RATIO:
+                return
+            if self._size is None or self._size + nbytes > self.size_limit:
+                self._evict(nbytes)
+        # The value is loaded only if it is not found in the cache, so it is not checked whether the file exists.
+        # If several processes write the same value, the last one wins.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                header = np.array([index[0], itemsize], dtype=self.HEADER_DTYPE)
+                os.write(fd, header.tobytes() + value.values.astype(self.VALUE_DTYPES[itemsize], copy=False).tobytes())
+            finally:
+                os.close(fd)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # e.g. no space left on the device, the value is just not shared
+            get_module_logger("SharedMemCache").debug(f"failed to share {key}: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+        if self._size is not None:
+            self._size += nbytes
+
+    def _evict(self, nbytes: int):
+        """scan the files and remove the oldest ones if the total size exceeds `size_limit` after `nbytes` are added"""
+        files = []
+        for entry in os.scandir(self.path):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime_ns, st.st_size, entry.path))
+        files.sort()
+        size = sum(f[1] for f in files)
+        if size + nbytes <= self.size_limit:
+            files = []
+        for _, file_size, file_path in files:
+            if size + nbytes <= self.size_limit * self.EVICT_RATIO:
+                break
+            # the files being written by other processes are kept
+            if file_path.endswith(".tmp"):
+                continue
+            try:
+                os.unlink(file_path)
+            except FileNotFoundError:
+                pass
+            size -= file_size
+        self._size = size
+
+    def clear(self):
+        for p in self.path.iterdir():
+            p.unlink(missing_ok=True)
+        self._size = 0
+
+
 class MemCache:
     """Memory cache."""
 
-    def __init__(self, mem_cache_size_limit=None, limit_type="length"):
+    UNITS = {"length": MemCacheLengthUnit, "sizeof": MemCacheSizeofUnit, "nbytes": MemCacheNbytesUnit}
+
+    def __init__(self, mem_cache_size_limit=None, limit_type="length", policy=None):
         """
 
         Parameters
@@ -144,22 +597,40 @@ class MemCache:
         mem_cache_size_limit:
             cache max size.
         limit_type:
-            length or sizeof; length(call fun: len), size(call fun: sys.getsizeof).
+            length, sizeof or nbytes; length(call fun: len), size(call fun: sys.getsizeof),
+            nbytes(the bytes of the data, see `get_nbytes`).
+        policy:
+            the eviction policy when the size limit is exceeded: lru, lfu or arc.
         """
+        self.__shared = None
+        self.__settings = None
+        self.reset(mem_cache_size_limit, limit_type, policy)
+
+    def reset(self, mem_cache_size_limit=None, limit_type=None, policy=None):
+        """Rebuild the units if the settings are changed (the values are dropped in that case)
 
+        The parameters are the same as `__init__` and default to the config of qlib.
+        """
         size_limit = C.mem_cache_size_limit if mem_cache_size_limit is None else mem_cache_size_limit
         limit_type = C.mem_cache_limit_type if limit_type is None else limit_type
+        policy = C.mem_cache_policy if policy is None else policy
+        if (size_limit, limit_type, policy) == self.__settings:
+            return
 
-        if limit_type == "length":
-            klass = MemCacheLengthUnit
-        elif limit_type == "sizeof":
-            klass = MemCacheSizeofUnit
-        else:
-            raise ValueError(f"limit_type must be length or sizeof, your limit_type is {limit_type}")
+        if limit_type not in self.UNITS:
+            raise ValueError(f"limit_type must be one of {list(self.UNITS)}, your limit_type is {limit_type}")
+        klass = self.UNITS[limit_type]
 
-        self.__calendar_mem_cache = klass(size_limit)
-        self.__instrument_mem_cache = klass(size_limit)
-        self.__feature_mem_cache = klass(size_limit)
+        self.__calendar_mem_cache = klass(size_limit, policy)
+        self.__instrument_mem_cache = klass(size_limit, policy)
+        self.__feature_mem_cache = klass(size_limit, policy)
+        self.__feature_mem_cache.shared = self.__shared
+        self.__settings = size_limit, limit_type, policy
+
+    def set_shared_cache(self, path: Union[str, Path, None]):
+        """Share the expression data with other processes through the `SharedMemCache` in `path`"""
+        self.__shared = None if path is None else SharedMemCache(path)
+        self.__feature_mem_cache.shared = self.__shared
 
     def __getitem__(self, key):
         if key == "c":
@@ -176,6 +647,14 @@ class MemCache:
         self.__instrument_mem_cache.clear()
         self.__feature_mem_cache.clear()
 
+    def stats(self) -> dict:
+        """The statistics (see `MemCacheUnit.stats`) of the units 'c', 'i' and 'f'"""
+        return {key: self[key].stats() for key in ("c", "i", "f")}
+
+    def reset_stats(self):
+        for key in ("c", "i", "f"):
+            self[key].reset_stats()
+
 
 class MemCacheExpire:
     CACHE_EXPIRE = C.mem_cache_expire
@@ -215,27 +694,80 @@ class CacheUtils:
 
     @staticmethod
     def reset_lock():
-        r = get_redis_connection()
-        redis_lock.reset_all(r)
+        r = CacheUtils.get_lock_connection()
+        # the file locks are released when their processes exit, nothing needs to be reset
+        if r is not None:
+            redis_lock.reset_all(r)
+
+    @staticmethod
+    def get_lock_connection():
+        """The redis connection for the locks of the disk caches; None if the locks are local files (see
+        `C.disk_cache_lock`)"""
+        return get_redis_connection() if C.disk_cache_lock == "redis" else None
 
     @staticmethod
     def visit(cache_path: Union[str, Path]):
-        # FIXME: Because read_lock was canceled when reading the cache, multiple processes may have read and write exceptions here
+        # FIXME: Because read_lock was canceled when reading the cache, multiple readers may lose some visits here
         try:
             cache_path = Path(cache_path)
             meta_path = cache_path.with_suffix(".meta")
             with meta_path.open("rb") as f:
                 d = pickle.load(f)
-            with meta_path.open("wb") as f:
-                try:
-                    d["meta"]["last_visit"] = str(time.time())
-                    d["meta"]["visits"] = d["meta"]["visits"] + 1
-                except KeyError as key_e:
-                    raise KeyError("Unknown meta keyword") from key_e
-                pickle.dump(d, f, protocol=C.dump_protocol_version)
+            try:
+                d["meta"]["last_visit"] = str(time.time())
+                d["meta"]["visits"] = d["meta"]["visits"] + 1
+            except KeyError as key_e:
+                raise KeyError("Unknown meta keyword") from key_e
+            CacheUtils.dump_meta(d, meta_path)
         except Exception as e:
             get_module_logger("CacheUtils").warning(f"visit {cache_path} cache error: {e}")
 
+    @staticmethod
+    def get_temp_path(path: Union[str, Path]) -> Path:
+        """The path to write the content of `path` before it is published by `os.replace`"""
+        path = Path(path)
+        return path.with_name(f"{path.name}.{os.getpid()}.tmp")
+
+    @staticmethod
+    def dump_meta(meta: dict, meta_path: Union[str, Path]):
+        """Replace the meta file atomically, so the readers never see a partially written one"""
+        meta_path = Path(meta_path)
+        tmp_path = CacheUtils.get_temp_path(meta_path)
+        with tmp_path.open("wb") as f:
+            pickle.dump(meta, f, protocol=C.dump_protocol_version)
+        tmp_path.chmod(stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH)
+        os.replace(tmp_path, meta_path)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def file_lock(lock_name: str, shared: bool = False):
+        """The lock shared by the processes on the same host through a file in the temporary directory
+
+        The lock is released by the OS when the process holding it exits, so a crashed process never leaves a stale
+        lock behind.
+
+        Parameters
+        ----------
+        lock_name : str
+            the name of the lock
+        shared : bool
+            acquire a shared lock (for the readers) instead of an exclusive one (for the writers)
+        """
+        lock_dir = Path(tempfile.gettempdir()).joinpath("qlib_cache_locks")
+        lock_dir.mkdir(exist_ok=True)
+        lock_path = lock_dir.joinpath(hashlib.md5(lock_name.encode()).hexdigest())
+        if fcntl is None:
+            with filelock.FileLock(str(lock_path)):
+                yield
+            return
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+        finally:
+            # closing the file releases the lock
+            os.close(fd)
+
     @staticmethod
     def acquire(lock, lock_name):
         try:
@@ -255,6 +787,10 @@ class CacheUtils:
     @staticmethod
     @contextlib.contextmanager
     def reader_lock(redis_t, lock_name: str):
+        if redis_t is None:
+            with CacheUtils.file_lock(lock_name, shared=True):
+                yield
+            return
         current_cache_rlock = redis_lock.Lock(redis_t, f"{lock_name}-rlock")
         current_cache_wlock = redis_lock.Lock(redis_t, f"{lock_name}-wlock")
         lock_reader = f"{lock_name}-reader"
@@ -283,6 +819,10 @@ class CacheUtils:
     @staticmethod
     @contextlib.contextmanager
     def writer_lock(redis_t, lock_name):
+        if redis_t is None:
+            with CacheUtils.file_lock(lock_name):
+                yield
+            return
         current_cache_wlock = redis_lock.Lock(redis_t, f"{lock_name}-wlock", id=CacheUtils.LOCK_ID)
         CacheUtils.acquire(current_cache_wlock, lock_name)
         try:
@@ -309,6 +849,19 @@ class BaseProviderCache:
                 return False
         return True
 
+    @staticmethod
+    def check_cache_outdated(cache_path: Union[str, Path], freq: str) -> bool:
+        """Check whether the calendar has grown since the cache was updated last time"""
+        from .data import Cal  # pylint: disable=C0415
+
+        try:
+            with Path(cache_path).with_suffix(".meta").open("rb") as f:
+                last_update = pickle.load(f)["info"]["last_update"]
+        except Exception:
+            # The caches without meta can't be updated
+            return False
+        return pd.Timestamp(last_update) < Cal.calendar(freq=freq)[-1]
+
     @staticmethod
     def clear_cache(cache_path: Union[str, Path]):
         for p in [
@@ -334,6 +887,9 @@ class ExpressionCache(BaseProviderCache):
     .. note:: Override the `_uri` and `_expression` method to create your own expression cache mechanism.
     """
 
+    # the expressions are cached one by one, set it to True if `_expression` supports `InstrumentPanel`
+    support_panel = False
+
     def expression(self, instrument, field, start_time, end_time, freq):
         """Get expression data.
 
@@ -344,6 +900,13 @@ class ExpressionCache(BaseProviderCache):
         except NotImplementedError:
             return self.provider.expression(instrument, field, start_time, end_time, freq)
 
+    def expressions(self, instrument, fields, start_time, end_time, freq):
+        """Get the data of a group of expressions.
+
+        .. note:: Same interface as `expressions` method in expression provider
+        """
+        return {field: self.expression(instrument, field, start_time, end_time, freq) for field in fields}
+
     def _uri(self, instrument, field, start_time, end_time, freq):
         """Get expression cache file uri.
 
@@ -491,7 +1054,7 @@ class DiskExpressionCache(ExpressionCache):
 
     def __init__(self, provider, **kwargs):
         super(DiskExpressionCache, self).__init__(provider)
-        self.r = get_redis_connection()
+        self.r = CacheUtils.get_lock_connection()
         # remote==True means client is using this module, writing behaviour will not be allowed.
         self.remote = kwargs.get("remote", False)
 
@@ -504,6 +1067,8 @@ class DiskExpressionCache(ExpressionCache):
         return hash_args(instrument, field, freq)
 
     def _expression(self, instrument, field, start_time=None, end_time=None, freq="day"):
+        if isinstance(instrument, tuple):
+            raise NotImplementedError("The expressions calculated on panels are not cached")
         _cache_uri = self._uri(instrument=instrument, field=field, start_time=None, end_time=None, freq=freq)
         _instrument_dir = self.get_cache_dir(freq).joinpath(instrument.lower())
         cache_path = _instrument_dir.joinpath(_cache_uri)
@@ -514,6 +1079,14 @@ class DiskExpressionCache(ExpressionCache):
 
         _, _, start_index, end_index = Cal.locate_index(start_time, end_time, freq, future=False)
 
+        if (
+            not self.remote
+            and self.check_cache_exists(cache_path, suffix_list=[".meta"])
+            and self.check_cache_outdated(cache_path, freq)
+        ):
+            # The calendar has grown since the cache was updated; only the new tail is calculated and appended
+            self.update(instrument.lower(), _cache_uri, freq)
+
         if self.check_cache_exists(cache_path, suffix_list=[".meta"]):
             """
             In most cases, we do not need reader_lock.
@@ -571,16 +1144,12 @@ class DiskExpressionCache(ExpressionCache):
             "meta": {"last_visit": time.time(), "visits": 1},
         }
         self.logger.debug(f"generating expression cache: {meta}")
-        self.clear_cache(cache_path)
-        meta_path = cache_path.with_suffix(".meta")
-
-        with meta_path.open("wb") as f:
-            pickle.dump(meta, f, protocol=C.dump_protocol_version)
-        meta_path.chmod(stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH)
-        df = expression_data.to_frame()
-
-        r = np.hstack([df.index[0], expression_data]).astype("<f")
-        r.tofile(str(cache_path))
+        # The data is published before the meta, so the cache is never regarded as existing with partial data
+        tmp_path = CacheUtils.get_temp_path(cache_path)
+        r = np.hstack([expression_data.index[0], expression_data]).astype("<f")
+        r.tofile(str(tmp_path))
+        os.replace(tmp_path, cache_path)
+        CacheUtils.dump_meta(meta, cache_path.with_suffix(".meta"))
 
     def update(self, sid, cache_uri, freq: str = "day"):
         cp_cache_uri = self.get_cache_dir(freq).joinpath(sid).joinpath(cache_uri)
@@ -590,7 +1159,7 @@ class DiskExpressionCache(ExpressionCache):
             self.clear_cache(cp_cache_uri)
             return 2
 
-        with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri())}:expression-{cache_uri}"):
+        with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri(freq))}:expression-{cache_uri}"):
             with meta_path.open("rb") as f:
                 d = pickle.load(f)
             instrument = d["info"]["instrument"]
@@ -600,6 +1169,7 @@ class DiskExpressionCache(ExpressionCache):
 
             # get newest calendar
             from .data import Cal, ExpressionD  # pylint: disable=C0415
+            from .plan import is_window_bounded  # pylint: disable=C0415
 
             whole_calendar = Cal.calendar(start_time=None, end_time=None, freq=freq)
             # calendar since last updated.
@@ -610,36 +1180,54 @@ class DiskExpressionCache(ExpressionCache):
                 # Including last updated calendar, we only get 1 item.
                 # No future updating is needed.
                 return 1
-            else:
-                # get the data needed after the historical data are removed.
-                # The start index of new data
-                current_index = len(whole_calendar) - len(new_calendar) + 1
 
-                # The existing data length
-                size_bytes = os.path.getsize(cp_cache_uri)
-                ele_size = np.dtype("<f").itemsize
-                assert size_bytes % ele_size == 0
-                ele_n = size_bytes // ele_size - 1
-
-                expr = ExpressionD.get_expression_instance(field)
-                lft_etd, rght_etd = expr.get_extended_window_size()
-                # The expression used the future data after rght_etd days.
-                # So the last rght_etd data should be removed.
-                # There are most `ele_n` period of data can be remove
-                remove_n = min(rght_etd, ele_n)
-                assert new_calendar[1] == whole_calendar[current_index]
-                data = self.provider.expression(
-                    instrument, field, whole_calendar[current_index - remove_n], new_calendar[-1], freq
+            expr = ExpressionD.get_expression_instance(field)
+            if not is_window_bounded(expr):
+                # The history of the expression (e.g. EMA) can't be summarized by a bounded window, so the new data
+                # must be calculated from the beginning of the calendar.
+                series = self.provider.expression(instrument, field, whole_calendar[0], whole_calendar[-1], freq)
+                self.gen_expression_cache(
+                    expression_data=series,
+                    cache_path=cp_cache_uri,
+                    instrument=instrument,
+                    field=field,
+                    freq=freq,
+                    last_update=str(whole_calendar[-1]),
                 )
-                with open(cp_cache_uri, "ab") as f:
-                    data = np.array(data).astype("<f")
-                    # Remove the last bits
-                    f.truncate(size_bytes - ele_size * remove_n)
-                    f.write(data)
-                # update meta file
-                d["info"]["last_update"] = str(new_calendar[-1])
-                with meta_path.open("wb") as f:
-                    pickle.dump(d, f, protocol=C.dump_protocol_version)
+                return 0
+
+            # The existing data length
+            size_bytes = os.path.getsize(cp_cache_uri)
+            ele_size = np.dtype("<f").itemsize
+            assert size_bytes % ele_size == 0
+            ele_n = size_bytes // ele_size - 1
+            with cp_cache_uri.open("rb") as f:
+                ref_start_index = int(np.frombuffer(f.read(ele_size), dtype="<f")[0])
+
+            _, rght_etd = expr.get_extended_window_size()
+            # The expression used the future data after rght_etd days.
+            # So the last rght_etd data should be removed.
+            # There are most `ele_n` period of data can be remove
+            remove_n = min(rght_etd, ele_n)
+            # Only the tail is calculated. The provider loads the extended window before it by itself.
+            # NOTE: the cached data may end before the last updated calendar if the instrument has no data there.
+            current_index = ref_start_index + ele_n - remove_n
+            data = self.provider.expression(instrument, field, whole_calendar[current_index], whole_calendar[-1], freq)
+            if not data.empty:
+                # the data of the instrument may start after `current_index`; keep the bin file continuous
+                data = data.reindex(pd.RangeIndex(current_index, data.index[-1] + 1))
+            # The readers don't take the lock, so the new data is appended to a copy which replaces the cache at last
+            tmp_path = CacheUtils.get_temp_path(cp_cache_uri)
+            shutil.copyfile(cp_cache_uri, tmp_path)
+            with open(tmp_path, "ab") as f:
+                data = np.array(data).astype("<f")
+                # Remove the last bits
+                f.truncate(size_bytes - ele_size * remove_n)
+                f.write(data)
+            os.replace(tmp_path, cp_cache_uri)
+            # update meta file
+            d["info"]["last_update"] = str(new_calendar[-1])
+            CacheUtils.dump_meta(d, meta_path)
         return 0
 
 
@@ -648,7 +1236,7 @@ class DiskDatasetCache(DatasetCache):
 
     def __init__(self, provider, **kwargs):
         super(DiskDatasetCache, self).__init__(provider)
-        self.r = get_redis_connection()
+        self.r = CacheUtils.get_lock_connection()
         self.remote = kwargs.get("remote", False)
 
     @staticmethod
@@ -658,6 +1246,11 @@ class DiskDatasetCache(DatasetCache):
     def get_cache_dir(self, freq: str = None) -> Path:
         return super(DiskDatasetCache, self).get_cache_dir(C.dataset_cache_dir_name, freq)
 
+    def _update_outdated(self, cache_path: Path, freq: str):
+        """Append the data of the new calendar to the cache instead of regenerating it"""
+        if not self.remote and self.check_cache_exists(cache_path) and self.check_cache_outdated(cache_path, freq):
+            self.update(cache_path.name, freq)
+
     @classmethod
     def read_data_from_cache(cls, cache_path: Union[str, Path], start_time, end_time, fields):
         """read_cache_from
@@ -717,6 +1310,8 @@ class DiskDatasetCache(DatasetCache):
         )
 
         cache_path = self.get_cache_dir(freq).joinpath(_cache_uri)
+        if disk_cache == 1:
+            self._update_outdated(cache_path, freq)
 
         features = pd.DataFrame()
         gen_flag = False
@@ -735,6 +1330,9 @@ class DiskDatasetCache(DatasetCache):
         if gen_flag:
             # cache unavailable, generate the cache
             with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri(freq))}:dataset-{_cache_uri}"):
+                if disk_cache == 1 and self.check_cache_exists(cache_path):
+                    # the cache has been generated by another process while waiting for the lock
+                    return self.read_data_from_cache(cache_path, start_time, end_time, fields)
                 features = self.gen_dataset_cache(
                     cache_path=cache_path,
                     instruments=instruments,
@@ -772,6 +1370,7 @@ class DiskDatasetCache(DatasetCache):
             inst_processors=inst_processors,
         )
         cache_path = self.get_cache_dir(freq).joinpath(_cache_uri)
+        self._update_outdated(cache_path, freq)
 
         if self.check_cache_exists(cache_path):
             self.logger.debug(f"The cache dataset has already existed {cache_path}. Return the uri directly")
@@ -781,13 +1380,15 @@ class DiskDatasetCache(DatasetCache):
         else:
             # cache unavailable, generate the cache
             with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri(freq))}:dataset-{_cache_uri}"):
-                self.gen_dataset_cache(
-                    cache_path=cache_path,
-                    instruments=instruments,
-                    fields=fields,
-                    freq=freq,
-                    inst_processors=inst_processors,
-                )
+                # the cache may have been generated by another process while waiting for the lock
+                if not self.check_cache_exists(cache_path):
+                    self.gen_dataset_cache(
+                        cache_path=cache_path,
+                        instruments=instruments,
+                        fields=fields,
+                        freq=freq,
+                        inst_processors=inst_processors,
+                    )
             return _cache_uri
 
     class IndexManager:
@@ -813,9 +1414,11 @@ class DiskDatasetCache(DatasetCache):
             if self._data is None:
                 raise ValueError("No data to sync to disk.")
             self._data.sort_index(inplace=True)
-            self._data.to_hdf(self.index_path, key=self.KEY, mode="w", format="table")
+            tmp_path = CacheUtils.get_temp_path(self.index_path)
+            self._data.to_hdf(tmp_path, key=self.KEY, mode="w", format="table")
             # The index should be readable for all users
-            self.index_path.chmod(stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH)
+            tmp_path.chmod(stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(tmp_path, self.index_path)
 
         def sync_from_disk(self):
             # The file will not be closed directly if we read_hdf from the disk directly
@@ -933,18 +1536,15 @@ class DiskDatasetCache(DatasetCache):
             },
             "meta": {"last_visit": time.time(), "visits": 1},
         }
-        with cache_path.with_suffix(".meta").open("wb") as f:
-            pickle.dump(meta, f, protocol=C.dump_protocol_version)
-        cache_path.with_suffix(".meta").chmod(stat.S_IRWXU | stat.S_IRGRP | stat.S_IROTH)
+        CacheUtils.dump_meta(meta, cache_path.with_suffix(".meta"))
         # write index file
         im = DiskDatasetCache.IndexManager(cache_path)
         index_data = im.build_index_from_data(features)
         im.update(index_data)
 
-        # rename the file after the cache has been generated
-        # this doesn't work well on windows, but our server won't use windows
-        # temporarily
-        cache_path.with_suffix(".data").rename(cache_path)
+        # rename the file after the cache has been generated, so the cache is regarded as existing only when all
+        # the files are complete
+        os.replace(cache_path.with_suffix(".data"), cache_path)
         # the fields of the cached features are converted to the original fields
         return features.swaplevel("datetime", "instrument")
 
@@ -957,7 +1557,7 @@ class DiskDatasetCache(DatasetCache):
             return 2
 
         im = DiskDatasetCache.IndexManager(cp_cache_uri)
-        with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri())}:dataset-{cache_uri}"):
+        with CacheUtils.writer_lock(self.r, f"{str(C.dpm.get_data_uri(freq))}:dataset-{cache_uri}"):
             with meta_path.open("rb") as f:
                 d = pickle.load(f)
             instruments = d["info"]["instruments"]
@@ -993,11 +1593,24 @@ class DiskDatasetCache(DatasetCache):
 
                 # To avoid recursive import
                 from .data import ExpressionD  # pylint: disable=C0415
+                from .plan import is_window_bounded  # pylint: disable=C0415
+
+                exprs = [ExpressionD.get_expression_instance(field) for field in fields]
+                if not all(is_window_bounded(expr) for expr in exprs):
+                    # Some fields (e.g. EMA) depend on all the history, the new data must be calculated from the
+                    # beginning of the calendar.
+                    self.gen_dataset_cache(
+                        cache_path=cp_cache_uri,
+                        instruments=instruments,
+                        fields=fields,
+                        freq=freq,
+                        inst_processors=inst_processors,
+                    )
+                    return 0
 
                 # The existing data length
                 lft_etd = rght_etd = 0
-                for field in fields:
-                    expr = ExpressionD.get_expression_instance(field)
+                for expr in exprs:
                     l, r = expr.get_extended_window_size()
                     lft_etd = max(lft_etd, l)
                     rght_etd = max(rght_etd, r)
@@ -1030,6 +1643,9 @@ class DiskDatasetCache(DatasetCache):
                 else:
                     return 0  # No data to update cache
 
+                # The data and index are modified in place. The meta is removed until they are complete, so the cache
+                # is regenerated instead of being used if the process crashes during the update.
+                meta_path.unlink()
                 store = pd.HDFStore(cp_cache_uri)
                 # FIXME:
                 # Because the feature cache are stored as .bin file.
@@ -1055,8 +1671,7 @@ class DiskDatasetCache(DatasetCache):
 
                 # update meta file
                 d["info"]["last_update"] = str(new_calendar[-1])
-                with meta_path.open("wb") as f:
-                    pickle.dump(d, f, protocol=C.dump_protocol_version)
+                CacheUtils.dump_meta(d, meta_path)
                 return 0
 
 
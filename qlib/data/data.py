@@ -10,6 +10,7 @@ import abc
 import copy
 import queue
 import bisect
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 from typing import List, Union, Optional
@@ -33,11 +34,23 @@ from ..utils import (
     normalize_cache_fields,
     code_to_fname,
     time_to_slc_point,
-    read_period_data,
     get_period_list,
 )
 from ..utils.paral import ParallelExt
+from .base import Expression, Feature, InstrumentPanel
 from .ops import Operators  # pylint: disable=W0611  # noqa: F401
+from .plan import ExpressionPlan, is_window_bounded
+
+
+def _get_leaf_features(expression: Expression) -> set:
+    """Get the raw features (e.g. `$close`) an expression is calculated on"""
+    if isinstance(expression, Feature):
+        return {str(expression)}
+    leaf_features = set()
+    for value in vars(expression).values():
+        if isinstance(value, Expression):
+            leaf_features |= _get_leaf_features(value)
+    return leaf_features
 
 
 class ProviderBackendMixin:
@@ -334,6 +347,51 @@ class FeatureProvider(abc.ABC):
         """
         raise NotImplementedError("Subclass of FeatureProvider must implement `feature` method")
 
+    def feature_panel(self, instruments, field, start_index, end_index, freq):
+        """Get feature data of a group of instruments as a (time x instrument) panel.
+
+        Parameters
+        ----------
+        instruments : tuple
+            a group of instruments.
+        field : str
+            a certain field of feature.
+        start_index : int
+            start of the calendar index range.
+        end_index : int
+            end of the calendar index range.
+        freq : str
+            time frequency, available: year/quarter/month/week/day.
+
+        Returns
+        -------
+        pd.DataFrame
+            one column for each instrument. The index is the contiguous calendar index covered by any of the
+            instruments; the rows outside the history of an instrument are NaN.
+        """
+        data = pd.DataFrame(
+            {inst: self.feature(inst, field, start_index, end_index, freq) for inst in instruments},
+            columns=list(instruments),
+            dtype=np.float32,
+        )
+        if not data.empty:
+            data = data.reindex(pd.RangeIndex(data.index.min(), data.index.max() + 1))
+        return data
+
+    def feature_index_range(self, instrument, field, start_index, end_index, freq):
+        """Get the calendar index range covered by the feature data of an instrument.
+
+        Returns
+        -------
+        Union[Tuple[int, int], None]
+            the first and the last calendar index of the data within [start_index, end_index] (None means
+            unbounded); None if there is no data.
+        """
+        series = self.feature(instrument, field, start_index, end_index, freq)
+        if series.empty:
+            return None
+        return series.index[0], series.index[-1]
+
 
 class PITProvider(abc.ABC):
     @abc.abstractmethod
@@ -379,6 +437,25 @@ class PITProvider(abc.ABC):
         """
         raise NotImplementedError(f"Please implement the `period_feature` method")
 
+    def revision_dates(self, instrument, field) -> np.ndarray:
+        """
+        get the dates when the data of `field` are published or revised
+
+        The data returned by `period_feature` only change on these dates, so the operators observing the PIT data on
+        each day (e.g. `P`) only have to calculate them on these dates.
+
+        Returns
+        -------
+        np.ndarray
+            the sorted unique dates represented by integers (e.g. 20190102)
+
+        Raises
+        ------
+        FileNotFoundError
+            This exception will be raised if the queried data do not exist.
+        """
+        raise NotImplementedError(f"Please implement the `revision_dates` method")
+
 
 class ExpressionProvider(abc.ABC):
     """Expression provider class
@@ -386,6 +463,9 @@ class ExpressionProvider(abc.ABC):
     Provide Expression data.
     """
 
+    # whether the expressions can be evaluated on an `InstrumentPanel` (see `LocalDatasetProvider.panel_size`)
+    support_panel = True
+
     def __init__(self):
         self.expression_instance_cache = {}
 
@@ -442,6 +522,25 @@ class ExpressionProvider(abc.ABC):
         """
         raise NotImplementedError("Subclass of ExpressionProvider must implement `Expression` method")
 
+    def expressions(self, instrument, fields, start_time=None, end_time=None, freq="day") -> dict:
+        """Get the data of a group of expressions.
+
+        The sub-expressions shared by the expressions could be evaluated only once by overriding this method.
+
+        Parameters
+        ----------
+        fields : List[str]
+            a group of fields of features.
+
+        The other parameters are the same as `expression`.
+
+        Returns
+        -------
+        dict
+            field -> data of the expression
+        """
+        return {field: self.expression(instrument, field, start_time, end_time, freq) for field in fields}
+
 
 class DatasetProvider(abc.ABC):
     """Dataset provider class
@@ -609,10 +708,8 @@ class DatasetProvider(abc.ABC):
         # NOTE: This place is compatible with windows, windows multi-process is spawn
         C.register_from_C(g_config)
 
-        obj = dict()
-        for field in column_names:
-            #  The client does not have expression provider, the data will be loaded from cache using static method.
-            obj[field] = ExpressionD.expression(inst, field, start_time, end_time, freq)
+        #  The client does not have expression provider, the data will be loaded from cache using static method.
+        obj = ExpressionD.expressions(inst, column_names, start_time, end_time, freq)
 
         data = pd.DataFrame(obj)
         if not data.empty and not np.issubdtype(data.index.dtype, np.dtype("M")):
@@ -633,6 +730,126 @@ class DatasetProvider(abc.ABC):
                 data = _processor_obj(data, instrument=inst)
         return data
 
+    @staticmethod
+    def panel_dataset_processor(instruments_d, column_names, start_time, end_time, freq, panel_size):
+        """
+        Load and process the data, return the data set.
+        - the instruments are split into groups of at most `panel_size` instruments.
+        - each group is calculated by `panel_calculator` in one task, default using multi-kernel method.
+
+        """
+        normalize_column_names = normalize_cache_fields(column_names)
+        if isinstance(instruments_d, dict):
+            spans_d = instruments_d
+        else:
+            spans_d = dict.fromkeys(instruments_d)
+        inst_l = sorted(spans_d)
+        workers = max(min(C.get_kernels(freq), len(inst_l)), 1)
+        group_size = max(min(panel_size, int(np.ceil(len(inst_l) / workers))), 1)
+
+        task_l = []
+        for i in range(0, len(inst_l), group_size):
+            insts = tuple(inst_l[i : i + group_size])
+            task_l.append(
+                delayed(DatasetProvider.panel_calculator)(
+                    insts, start_time, end_time, freq, normalize_column_names, [spans_d[i] for i in insts], C
+                )
+            )
+        data_l = ParallelExt(n_jobs=workers, backend=C.joblib_backend, maxtasksperchild=C.maxtasksperchild)(task_l)
+        data_l = [data for data in data_l if len(data) > 0]
+
+        if len(data_l) > 0:
+            data = pd.concat(data_l, sort=False)
+            data = DiskDatasetCache.cache_to_origin_data(data, column_names)
+        else:
+            data = pd.DataFrame(
+                index=pd.MultiIndex.from_arrays([[], []], names=("instrument", "datetime")),
+                columns=column_names,
+                dtype=np.float32,
+            )
+        return data
+
+    @staticmethod
+    def panel_calculator(insts, start_time, end_time, freq, column_names, spans_l, g_config=None):
+        """
+        Calculate the expressions for a **group** of instruments, return a df result.
+
+        Each expression is evaluated once on a (time x instrument) panel instead of once for each instrument.
+        If any expression can't be evaluated on a panel, the group falls back to `inst_calculator`.
+
+        return value: A data frame with index <instrument, datetime> and other data columns.
+
+        """
+        C.register_from_C(g_config)
+
+        try:
+            data = DatasetProvider._calc_panel(insts, start_time, end_time, freq, column_names, spans_l)
+        except NotImplementedError as e:
+            get_module_logger("data").debug(f"Calculating the panel failed ({e}), calculate instrument by instrument")
+            data = {}
+            for inst, spans in zip(insts, spans_l):
+                inst_data = DatasetProvider.inst_calculator(inst, start_time, end_time, freq, column_names, spans)
+                if len(inst_data) > 0:
+                    data[inst] = inst_data
+            data = pd.concat(data, names=["instrument"], sort=False) if len(data) > 0 else pd.DataFrame()
+        finally:
+            # The panels are only shared within the group, free them from the memory cache
+            for key in [key for key in H["f"].od if isinstance(key, tuple) and isinstance(key[1], tuple)]:
+                H["f"].pop(key)
+        return data
+
+    @staticmethod
+    def _calc_panel(insts, start_time, end_time, freq, column_names, spans_l):
+        # The history of an instrument covers the data of all the raw features the expressions are calculated on
+        leaf_fields = set()
+        for field in column_names:
+            leaf_fields.update(_get_leaf_features(ExpressionD.get_expression_instance(field)))
+        history = {}
+        for inst in insts:
+            index_ranges = [FeatureD.feature_index_range(inst, leaf, None, None, freq) for leaf in leaf_fields]
+            index_ranges = [index_range for index_range in index_ranges if index_range is not None]
+            if len(index_ranges) > 0:
+                history[inst] = min(r[0] for r in index_ranges), max(r[1] for r in index_ranges)
+        panel = InstrumentPanel(insts, history)
+
+        #  The client does not have expression provider, the data will be loaded from cache using static method.
+        obj = ExpressionD.expressions(panel, column_names, start_time, end_time, freq)
+        if any(not isinstance(df, pd.DataFrame) for df in obj.values()):
+            raise NotImplementedError("Some expressions are not calculated as panels")
+        cal_idx = pd.Index([]).append([df.index for df in obj.values()])
+        if len(cal_idx) == 0:
+            return pd.DataFrame()
+        if not np.issubdtype(cal_idx.dtype, np.integer):
+            raise NotImplementedError("Only the panels indexed by calendar index are supported")
+        cal_idx = pd.RangeIndex(cal_idx.min(), cal_idx.max() + 1)
+
+        # (time, instrument, field) -> (instrument, time, field)
+        values = np.stack(
+            [
+                obj[field].reindex(index=cal_idx, columns=list(insts)).values.astype(np.float32)
+                for field in column_names
+            ],
+            axis=-1,
+        )
+        values = values.transpose(1, 0, 2).reshape(-1, len(column_names))
+
+        # Only keep the rows in the history of the instruments, which is the same as calculating them one by one
+        datetime_index = pd.DatetimeIndex(Cal.calendar(freq=freq)[cal_idx.values])
+        mask = panel.history_mask(pd.DataFrame(index=cal_idx, columns=list(insts))).T
+        for i, spans in enumerate(spans_l):
+            if spans is not None:
+                span_mask = np.zeros(len(cal_idx), dtype=bool)
+                for begin, end in spans:
+                    span_mask |= (datetime_index >= begin) & (datetime_index <= end)
+                mask[i] &= span_mask
+        mask = mask.reshape(-1)
+
+        index = pd.MultiIndex.from_arrays(
+            [np.repeat(np.array(insts, dtype=object), len(cal_idx))[mask], np.tile(datetime_index, len(insts))[mask]],
+            names=["instrument", "datetime"],
+        )
+        return pd.DataFrame(values[mask], index=index, columns=column_names)
+
 
 class LocalCalendarProvider(CalendarProvider, ProviderBackendMixin):
     """Local calendar data provider class
@@ -740,42 +957,60 @@ class LocalFeatureProvider(FeatureProvider, ProviderBackendMixin):
         instrument = code_to_fname(instrument)
         return self.backend_obj(instrument=instrument, field=field, freq=freq)[start_index : end_index + 1]
 
+    def feature_panel(self, instruments, field, start_index, end_index, freq):
+        storage = self.backend_obj(instrument=code_to_fname(instruments[0]), field=str(field)[1:], freq=freq)
+        if not hasattr(storage, "read_panel"):
+            return super().feature_panel(instruments, field, start_index, end_index, freq)
+        # the storage supports reading a group of instruments at once (e.g. ColumnarFeatureStorage)
+        data = storage.read_panel([code_to_fname(inst) for inst in instruments], start_index, end_index)
+        data.columns = list(instruments)
+        return data
+
+    def feature_index_range(self, instrument, field, start_index, end_index, freq):
+        # the range is read from the storage directly, so the data is not loaded
+        field = str(field)[1:]
+        instrument = code_to_fname(instrument)
+        storage = self.backend_obj(instrument=instrument, field=field, freq=freq)
+        storage_start, storage_end = storage.start_index, storage.end_index
+        if storage_start is None:
+            return None
+        si = storage_start if start_index is None else max(start_index, storage_start)
+        ei = storage_end if end_index is None else min(end_index, storage_end)
+        if si > ei:
+            return None
+        return si, ei
+
 
 class LocalPITProvider(PITProvider):
     # TODO: Add PIT backend file storage
     # NOTE: This class is not multi-threading-safe!!!!
 
-    def period_feature(self, instrument, field, start_index, end_index, cur_time, period=None):
-        if not isinstance(cur_time, pd.Timestamp):
-            raise ValueError(
-                f"Expected pd.Timestamp for `cur_time`, got '{cur_time}'. Advices: you can't query PIT data directly(e.g. '$$roewa_q'), you must use `P` operator to convert data to each day (e.g. 'P($$roewa_q)')"
-            )
+    # the max number of the fields whose revision logs are kept in memory
+    max_cached_fields = 1024
 
-        assert end_index <= 0  # PIT don't support querying future data
+    def __init__(self):
+        self._records_cache = OrderedDict()
+
+    def _get_records(self, instrument, field):
+        """Load the revision log of a field
 
+        The log is read once and kept in memory until the file is modified.
+
+        Returns
+        -------
+        Tuple[np.ndarray, bool]
+            the records `(date, period, value, _next)` in the order of publishing and whether the field is quarterly
+        """
         DATA_RECORDS = [
             ("date", C.pit_record_type["date"]),
             ("period", C.pit_record_type["period"]),
             ("value", C.pit_record_type["value"]),
             ("_next", C.pit_record_type["index"]),
         ]
-        VALUE_DTYPE = C.pit_record_type["value"]
 
         field = str(field).lower()[2:]
         instrument = code_to_fname(instrument)
 
-        # {For acceleration
-        # start_index, end_index, cur_index = kwargs["info"]
-        # if cur_index == start_index:
-        #     if not hasattr(self, "all_fields"):
-        #         self.all_fields = []
-        #     self.all_fields.append(field)
-        #     if not hasattr(self, "period_index"):
-        #         self.period_index = {}
-        #     if field not in self.period_index:
-        #         self.period_index[field] = {}
-        # For acceleration}
-
         if not field.endswith("_q") and not field.endswith("_a"):
             raise ValueError("period field must ends with '_q' or '_a'")
         quarterly = field.endswith("_q")
@@ -783,22 +1018,43 @@ class LocalPITProvider(PITProvider):
         data_path = C.dpm.get_data_uri() / "financial" / instrument.lower() / f"{field}.data"
         if not (index_path.exists() and data_path.exists()):
             raise FileNotFoundError("No file is found.")
-        # NOTE: The most significant performance loss is here.
-        # Does the acceleration that makes the program complicated really matters?
-        # - It makes parameters of the interface complicate
-        # - It does not performance in the optimal way (places all the pieces together, we may achieve higher performance)
-        #    - If we design it carefully, we can go through for only once to get the historical evolution of the data.
-        # So I decide to deprecated previous implementation and keep the logic of the program simple
-        # Instead, I'll add a cache for the index file.
-        data = np.fromfile(data_path, dtype=DATA_RECORDS)
+
+        key = str(data_path)
+        mtime = data_path.stat().st_mtime_ns
+        if key in self._records_cache and self._records_cache[key][0] == mtime:
+            self._records_cache.move_to_end(key)
+        else:
+            # The revisions of a period are linked by `_next` in the order they are appended to the file. The file is
+            # sorted by date, so the latest revision of a period observed at a date is the last one in the file.
+            self._records_cache[key] = mtime, np.fromfile(data_path, dtype=DATA_RECORDS)
+            if len(self._records_cache) > self.max_cached_fields:
+                self._records_cache.popitem(last=False)
+        return self._records_cache[key][1], quarterly
+
+    def revision_dates(self, instrument, field) -> np.ndarray:
+        data, _ = self._get_records(instrument, field)
+        return np.unique(data["date"])
+
+    def period_feature(self, instrument, field, start_index, end_index, cur_time, period=None):
+        if not isinstance(cur_time, pd.Timestamp):
+            raise ValueError(
+                f"Expected pd.Timestamp for `cur_time`, got '{cur_time}'. Advices: you can't query PIT data directly(e.g. '$$roewa_q'), you must use `P` operator to convert data to each day (e.g. 'P($$roewa_q)')"
+            )
+
+        assert end_index <= 0  # PIT don't support querying future data
+
+        VALUE_DTYPE = C.pit_record_type["value"]
+
+        data, quarterly = self._get_records(instrument, field)
 
         # find all revision periods before `cur_time`
         cur_time_int = int(cur_time.year) * 10000 + int(cur_time.month) * 100 + int(cur_time.day)
         loc = np.searchsorted(data["date"], cur_time_int, side="right")
         if loc <= 0:
             return pd.Series(dtype=C.pit_record_type["value"])
-        last_period = data["period"][:loc].max()  # return the latest quarter
-        first_period = data["period"][:loc].min()
+        data = data[:loc]
+        last_period = data["period"].max()  # return the latest quarter
+        first_period = data["period"].min()
         period_list = get_period_list(first_period, last_period, quarterly)
         if period is not None:
             # NOTE: `period` has higher priority than `start_index` & `end_index`
@@ -808,25 +1064,13 @@ class LocalPITProvider(PITProvider):
                 period_list = [period]
         else:
             period_list = period_list[max(0, len(period_list) + start_index - 1) : len(period_list) + end_index]
-        value = np.full((len(period_list),), np.nan, dtype=VALUE_DTYPE)
-        for i, p in enumerate(period_list):
-            # last_period_index = self.period_index[field].get(period)  # For acceleration
-            value[i], now_period_index = read_period_data(
-                index_path, data_path, p, cur_time_int, quarterly  # , last_period_index  # For acceleration
-            )
-            # self.period_index[field].update({period: now_period_index})  # For acceleration
+        # the latest revision of each period
+        periods, latest = np.unique(data["period"][::-1], return_index=True)
+        pos = np.searchsorted(periods, period_list).clip(max=len(periods) - 1)
+        value = np.where(periods[pos] == period_list, data["value"][::-1][latest[pos]], np.nan).astype(VALUE_DTYPE)
         # NOTE: the index is period_list; So it may result in unexpected values(e.g. nan)
         # when calculation between different features and only part of its financial indicator is published
         series = pd.Series(value, index=period_list, dtype=VALUE_DTYPE)
-
-        # {For acceleration
-        # if cur_index == end_index:
-        #     self.all_fields.remove(field)
-        #     if not len(self.all_fields):
-        #         del self.all_fields
-        #         del self.period_index
-        # For acceleration}
-
         return series
 
 
@@ -839,12 +1083,10 @@ class LocalExpressionProvider(ExpressionProvider):
     def __init__(self, time2idx=True):
         super().__init__()
         self.time2idx = time2idx
+        self._latest_plan = None
 
-    def expression(self, instrument, field, start_time=None, end_time=None, freq="day"):
-        expression = self.get_expression_instance(field)
-        start_time = time_to_slc_point(start_time)
-        end_time = time_to_slc_point(end_time)
-
+    def _get_index_range(self, expression, start_time, end_time, freq):
+        """Get the index range of the result and the index range to load `expression` on"""
         # Two kinds of queries are supported
         # - Index-based expression: this may save a lot of memory because the datetime index is not saved on the disk
         # - Data with datetime index expression: this will make it more convenient to integrating with some existing databases
@@ -854,22 +1096,16 @@ class LocalExpressionProvider(ExpressionProvider):
             query_start, query_end = max(0, start_index - lft_etd), end_index + rght_etd
         else:
             start_index, end_index = query_start, query_end = start_time, end_time
+        return start_index, end_index, query_start, query_end
 
-        try:
-            series = expression.load(instrument, query_start, query_end, freq)
-        except Exception as e:
-            get_module_logger("data").debug(
-                f"Loading expression error: "
-                f"instrument={instrument}, field=({field}), start_time={start_time}, end_time={end_time}, freq={freq}. "
-                f"error info: {str(e)}"
-            )
-            raise
+    @staticmethod
+    def _format_series(series, start_index, end_index):
         # Ensure that each column type is consistent
         # FIXME:
-        # 1) The stock data is currently float. If there is other types of data, this part needs to be re-implemented.
-        # 2) The precision should be configurable
+        # The stock data is currently float. If there is other types of data, this part needs to be re-implemented.
+        # The precision is configured by `expression_dtype`
         try:
-            series = series.astype(np.float32)
+            series = series.astype(C.get("expression_dtype", np.float32))
         except ValueError:
             pass
         except TypeError:
@@ -878,6 +1114,66 @@ class LocalExpressionProvider(ExpressionProvider):
             series = series.loc[start_index:end_index]
         return series
 
+    def expression(self, instrument, field, start_time=None, end_time=None, freq="day"):
+        expression = self.get_expression_instance(field)
+        start_time = time_to_slc_point(start_time)
+        end_time = time_to_slc_point(end_time)
+        start_index, end_index, query_start, query_end = self._get_index_range(expression, start_time, end_time, freq)
+
+        try:
+            series = expression.load(instrument, query_start, query_end, freq, shared=True)
+        except Exception as e:
+            get_module_logger("data").debug(
+                f"Loading expression error: "
+                f"instrument={instrument}, field=({field}), start_time={start_time}, end_time={end_time}, freq={freq}. "
+                f"error info: {str(e)}"
+            )
+            raise
+        return self._format_series(series, start_index, end_index)
+
+    def _get_plan(self, fields, start_time, end_time, freq):
+        """Get the plan of loading a group of fields and the index ranges of the results
+
+        The plan doesn't depend on the instrument, so the latest one is reused when the same fields are loaded for the
+        instruments one by one.
+        """
+        plan_key = tuple(fields), start_time, end_time, freq
+        if self._latest_plan is not None and self._latest_plan[0] == plan_key:
+            return self._latest_plan[1:]
+        expressions = [self.get_expression_instance(field) for field in fields]
+        index_ranges = [self._get_index_range(expression, start_time, end_time, freq) for expression in expressions]
+        # The expressions are only shared among the fields loaded on the same index range, so the fields bounded by
+        # their extended windows are loaded on the range covering all of them
+        bounded = [is_window_bounded(expression) for expression in expressions]
+        if self.time2idx and any(bounded):
+            query_start = min(r[2] for r, b in zip(index_ranges, bounded) if b)
+            query_end = max(r[3] for r, b in zip(index_ranges, bounded) if b)
+            index_ranges = [(r[0], r[1], query_start, query_end) if b else r for r, b in zip(index_ranges, bounded)]
+        plan = ExpressionPlan()
+        for expression, (_, _, query_start, query_end) in zip(expressions, index_ranges):
+            plan.add(expression, query_start, query_end)
+        self._latest_plan = plan_key, plan, index_ranges
+        return plan, index_ranges
+
+    def expressions(self, instrument, fields, start_time=None, end_time=None, freq="day"):
+        start_time = time_to_slc_point(start_time)
+        end_time = time_to_slc_point(end_time)
+        plan, index_ranges = self._get_plan(fields, start_time, end_time, freq)
+
+        try:
+            series_l = plan.load(instrument, freq)
+        except Exception as e:
+            get_module_logger("data").debug(
+                f"Loading expressions error: "
+                f"instrument={instrument}, fields=({fields}), start_time={start_time}, end_time={end_time}, freq={freq}. "
+                f"error info: {str(e)}"
+            )
+            raise
+        return {
+            field: self._format_series(series, start_index, end_index)
+            for field, series, (start_index, end_index, _, _) in zip(fields, series_l, index_ranges)
+        }
+
 
 class LocalDatasetProvider(DatasetProvider):
     """Local dataset data provider class
@@ -885,7 +1181,7 @@ class LocalDatasetProvider(DatasetProvider):
     Provide dataset data from local data source.
     """
 
-    def __init__(self, align_time: bool = True):
+    def __init__(self, align_time: bool = True, panel_size: int = 0):
         """
         Parameters
         ----------
@@ -895,9 +1191,17 @@ class LocalDatasetProvider(DatasetProvider):
             For the data with fixed frequency with a shared calendar, the align data to the calendar will provides following benefits
 
             - Align queries to the same parameters, so the cache can be shared.
+        panel_size : int
+            The max number of instruments calculated together as a (time x instrument) panel.
+            0 means the expressions are calculated instrument by instrument.
+            Calculating on panels removes most of the per-instrument overhead of the expression engine, but the memory
+            cache will hold panels instead of series, so a moderate value (e.g. 100~500) is recommended.
+            `inst_processors` are not supported on panels and the instruments will be calculated one by one, so is the
+            expression cache which can't cache panels (e.g. `DiskExpressionCache`).
         """
         super().__init__()
         self.align_time = align_time
+        self.panel_size = panel_size
 
     def dataset(
         self,
@@ -920,9 +1224,21 @@ class LocalDatasetProvider(DatasetProvider):
                 )
             start_time = cal[0]
             end_time = cal[-1]
-        data = self.dataset_processor(
-            instruments_d, column_names, start_time, end_time, freq, inst_processors=inst_processors
-        )
+        use_panel = self.panel_size > 0 and not inst_processors
+        if use_panel and not getattr(ExpressionD, "support_panel", False):
+            get_module_logger("data").warning(
+                "The expressions can't be evaluated on panels by the expression provider (e.g. the expression cache), "
+                "calculate the dataset instrument by instrument"
+            )
+            use_panel = False
+        if use_panel:
+            data = self.panel_dataset_processor(
+                instruments_d, column_names, start_time, end_time, freq, panel_size=self.panel_size
+            )
+        else:
+            data = self.dataset_processor(
+                instruments_d, column_names, start_time, end_time, freq, inst_processors=inst_processors
+            )
 
         return data
 
@@ -1,10 +1,15 @@
 from ...utils.serial import Serializable
-from typing import Callable, Union, List, Tuple, Dict, Text, Optional
+from typing import Callable, Iterator, Union, List, Tuple, Dict, Text, Optional
 from ...utils import init_instance_by_config, np_ffill, time_to_slc_point
 from ...log import get_module_logger
 from .handler import DataHandler, DataHandlerLP
 from copy import copy, deepcopy
 from inspect import getfullargspec
+from pathlib import Path
+import hashlib
+import os
+import pickle
+import shutil
 import pandas as pd
 import numpy as np
 import bisect
@@ -177,18 +182,21 @@ class DatasetH(Dataset):
         slc : please refer to the docs of `prepare`
                 NOTE: it may not be an instance of slice. It may be a segment of `segments` from `def prepare`
         """
+        fetch = self.handler.fetch_iter if kwargs.pop("as_iterator", False) else self.handler.fetch
         if hasattr(self, "fetch_kwargs"):
-            return self.handler.fetch(slc, **kwargs, **self.fetch_kwargs)
+            return fetch(slc, **kwargs, **self.fetch_kwargs)
         else:
-            return self.handler.fetch(slc, **kwargs)
+            return fetch(slc, **kwargs)
 
     def prepare(
         self,
         segments: Union[List[Text], Tuple[Text], Text, slice, pd.Index],
         col_set=DataHandler.CS_ALL,
         data_key=DataHandlerLP.DK_I,
+        as_iterator: bool = False,
+        chunk_size: int = 1000,
         **kwargs,
-    ) -> Union[List[pd.DataFrame], pd.DataFrame]:
+    ) -> Union[List[pd.DataFrame], pd.DataFrame, List[Iterator[pd.DataFrame]], Iterator[pd.DataFrame]]:
         """
         Prepare the data for learning and inference.
 
@@ -211,6 +219,12 @@ class DatasetH(Dataset):
         data_key : str
             The data to fetch:  DK_*
             Default is DK_I, which indicate fetching data for **inference**.
+        as_iterator : bool
+            Whether to return an iterator of the datetime chunks of the data instead of the whole data (see
+            `DataHandler.fetch_iter`). With a `DataHandlerLP` set up by `init_type=DataHandlerLP.IT_LAZY`, the chunks
+            are processed one by one, so the processed data of a segment is never materialized at once.
+        chunk_size : int
+            The number of datetimes in each chunk if `as_iterator` is True
 
         kwargs :
             The parameters that kwargs may contain:
@@ -220,7 +234,7 @@ class DatasetH(Dataset):
 
         Returns
         -------
-        Union[List[pd.DataFrame], pd.DataFrame]:
+        Union[List[pd.DataFrame], pd.DataFrame, List[Iterator[pd.DataFrame]], Iterator[pd.DataFrame]]:
 
         Raises
         ------
@@ -228,6 +242,8 @@ class DatasetH(Dataset):
         """
         logger = get_module_logger("DatasetH")
         seg_kwargs = {"col_set": col_set}
+        if as_iterator:
+            seg_kwargs.update(as_iterator=True, chunk_size=chunk_size)
         seg_kwargs.update(kwargs)
         if "data_key" in getfullargspec(self.handler.fetch).args:
             seg_kwargs["data_key"] = data_key
@@ -352,6 +368,7 @@ class TSDataSampler:
         fillna_type: str = "none",
         dtype=None,
         flt_data=None,
+        mmap_dir: Union[str, Path] = None,
     ):
         """
         Build a dataset which looks like torch.data.utils.Dataset.
@@ -378,6 +395,15 @@ class TSDataSampler:
             a column of data(True or False) to filter data. Its index order is <"datetime", "instrument">
             None:
                 kepp all data
+        mmap_dir : Union[str, Path]
+            The directory to persist the arrays of the sampler (e.g. a directory on "/dev/shm" for shared memory).
+
+            - The arrays are saved in a sub-directory named by the hash of the input data and the arguments. They are
+              memory-mapped instead of being kept in memory.
+            - So the workers of torch `DataLoader` open them zero-copy instead of copying them when the sampler is
+              pickled, and the samplers created by the same data (e.g. the same handler in other runs) load them
+              directly instead of building them again.
+            - None: the arrays are kept in memory
 
         """
         self.start = start
@@ -385,6 +411,68 @@ class TSDataSampler:
         self.step_len = step_len
         self.fillna_type = fillna_type
         assert get_level_index(data, "datetime") == 0
+        self.mmap_path = None
+        if mmap_dir is not None:
+            self.mmap_path = Path(mmap_dir).expanduser() / self._get_mmap_key(data, dtype, flt_data)
+            if not self.mmap_path.exists():
+                self._build(data, dtype, flt_data)
+                self._dump_mmap(self.mmap_path)
+            else:
+                data.drop(data.columns, axis=1, inplace=True)
+            self._load_mmap(self.mmap_path)
+        else:
+            self._build(data, dtype, flt_data)
+
+    # the arrays which are memory-mapped and the attributes which are pickled in `mmap_path`
+    MMAP_ARRAYS = ["data_arr", "idx_arr", "idx_map"]
+    MMAP_ATTRS = ["idx_df", "data_index", "nan_idx"]
+
+    def _get_mmap_key(self, data: pd.DataFrame, dtype, flt_data) -> str:
+        """the hash of the input data and the arguments of the sampler"""
+        md5 = hashlib.md5()
+        md5.update(pd.util.hash_pandas_object(data).values.tobytes())
+        md5.update(str((data.columns.tolist(), data.dtypes.tolist(), dtype)).encode())
+        md5.update(str((self.start, self.end, self.step_len, self.fillna_type)).encode())
+        if flt_data is not None:
+            md5.update(pd.util.hash_pandas_object(flt_data).values.tobytes())
+        return md5.hexdigest()
+
+    def _dump_mmap(self, path: Path):
+        # dump into a temporary directory first, so the other processes will never load the incomplete data
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.mkdir(parents=True, exist_ok=True)
+        for name in self.MMAP_ARRAYS:
+            np.save(tmp_path / f"{name}.npy", getattr(self, name))
+        with (tmp_path / "meta.pkl").open("wb") as f:
+            pickle.dump({name: getattr(self, name) for name in self.MMAP_ATTRS}, f)
+        try:
+            tmp_path.rename(path)
+        except OSError:
+            # the data has been dumped by another process
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def _load_mmap(self, path: Path):
+        for name in self.MMAP_ARRAYS:
+            setattr(self, name, np.load(path / f"{name}.npy", mmap_mode="r"))
+        with (path / "meta.pkl").open("rb") as f:
+            self.__dict__.update(pickle.load(f))
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        if self.mmap_path is not None:
+            # the memory-mapped arrays will be opened again instead of being copied
+            for name in self.MMAP_ARRAYS:
+                state.pop(name)
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        if self.mmap_path is not None:
+            for name in self.MMAP_ARRAYS:
+                setattr(self, name, np.load(self.mmap_path / f"{name}.npy", mmap_mode="r"))
+
+    def _build(self, data: pd.DataFrame, dtype, flt_data):
+        """build the arrays of the sampler from the data"""
         self.data = data.swaplevel().sort_index().copy()
         data.drop(
             data.columns, axis=1, inplace=True
@@ -423,7 +511,7 @@ class TSDataSampler:
             self.data_index = self.data_index[np.where(self.flt_data)[0]]
         self.idx_map = self.idx_map2arr(self.idx_map)
         self.idx_map, self.data_index = self.slice_idx_map_and_data_index(
-            self.idx_map, self.idx_df, self.data_index, start, end
+            self.idx_map, self.idx_df, self.data_index, self.start, self.end
         )
 
         self.idx_arr = np.array(self.idx_df.values, dtype=np.float64)  # for better performance
@@ -563,6 +651,69 @@ class TSDataSampler:
             assert self.fillna_type == "none"
         return indices
 
+    def _get_batch_indices(self, ids: np.ndarray) -> np.ndarray:
+        """
+        get the indices of self.data_arr of a batch of samples, it is the vectorized version of `_get_indices`
+
+        Parameters
+        ----------
+        ids : np.ndarray
+            the int indices of the samples
+
+        Returns
+        -------
+        np.ndarray:
+            The (batch, step_len) indices of the data, the lost dates are indexed by the last nan line
+        """
+        ids = np.asarray(ids)
+        if ((ids < 0) | (ids >= len(self.idx_map))).any():
+            raise KeyError(f"{ids[(ids < 0) | (ids >= len(self.idx_map))][0]} is out of [0, {len(self.idx_map)})")
+        rows, cols = self.idx_map[ids, 0], self.idx_map[ids, 1]
+        steps = rows[:, None].astype(np.int64) + np.arange(1 - self.step_len, 1)
+        indices = self.idx_arr[np.maximum(steps, 0), cols[:, None]]
+        indices[steps < 0] = np.nan
+
+        if self.fillna_type == "ffill":
+            indices = np_ffill(indices)
+        elif self.fillna_type == "ffill+bfill":
+            indices = np_ffill(np_ffill(indices)[:, ::-1])[:, ::-1]
+        else:
+            assert self.fillna_type == "none"
+        return np.nan_to_num(indices, nan=self.nan_idx).astype(int)
+
+    def get_batch(self, ids: np.ndarray, pin_memory: bool = False):
+        """
+        get the time-series of a batch of samples by one gather, it is equal to `self[ids]` but faster
+
+        .. code-block:: python
+
+            from torch.utils.data import BatchSampler, DataLoader, RandomSampler
+
+            # the batches are gathered by `get_batch` instead of collating the samples one by one
+            DataLoader(tsds, sampler=BatchSampler(RandomSampler(tsds), batch_size=800, drop_last=True), batch_size=None)
+
+        Parameters
+        ----------
+        ids : np.ndarray
+            the int indices of the samples
+        pin_memory : bool
+            return a torch tensor in pinned memory, which the data is gathered into directly (it requires torch)
+
+        Returns
+        -------
+        Union[np.ndarray, torch.Tensor]:
+            the data with shape <sample_idx, step_idx, feature_idx>
+        """
+        indices = self._get_batch_indices(ids)
+        if not pin_memory:
+            return np.take(self.data_arr, indices, axis=0)
+        import torch  # pylint: disable=C0415
+
+        dtype = torch.from_numpy(np.empty(0, dtype=self.data_arr.dtype)).dtype
+        out = torch.empty(indices.shape + self.data_arr.shape[1:], dtype=dtype, pin_memory=True)
+        np.take(self.data_arr, indices, axis=0, out=out.numpy())
+        return out
+
     def _get_row_col(self, idx) -> Tuple[int]:
         """
         get the col index and row index of a given sample index in self.idx_df
@@ -615,6 +766,8 @@ class TSDataSampler:
         """
         # Multi-index type
         mtit = (list, np.ndarray)
+        if isinstance(idx, mtit) and len(idx) > 0 and np.asarray(idx).dtype.kind in "iu":
+            return self.get_batch(idx)
         if isinstance(idx, mtit):
             indices = [self._get_indices(*self._get_row_col(i)) for i in idx]
             indices = np.concatenate(indices)
@@ -628,6 +781,9 @@ class TSDataSampler:
 
         if (np.diff(indices) == 1).all():  # slicing instead of indexing for speeding up.
             data = self.data_arr[indices[0] : indices[-1] + 1]
+            if self.mmap_path is not None:
+                # the memory-mapped data is readonly
+                data = np.array(data)
         else:
             data = self.data_arr[indices]
         if isinstance(idx, mtit):
@@ -661,8 +817,19 @@ class TSDatasetH(DatasetH):
 
     DEFAULT_STEP_LEN = 30
 
-    def __init__(self, step_len=DEFAULT_STEP_LEN, **kwargs):
+    def __init__(self, step_len=DEFAULT_STEP_LEN, mmap_dir: Union[str, Path] = None, dtype=None, **kwargs):
+        """
+        Parameters
+        ----------
+        mmap_dir : Union[str, Path]
+            The directory to persist the arrays of the prepared `TSDataSampler`, please refer to `TSDataSampler`
+        dtype :
+            The dtype of the arrays of the prepared `TSDataSampler` (e.g. "float16" halves the memory of float32 data),
+            it could be overridden by the `dtype` argument of `prepare`
+        """
         self.step_len = step_len
+        self.mmap_dir = mmap_dir
+        self.dtype = dtype
         super().__init__(**kwargs)
 
     def config(self, **kwargs):
@@ -690,7 +857,9 @@ class TSDatasetH(DatasetH):
         split the _prepare_raw_seg is to leave a hook for data preprocessing before creating processing data
         NOTE: TSDatasetH only support slc segment on datetime !!!
         """
-        dtype = kwargs.pop("dtype", None)
+        if kwargs.pop("as_iterator", False):
+            raise NotImplementedError("TSDatasetH doesn't support preparing the data as an iterator")
+        dtype = kwargs.pop("dtype", getattr(self, "dtype", None))
         if not isinstance(slc, slice):
             slc = slice(*slc)
         start, end = slc.start, slc.stop
@@ -715,6 +884,7 @@ class TSDatasetH(DatasetH):
             step_len=self.step_len,
             dtype=dtype,
             flt_data=flt_data,
+            mmap_dir=getattr(self, "mmap_dir", None),
         )
         return tsds
 
@@ -0,0 +1,231 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+"""
+The disk cache of the data handlers.
+
+The processed data of a handler (e.g. `_infer` and `_learn` of `DataHandlerLP`) and its fitted processors are saved
+under a directory named by a stable hash of everything the data depends on, so a handler with the same configuration
+can skip loading and processing the data next time.
+"""
+import os
+import pickle
+import shutil
+import uuid
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from ...config import C
+from ...log import get_module_logger
+from ...utils import hash_args
+from .utils import dump_frame, load_frame
+
+
+class HandlerCache:
+    """
+    A content-addressed cache of the data handlers on disk.
+
+    - The key is the hash of the handler class, the config of the data loader, the instruments, the time range, the
+      processors (including their fitted state) and the other settings changing the data (see `get_key`).
+    - The frames are saved in a columnar format (see `dump_frame`), so they are loaded at about the disk speed.
+    - The least recently used entries are evicted when the total size exceeds `size_limit`.
+
+    NOTE: the key can't tell the changes of the data source except `provider_uri` (e.g. the data is updated in place),
+    the cache should be cleared in that case.
+    """
+
+    META_FILE = "meta.pkl"
+    PROC_ATTRS = ["shared_processors", "infer_processors", "learn_processors"]
+    DATA_ATTRS = ["_data", "_infer", "_learn"]
+    # the settings of `DataHandlerLP` changing the processed data
+    KEY_ATTRS = ["instruments", "start_time", "end_time", "process_type", "drop_raw"]
+
+    def __init__(self, path: Optional[str] = None, size_limit: Optional[int] = None, compress: Optional[bool] = None):
+        """
+        Parameters
+        ----------
+        path : str
+            the directory of the cache, `C["handler_cache_path"]` by default
+        size_limit : int
+            the limit of the total bytes of the cache, `C["handler_cache_size_limit"]` by default. 0 means no limit
+        compress : bool
+            compress the frames by zlib, `C["handler_cache_compress"]` by default
+        """
+        if path is None:
+            path = C.get("handler_cache_path", None)
+        if path is None:
+            local_cache_path = C.get("local_cache_path", None)
+            path = (
+                Path(local_cache_path) / "handler_cache"
+                if local_cache_path is not None
+                else Path("~/.cache/qlib_handler_cache")
+            )
+        self.path = Path(path).expanduser().resolve()
+        self.size_limit = C.get("handler_cache_size_limit", 0) if size_limit is None else size_limit
+        self.compress = C.get("handler_cache_compress", False) if compress is None else compress
+        self.logger = get_module_logger(self.__class__.__name__)
+
+    @classmethod
+    def _to_hashable(cls, obj, depth: int = 0):
+        """convert `obj` to a json serializable object describing its content"""
+        if depth > 20:
+            raise RecursionError(f"The object is too deep to be hashed: {obj!r}")
+        if obj is None or isinstance(obj, (bool, int, float, str)):
+            return obj
+        if isinstance(obj, (np.generic, pd.Timestamp, np.datetime64, Path)):
+            return str(obj)
+        if isinstance(obj, (list, tuple)):
+            return [cls._to_hashable(o, depth + 1) for o in obj]
+        if isinstance(obj, (set, frozenset)):
+            return sorted(map(str, obj))
+        if isinstance(obj, dict):
+            return {str(k): cls._to_hashable(v, depth + 1) for k, v in obj.items()}
+        if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+            md5 = hashlib.md5(pd.util.hash_pandas_object(obj).values.tobytes())
+            if isinstance(obj, pd.DataFrame):
+                md5.update(str((obj.columns.tolist(), obj.dtypes.tolist())).encode())
+            return {"pandas": md5.hexdigest()}
+        if isinstance(obj, np.ndarray):
+            return {
+                "ndarray": hashlib.md5(np.ascontiguousarray(obj).view(np.uint8)).hexdigest(),
+                "dtype": str(obj.dtype),
+            }
+        if isinstance(obj, type) or callable(obj) and hasattr(obj, "__qualname__"):
+            return f"{getattr(obj, '__module__', '')}.{obj.__qualname__}"
+        if hasattr(obj, "__dict__"):
+            # the private attributes are the caches or the runtime states except the ones included explicitly
+            include = set(getattr(obj, "include_attr", []))
+            return {
+                "class": cls._to_hashable(type(obj), depth + 1),
+                "attrs": {
+                    k: cls._to_hashable(v, depth + 1)
+                    for k, v in vars(obj).items()
+                    if not k.startswith("_") or k in include
+                },
+            }
+        return repr(obj)
+
+    def get_key(self, handler, **kwargs) -> str:
+        """
+        Get the key of the data of `handler`
+
+        Parameters
+        ----------
+        handler : DataHandler
+            the handler whose data are not set up yet
+        kwargs :
+            the other arguments changing the data (e.g. `init_type` of `DataHandlerLP.setup_data`)
+        """
+        desc = {
+            "handler": type(handler),
+            "data_loader": handler.data_loader,
+            "provider_uri": C.get("provider_uri", None),
+            # the precision of the loaded expressions
+            "expression_dtype": C.get("expression_dtype", None),
+            **{attr: getattr(handler, attr, None) for attr in self.KEY_ATTRS + self.PROC_ATTRS},
+            **kwargs,
+        }
+        return hash_args(self._to_hashable(desc))
+
+    def load(self, handler, key: str) -> bool:
+        """
+        Load the cached data and processors into `handler`
+
+        Returns
+        -------
+        bool:
+            whether the cache is hit
+        """
+        entry = self.path / key
+        try:
+            with (entry / self.META_FILE).open("rb") as f:
+                meta = pickle.load(f)
+            data = {}
+            for attr, ref in meta["data"].items():
+                # the attributes could be the same object (e.g. `_learn` is `_infer` without learn processors)
+                data[attr] = data[ref] if ref in data else load_frame(entry / ref)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            if not isinstance(e, FileNotFoundError):
+                self.logger.warning(f"Failed to load the handler cache {entry}: {e}")
+            return False
+        for attr, value in {**data, **meta["processors"]}.items():
+            setattr(handler, attr, value)
+        # the modification time is the last used time of the entry for eviction
+        os.utime(entry)
+        self.logger.info(f"Handler data are loaded from the cache {entry}")
+        return True
+
+    def dump(self, handler, key: str):
+        """
+        Dump the data and processors of `handler`, and evict the least recently used entries if the cache is full
+        """
+        entry = self.path / key
+        if entry.exists():
+            os.utime(entry)
+            return
+        # write to a temporary directory and then rename it, so a partially written entry will never be read
+        tmp = self.path / f".{key}.{uuid.uuid4().hex}.tmp"
+        try:
+            tmp.mkdir(parents=True)
+            data = {}
+            for attr in self.DATA_ATTRS:
+                if not hasattr(handler, attr):
+                    continue
+                value = getattr(handler, attr)
+                ref = next((k for k in data if getattr(handler, k) is value), attr)
+                if ref == attr:
+                    dump_frame(value, tmp / attr, compress=self.compress)
+                data[attr] = ref
+            meta = {
+                "data": data,
+                "processors": {attr: getattr(handler, attr) for attr in self.PROC_ATTRS if hasattr(handler, attr)},
+            }
+            with (tmp / self.META_FILE).open("wb") as f:
+                pickle.dump(meta, f, protocol=C.dump_protocol_version)
+            os.rename(tmp, entry)
+        except OSError as e:
+            # e.g. the entry is dumped by another process at the same time
+            if not entry.exists():
+                self.logger.warning(f"Failed to dump the handler cache {entry}: {e}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=key)
+
+    @staticmethod
+    def _get_size(path: Path) -> int:
+        return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+    def evict(self, keep: Optional[str] = None):
+        """
+        Remove the least recently used entries until the total size is within the limit
+
+        Parameters
+        ----------
+        keep : str
+            the key of the entry which should not be removed (e.g. the one just dumped)
+        """
+        if not self.size_limit or not self.path.exists():
+            return
+        entries = []
+        for p in self.path.iterdir():
+            if p.is_dir() and not p.name.startswith("."):
+                try:
+                    entries.append((p.stat().st_mtime, self._get_size(p), p))
+                except FileNotFoundError:
+                    continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries, key=lambda x: x[0]):
+            if total <= self.size_limit:
+                break
+            if p.name == keep:
+                continue
+            shutil.rmtree(p, ignore_errors=True)
+            total -= size
+            self.logger.info(f"The handler cache {p} is evicted")
+
+    def clear(self):
+        """remove all the entries"""
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -3,6 +3,7 @@
 
 # coding=utf-8
 import warnings
+from functools import partial
 from typing import Callable, Union, Tuple, List, Iterator, Optional
 
 import pandas as pd
@@ -11,9 +12,11 @@ from qlib.typehint import Literal
 from ...log import get_module_logger, TimeInspector
 from ...utils import init_instance_by_config
 from ...utils.serial import Serializable
-from .utils import fetch_df_by_index, fetch_df_by_col
+from ...utils.paral import ShardExecutor
+from .utils import fetch_df_by_index, fetch_df_by_col, share_memory, get_level_index, DatetimeOffsets
 from ...utils import lazy_sort_index
 from .loader import DataLoader
+from .cache import HandlerCache
 
 from . import processor as processor_module
 from . import loader as data_loader_module
@@ -135,14 +138,20 @@ class DataHandler(Serializable):
             - if `enable_cache` == True:
 
                 the processed data will be saved on disk, and handler will load the cached data from the disk directly
-                when we call `init` next time
+                when we call `init` next time (see `HandlerCache`)
         """
+        cache = HandlerCache() if enable_cache else None
+        if cache is not None:
+            key = cache.get_key(self)
+            if cache.load(self, key):
+                return
         # Setup data.
         # _data may be with multiple column index level. The outer level indicates the feature set name
         with TimeInspector.logt("Loading data"):
             # make sure the fetch method is based on an index-sorted pd.DataFrame
             self._data = lazy_sort_index(self.data_loader.load(self.instruments, self.start_time, self.end_time))
-        # TODO: cache
+        if cache is not None:
+            cache.dump(self, key)
 
     CS_ALL = "__all"  # return all columns with single-level index column
     CS_RAW = "__raw"  # return raw data with multi-level index column
@@ -251,11 +260,20 @@ class DataHandler(Serializable):
 
         if isinstance(data_storage, pd.DataFrame):
             data_df = data_storage
+            # the rows of a datetime selector are sliced by the offset table if possible
+            rows = self._get_datetime_rows(data_df, selector, level)
             if proc_func is not None:
                 # FIXME: fetching by time first will be more friendly to `proc_func`
                 # Copy in case of `proc_func` changing the data inplace....
-                data_df = proc_func(fetch_df_by_index(data_df, selector, level, fetch_orig=self.fetch_orig).copy())
+                if rows is not None:
+                    data_df = data_df.iloc[rows]
+                else:
+                    data_df = fetch_df_by_index(data_df, selector, level, fetch_orig=self.fetch_orig)
+                data_df = proc_func(data_df.copy())
                 data_df = fetch_df_by_col(data_df, col_set)
+            elif rows is not None:
+                # slicing the rows first is a view, so only the rows selected are copied by `fetch_df_by_col`
+                data_df = fetch_df_by_col(data_df.iloc[rows], col_set)
             else:
                 # Fetch column  first will be more friendly to SepDataFrame
                 data_df = fetch_df_by_col(data_df, col_set)
@@ -282,6 +300,75 @@ class DataHandler(Serializable):
                 data_df = data_df.reset_index(level=level, drop=True)
         return data_df
 
+    def _get_datetime_offsets(self, df: pd.DataFrame) -> DatetimeOffsets:
+        """
+        get the datetime offset table of `df`, which is built once and kept until the index of `df` is changed
+        """
+        # the table is cached on the index (which is immutable), so it is shared by the frames with the same rows
+        # (e.g. the views of different columns) and dropped with the index. It is not pickled with the index.
+        offsets = getattr(df.index, "_qlib_dt_offsets", None)
+        if offsets is None:
+            offsets = DatetimeOffsets(df.index)
+            df.index._qlib_dt_offsets = offsets
+        return offsets
+
+    def _get_datetime_rows(
+        self, df: pd.DataFrame, selector: Union[pd.Timestamp, slice, str, pd.Index], level: Union[str, int]
+    ) -> Optional[slice]:
+        """
+        get the rows of `df` selected by a datetime `selector` by the offset table, None if it is not applicable
+        (e.g. other selectors or levels, or `df` is not sorted by datetime)
+        """
+        if level is None or get_level_index(df, level) != 0:
+            return None
+        if isinstance(selector, slice):
+            if selector.step is not None or (selector.start is None and selector.stop is None):
+                return None
+        elif not isinstance(selector, (str, pd.Timestamp)):
+            return None
+        offsets = self._get_datetime_offsets(df)
+        return offsets.get_rows(selector) if offsets.valid else None
+
+    def fetch_iter(
+        self, selector: Union[slice, Tuple] = slice(None, None), chunk_size: int = 1000, **kwargs
+    ) -> Iterator[pd.DataFrame]:
+        """
+        fetch the data by datetime chunks, so the data of a long time range could be iterated without being
+        materialized at once (e.g. by a `DataHandlerLP` with `init_type=DataHandlerLP.IT_LAZY`)
+
+        Parameters
+        ----------
+        selector : Union[slice, Tuple]
+            the datetime range of the data
+        chunk_size : int
+            the number of datetimes in each chunk
+        kwargs :
+            the other arguments of `fetch` except `level` (the data is always selected on the datetime level)
+
+        Returns
+        -------
+        Iterator[pd.DataFrame]:
+            the non-empty chunks in the order of datetime
+        """
+        if isinstance(selector, (tuple, list)):
+            selector = slice(*selector)
+        datetimes = self._get_datetimes(**kwargs)
+        datetimes = datetimes[datetimes.slice_indexer(selector.start, selector.stop)]
+        for i in range(0, len(datetimes), chunk_size):
+            chunk_slc = slice(datetimes[i], datetimes[min(i + chunk_size, len(datetimes)) - 1])
+            df = self.fetch(chunk_slc, level="datetime", **kwargs)
+            if len(df) > 0:
+                yield df
+
+    def _get_datetimes(self, data: pd.DataFrame = None, **kwargs) -> pd.Index:
+        """the sorted datetimes of the data (some of them may be absent after slicing the data)"""
+        if data is None:
+            data = self._data
+        index = data.index
+        if isinstance(index, pd.MultiIndex):
+            index = index.levels[index.names.index("datetime")]
+        return index.unique().sort_values()
+
     def get_cols(self, col_set=CS_ALL) -> list:
         """
         get the column names
@@ -300,6 +387,11 @@ class DataHandler(Serializable):
         df = fetch_df_by_col(df, col_set)
         return df.columns.to_list()
 
+    def _get_trading_dates(self) -> pd.Index:
+        """the datetimes in `self._data`"""
+        offsets = self._get_datetime_offsets(self._data)
+        return offsets.datetimes if offsets.valid else self._data.index.unique(level="datetime")
+
     def get_range_selector(self, cur_date: Union[pd.Timestamp, str], periods: int) -> slice:
         """
         get range selector by number of periods
@@ -308,7 +400,7 @@ class DataHandler(Serializable):
             cur_date (pd.Timestamp or str): current date
             periods (int): number of periods
         """
-        trading_dates = self._data.index.unique(level="datetime")
+        trading_dates = self._get_trading_dates()
         cur_loc = trading_dates.get_loc(cur_date)
         pre_loc = cur_loc - periods + 1
         if pre_loc < 0:
@@ -328,7 +420,7 @@ class DataHandler(Serializable):
             min_periods (int): minimum periods for sliced dataframe.
             kwargs (dict): will be passed to `self.fetch`.
         """
-        trading_dates = self._data.index.unique(level="datetime")
+        trading_dates = self._get_trading_dates()
         if min_periods is None:
             min_periods = periods
         for cur_date in trading_dates[min_periods:]:
@@ -361,7 +453,7 @@ class DataHandlerLP(DataHandler):
 
     - To reduce the memory cost
 
-        - `drop_raw=True`: this will modify the data inplace on raw data;
+        - `drop_raw=True`: this will modify the data inplace on raw data if it is not shared with the data loader;
 
     - Please note processed data like `self._infer` or `self._learn` are concepts different from `segments` in Qlib's `Dataset` like "train" and "test"
 
@@ -404,6 +496,7 @@ class DataHandlerLP(DataHandler):
         shared_processors: List = [],
         process_type=PTYPE_A,
         drop_raw=False,
+        proc_executor: Union[dict, ShardExecutor, None] = None,
         **kwargs,
     ):
         """
@@ -447,6 +540,11 @@ class DataHandlerLP(DataHandler):
               - (e.g. self._infer processed by learn_processors )
         drop_raw: bool
             Whether to drop the raw data
+        proc_executor: Union[dict, ShardExecutor, None]
+            The executor to run the processors in parallel (the kwargs of `ShardExecutor` if it is a dict, e.g.
+            `{"n_jobs": 16, "backend": "loky"}`). The processors like `ZScoreNorm`, `RobustZScoreNorm`, `Fillna` and the
+            cross sectional ones shard their work by columns or by datetime ranges, and the results are exactly the
+            same as the serial ones. The processors run serially if it is None.
         """
 
         # Setup preprocessor
@@ -465,6 +563,7 @@ class DataHandlerLP(DataHandler):
 
         self.process_type = process_type
         self.drop_raw = drop_raw
+        self.proc_executor = ShardExecutor(**proc_executor) if isinstance(proc_executor, dict) else proc_executor
         super().__init__(instruments, start_time, end_time, data_loader, **kwargs)
 
     def get_all_processors(self):
@@ -474,9 +573,10 @@ class DataHandlerLP(DataHandler):
         """
         fit data without processing the data
         """
-        for proc in self.get_all_processors():
-            with TimeInspector.logt(f"{proc.__class__.__name__}"):
-                proc.fit(self._data)
+        with processor_module.use_executor(getattr(self, "proc_executor", None)):
+            for proc in self.get_all_processors():
+                with TimeInspector.logt(f"{proc.__class__.__name__}"):
+                    proc.fit(self._data)
 
     def fit_process_data(self):
         """
@@ -488,11 +588,28 @@ class DataHandlerLP(DataHandler):
 
     @staticmethod
     def _run_proc_l(
-        df: pd.DataFrame, proc_l: List[processor_module.Processor], with_fit: bool, check_for_infer: bool
+        df: pd.DataFrame,
+        proc_l: List[processor_module.Processor],
+        with_fit: bool,
+        check_for_infer: bool,
+        protected: List[pd.DataFrame] = [],
     ) -> pd.DataFrame:
+        """
+        run the processors one by one
+
+        Parameters
+        ----------
+        protected : List[pd.DataFrame]
+            the data which must not be modified by the processors. `df` is copied (copy on write) only before it is
+            about to be modified by a non-readonly processor while sharing memory with them. So no copy is made if a
+            previous processor has created new data (e.g. `DropnaLabel`) or nothing has to be protected.
+        """
         for proc in proc_l:
             if check_for_infer and not proc.is_for_infer():
                 raise TypeError("Only processors usable for inference can be used in `infer_processors` ")
+            if not proc.readonly() and any(share_memory(df, p_df) for p_df in protected):
+                # avoid modifying the protected data
+                df = df.copy()
             with TimeInspector.logt(f"{proc.__class__.__name__}"):
                 if with_fit:
                     proc.fit(df)
@@ -529,47 +646,63 @@ class DataHandlerLP(DataHandler):
 
             (self._data)-[shared_processors]-(_shared_df)-[infer_processors]-(_infer_df)-[learn_processors]-(_learn_df)
 
+        The data is copied only when it is about to be modified by a processor and it shares memory with the data that
+        will be kept (copy on write, see `_run_proc_l`). So the raw data is processed inplace if `drop_raw=True` and the
+        data loader returns new data (see `DataLoader.returns_new_data`), and the learn processors work on the output
+        of `DropnaLabel` directly instead of a copy of `_infer_df`.
+
         Parameters
         ----------
         with_fit : bool
             The input of the `fit` will be the output of the previous processor
         """
+        # the raw data will be dropped after processing, so it can be modified inplace unless it is shared with the
+        # data loader or other objects (e.g. the DataFrame given to `StaticDataLoader`)
+        raw = [] if self.drop_raw and self.data_loader.returns_new_data else [self._data]
+        with processor_module.use_executor(getattr(self, "proc_executor", None)):
+            self._infer, self._learn = self._process_data(self._data, with_fit, raw=raw)
+
+        if self.drop_raw:
+            del self._data
+
+    def _process_data(
+        self, df: pd.DataFrame, with_fit: bool, raw: List[pd.DataFrame]
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        process `df` by the processors, `raw` is the data that must not be modified (see `_run_proc_l`)
+
+        Returns
+        -------
+        Tuple[pd.DataFrame, pd.DataFrame]:
+            the data for inference and the data for learning
+        """
         # shared data processors
-        # 1) assign
-        _shared_df = self._data
-        if not self._is_proc_readonly(self.shared_processors):  # avoid modifying the original data
-            _shared_df = _shared_df.copy()
-        # 2) process
-        _shared_df = self._run_proc_l(_shared_df, self.shared_processors, with_fit=with_fit, check_for_infer=True)
+        _shared_df = self._run_proc_l(
+            df, self.shared_processors, with_fit=with_fit, check_for_infer=True, protected=raw
+        )
 
         # data for inference
-        # 1) assign
-        _infer_df = _shared_df
-        if not self._is_proc_readonly(self.infer_processors):  # avoid modifying the original data
-            _infer_df = _infer_df.copy()
-        # 2) process
-        _infer_df = self._run_proc_l(_infer_df, self.infer_processors, with_fit=with_fit, check_for_infer=True)
-
-        self._infer = _infer_df
+        if self.process_type == DataHandlerLP.PTYPE_I:
+            # `_shared_df` will be used by the learn processors later
+            protected = raw + [_shared_df]
+        elif self.process_type == DataHandlerLP.PTYPE_A:
+            protected = raw
+        else:
+            raise NotImplementedError(f"This type of input is not supported")
+        _infer_df = self._run_proc_l(
+            _shared_df, self.infer_processors, with_fit=with_fit, check_for_infer=True, protected=protected
+        )
 
         # data for learning
-        # 1) assign
         if self.process_type == DataHandlerLP.PTYPE_I:
             _learn_df = _shared_df
-        elif self.process_type == DataHandlerLP.PTYPE_A:
+        else:
             # based on `infer_df` and append the processor
             _learn_df = _infer_df
-        else:
-            raise NotImplementedError(f"This type of input is not supported")
-        if not self._is_proc_readonly(self.learn_processors):  # avoid modifying the original  data
-            _learn_df = _learn_df.copy()
-        # 2) process
-        _learn_df = self._run_proc_l(_learn_df, self.learn_processors, with_fit=with_fit, check_for_infer=False)
-
-        self._learn = _learn_df
-
-        if self.drop_raw:
-            del self._data
+        _learn_df = self._run_proc_l(
+            _learn_df, self.learn_processors, with_fit=with_fit, check_for_infer=False, protected=raw + [_infer_df]
+        )
+        return _infer_df, _learn_df
 
     def config(self, processor_kwargs: dict = None, **kwargs):
         """
@@ -589,8 +722,9 @@ class DataHandlerLP(DataHandler):
     IT_FIT_SEQ = "fit_seq"  # the input of `fit` will be the output of the previous processor
     IT_FIT_IND = "fit_ind"  # the input of `fit` will be the original df
     IT_LS = "load_state"  # The state of the object has been load by pickle
+    IT_LAZY = "lazy"  # the processors are fitted, and the data will be processed by chunks when it is fetched
 
-    def setup_data(self, init_type: str = IT_FIT_SEQ, **kwargs):
+    def setup_data(self, init_type: str = IT_FIT_SEQ, enable_cache: bool = False, **kwargs):
         """
         Set up the data in case of running initialization for multiple time
 
@@ -603,14 +737,25 @@ class DataHandlerLP(DataHandler):
 
             - if `enable_cache` == True:
 
-                the processed data will be saved on disk, and handler will load the cached data from the disk directly
-                when we call `init` next time
+                the processed data and the fitted processors will be saved on disk, and handler will load them from
+                the disk directly when we call `init` next time (see `HandlerCache`). Only the raw data is cached if
+                `init_type` is `IT_LAZY`.
         """
+        self._lazy = init_type == DataHandlerLP.IT_LAZY
+        cache = HandlerCache() if enable_cache and not self._lazy else None
+        if cache is not None:
+            # the processors are not fitted yet unless `init_type` is `IT_LS`, so their fitted state is in the key then
+            key = cache.get_key(self, init_type=init_type)
+            if cache.load(self, key):
+                return
+
         # init raw data
-        super().setup_data(**kwargs)
+        super().setup_data(enable_cache=enable_cache and self._lazy, **kwargs)
 
         with TimeInspector.logt("fit & process data"):
-            if init_type == DataHandlerLP.IT_FIT_IND:
+            if init_type == DataHandlerLP.IT_LAZY:
+                self.fit_lazily()
+            elif init_type == DataHandlerLP.IT_FIT_IND:
                 self.fit()
                 self.process_data()
             elif init_type == DataHandlerLP.IT_LS:
@@ -620,7 +765,56 @@ class DataHandlerLP(DataHandler):
             else:
                 raise NotImplementedError(f"This type of input is not supported")
 
-        # TODO: Be able to cache handler data. Save the memory for data processing
+        if cache is not None:
+            cache.dump(self, key)
+
+    def fit_lazily(self):
+        """
+        fit the processors without processing the whole data, the data will be processed when it is fetched
+
+        So the processed data (e.g. `self._infer` and `self._learn`) of the whole time range are never kept in memory,
+        and `fetch_iter` processes the data chunk by chunk. It requires all the processors to be chunkable (see
+        `Processor.is_chunkable`). The processors are fitted like `IT_FIT_SEQ` by the data in the time range covering
+        the fit time ranges of all the processors.
+        """
+        if self.drop_raw:
+            raise ValueError("The raw data is required to process the data lazily, please set drop_raw = False")
+        for proc in self.get_all_processors():
+            if not proc.is_chunkable():
+                raise TypeError(f"{proc.__class__.__name__} can't process the data by chunks lazily")
+        self._lazy = True
+        for attr in "_infer", "_learn":
+            if hasattr(self, attr):
+                delattr(self, attr)
+
+        fit_procs = [proc for proc in self.get_all_processors() if hasattr(proc, "fit_start_time")]
+        if len(fit_procs) == 0:
+            return
+        start_l = [proc.fit_start_time for proc in fit_procs]
+        end_l = [proc.fit_end_time for proc in fit_procs]
+        start = None if any(t is None for t in start_l) else min(map(pd.Timestamp, start_l))
+        end = None if any(t is None for t in end_l) else max(map(pd.Timestamp, end_l))
+        with processor_module.use_executor(getattr(self, "proc_executor", None)):
+            self._process_data(
+                fetch_df_by_index(self._data, slice(start, end), level="datetime"), with_fit=True, raw=[self._data]
+            )
+
+    def _process_lazily(self, df: pd.DataFrame, data_key: DATA_KEY_TYPE, proc_func: Callable = None) -> pd.DataFrame:
+        """process a chunk of the raw data (it could be modified inplace) into the data of `data_key`"""
+        if data_key == self.DK_I:
+            proc_l = self.shared_processors + self.infer_processors
+        elif self.process_type == DataHandlerLP.PTYPE_I:
+            proc_l = self.shared_processors + self.learn_processors
+        else:
+            proc_l = self.get_all_processors()
+        with processor_module.use_executor(getattr(self, "proc_executor", None)):
+            df = self._run_proc_l(df, proc_l, with_fit=False, check_for_infer=data_key == self.DK_I)
+        return df if proc_func is None else proc_func(df)
+
+    def _get_datetimes(self, data_key: DATA_KEY_TYPE = DK_I, **kwargs) -> pd.Index:
+        if getattr(self, "_lazy", False):
+            data_key = self.DK_R
+        return super()._get_datetimes(data=self._get_df_by_key(data_key))
 
     def _get_df_by_key(self, data_key: DATA_KEY_TYPE = DK_I) -> pd.DataFrame:
         if data_key == self.DK_R and self.drop_raw:
@@ -659,7 +853,13 @@ class DataHandlerLP(DataHandler):
         -------
         pd.DataFrame:
         """
-
+        if getattr(self, "_lazy", False) and data_key != self.DK_R:
+            if level != "datetime":
+                # the cross sections must not be split
+                raise NotImplementedError("Only the data selected by datetime could be processed lazily")
+            # the selected raw data is copied before processing by `_fetch_data`
+            proc_func = partial(self._process_lazily, data_key=data_key, proc_func=proc_func)
+            data_key = self.DK_R
         return self._fetch_data(
             data_storage=self._get_df_by_key(data_key),
             selector=selector,
@@ -685,7 +885,10 @@ class DataHandlerLP(DataHandler):
         list:
             list of column names
         """
-        df = self._get_df_by_key(data_key).head()
+        if getattr(self, "_lazy", False) and data_key != self.DK_R:
+            df = self._process_lazily(self._data.head().copy(), data_key)
+        else:
+            df = self._get_df_by_key(data_key).head()
         df = fetch_df_by_col(df, col_set)
         return df.columns.to_list()
 
@@ -20,6 +20,10 @@ class DataLoader(abc.ABC):
     DataLoader is designed for loading raw data from original data source.
     """
 
+    # whether `load` returns new data which is not kept by the loader or any other object. Only such data can be
+    # modified inplace by the data handler (e.g. `DataHandlerLP` with `drop_raw=True`)
+    returns_new_data = False
+
     @abc.abstractmethod
     def load(self, instruments, start_time=None, end_time=None) -> pd.DataFrame:
         """
@@ -153,6 +157,8 @@ class DLWParser(DataLoader):
 class QlibDataLoader(DLWParser):
     """Same as QlibDataLoader. The fields can be define by config"""
 
+    returns_new_data = True
+
     def __init__(
         self,
         config: Tuple[list, tuple, dict],
@@ -290,6 +296,9 @@ class NestedDataLoader(DataLoader):
     We have multiple DataLoader, we can use this class to combine them.
     """
 
+    # the merged data is sorted into a new DataFrame
+    returns_new_data = True
+
     def __init__(self, dataloader_l: List[Dict], join="left") -> None:
         """
 
@@ -2,15 +2,19 @@
 # Licensed under the MIT License.
 
 import abc
-from typing import Union, Text, Optional
+import contextvars
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Union, Text, Optional
 import numpy as np
 import pandas as pd
 
-from qlib.utils.data import robust_zscore, zscore
+from qlib.utils.data import robust_zscore, zscore, CrossSection
 from ...constant import EPS
+from ...log import get_module_logger
 from .utils import fetch_df_by_index
 from ...utils.serial import Serializable
-from ...utils.paral import datetime_groupby_apply
+from ...utils.paral import datetime_groupby_apply, ShardExecutor
 from qlib.data.inst_processor import InstProcessor
 from qlib.data import D
 
@@ -32,6 +36,107 @@ def get_group_columns(df: pd.DataFrame, group: Union[Text, None]):
         return df.columns[df.columns.get_loc(group)]
 
 
+def get_inplace_values(df: pd.DataFrame, cols: pd.Index) -> Optional[np.ndarray]:
+    """
+    get a writable view (rows x columns) of the values of `cols` in `df`
+
+    So the processors can modify the data inplace instead of creating temporary DataFrames and splitting the float
+    block of `df` (or upcasting it to float64) when the results are set back.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        the data to be processed
+    cols : pd.Index
+        the columns to be modified
+
+    Returns
+    -------
+    Optional[np.ndarray]:
+        None if the view is not available, i.e. the columns of `df` don't share the same float dtype or `cols` are not
+        contiguous in `df`
+    """
+    if df.shape[0] == 0 or len(cols) == 0 or not df.columns.is_unique or df.dtypes.nunique() != 1:
+        return None
+    locs = df.columns.get_indexer(cols)
+    start, stop = locs[0], locs[0] + len(locs)
+    if start < 0 or not np.array_equal(locs, np.arange(start, stop)):
+        return None
+    # the columns with the same dtype are consolidated into one block, whose view is returned by `values`
+    values = df.values
+    if values.dtype.kind != "f" or not values.flags.writeable or not np.may_share_memory(values, df.iloc[:, 0].values):
+        return None
+    return values[:, start:stop]
+
+
+def set_values(df: pd.DataFrame, cols: pd.Index, values: np.ndarray):
+    """set the values of `cols` in `df`, inplace if `get_inplace_values` is available"""
+    inplace_values = get_inplace_values(df, cols)
+    if inplace_values is not None:
+        inplace_values[:] = values
+    else:
+        # keep the dtype of the columns (e.g. in the data with float16 features and float32 labels)
+        dtypes = df.dtypes.loc[cols].unique()
+        df[cols] = values.astype(dtypes[0], copy=False) if len(dtypes) == 1 and dtypes[0].kind == "f" else values
+
+
+# the executor of the processors running in the current context
+_EXECUTOR = contextvars.ContextVar("processor_executor", default=None)
+
+
+@contextmanager
+def use_executor(executor: Optional[ShardExecutor]):
+    """
+    run the processors in the context with `executor` (e.g. `DataHandlerLP` runs its processors with `proc_executor`)
+
+    The processors shard their work by columns or by datetime ranges with the executor, and run serially if it is None.
+    """
+    token = _EXECUTOR.set(executor)
+    try:
+        yield
+    finally:
+        _EXECUTOR.reset(token)
+
+
+def map_columns(func: Callable, values: np.ndarray, *args: np.ndarray, inplace: bool = False) -> np.ndarray:
+    """
+    `func(values, *args)` sharded by columns with the executor of the processors, see `ShardExecutor.map_columns`
+    """
+    executor = _EXECUTOR.get()
+    if executor is None:
+        res = func(values, *args)
+        return values if inplace else res
+    return executor.map_columns(func, values, *args, inplace=inplace)
+
+
+def _cs_apply(values: np.ndarray, index: pd.Index, method: Text) -> np.ndarray:
+    return getattr(CrossSection(index), method)(values)
+
+
+def _cs_apply_by(values: np.ndarray, cs: CrossSection, method: Text) -> np.ndarray:
+    # a module level function, so it can be pickled by the process based backends
+    return getattr(cs, method)(values)
+
+
+def apply_cross_section(df: pd.DataFrame, cols: pd.Index, method: Text) -> np.ndarray:
+    """
+    apply the operation `method` of `CrossSection` on the values of `cols` in `df`
+
+    The work is sharded by columns with the executor of the processors, or by datetime ranges if there are fewer
+    columns than jobs and the data is sorted by datetime.
+    """
+    values = df[cols].values
+    executor = _EXECUTOR.get()
+    if executor is None:
+        return _cs_apply(values, df.index, method)
+    if values.shape[1] < executor.get_n_jobs():
+        dt = df.index.get_level_values("datetime") if isinstance(df.index, pd.MultiIndex) else df.index
+        if dt.is_monotonic_increasing:
+            boundaries = np.flatnonzero(dt.values[1:] != dt.values[:-1]) + 1
+            return executor.map_rows(partial(_cs_apply, method=method), values, df.index, boundaries=boundaries)
+    return executor.map_columns(partial(_cs_apply_by, cs=CrossSection(df.index), method=method), values)
+
+
 class Processor(Serializable):
     def fit(self, df: pd.DataFrame = None):
         """
@@ -79,6 +184,16 @@ class Processor(Serializable):
         """
         return False
 
+    def is_chunkable(self) -> bool:
+        """
+        Can the (fitted) processor process the datetime chunks of the data independently, i.e. processing the chunks
+        one by one gives the same results as processing the whole data
+
+        It is true for the processors working on each row or each cross section. Knowing it is helpful to the Handler
+        to process the data lazily by chunks (see `DataHandlerLP.IT_LAZY`)
+        """
+        return False
+
     def config(self, **kwargs):
         attr_list = {"fit_start_time", "fit_end_time"}
         for k, v in kwargs.items():
@@ -95,6 +210,9 @@ class DropnaProcessor(Processor):
     def __init__(self, fields_group=None):
         self.fields_group = fields_group
 
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
         return df.dropna(subset=get_group_columns(df, self.fields_group))
 
@@ -115,6 +233,9 @@ class DropCol(Processor):
     def __init__(self, col_list=[]):
         self.col_list = col_list
 
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
         if isinstance(df.columns, pd.MultiIndex):
             mask = df.columns.get_level_values(-1).isin(self.col_list)
@@ -131,6 +252,9 @@ class FilterCol(Processor):
         self.fields_group = fields_group
         self.col_list = col_list
 
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
         cols = get_group_columns(df, self.fields_group)
         all_cols = df.columns
@@ -146,6 +270,9 @@ class FilterCol(Processor):
 class TanhProcess(Processor):
     """Use tanh to process noise data"""
 
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
         def tanh_denoise(data):
             mask = data.columns.get_level_values(1).str.contains("LABEL")
@@ -161,6 +288,9 @@ class TanhProcess(Processor):
 class ProcessInf(Processor):
     """Process infinity"""
 
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
         def replace_inf(data):
             def process_inf(df):
@@ -183,21 +313,61 @@ class Fillna(Processor):
         self.fields_group = fields_group
         self.fill_value = fill_value
 
+    @staticmethod
+    def _fillna(x, fill_value):
+        x[np.isnan(x)] = fill_value
+        return x
+
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
+        # `df.fillna({col: self.fill_value for col in cols}, inplace=True)` is extremely slow
+        # So we use numpy to accelerate filling values
+        values = get_inplace_values(df, get_group_columns(df, self.fields_group))
+        if values is not None:
+            map_columns(partial(self._fillna, fill_value=self.fill_value), values, inplace=True)
+            return df
         if self.fields_group is None:
             df.fillna(self.fill_value, inplace=True)
         else:
             cols = get_group_columns(df, self.fields_group)
-            # this implementation is extremely slow
-            # df.fillna({col: self.fill_value for col in cols}, inplace=True)
-
-            # So we use numpy to accelerate filling values
             nan_select = np.isnan(df.values)
             nan_select[:, ~df.columns.isin(cols)] = False
             df.values[nan_select] = self.fill_value
         return df
 
 
+class AsType(Processor):
+    """
+    Cast the data to `dtype`
+
+    It is usually the last processor to reduce the memory of the processed data, e.g. `float16` halves the memory of
+    `float32` data. The precision of `float16` is about 3 significant digits and its max value is 65504, so it is only
+    suitable for the normalized data (the values overflowing to inf are logged).
+    """
+
+    def __init__(self, dtype="float16", fields_group=None):
+        self.dtype = dtype
+        self.fields_group = fields_group
+
+    def is_chunkable(self):
+        return True
+
+    def readonly(self):
+        return True
+
+    def __call__(self, df):
+        cols = get_group_columns(df, self.fields_group)
+        new_df = df.astype(self.dtype) if self.fields_group is None else df.astype(dict.fromkeys(cols, self.dtype))
+        if np.dtype(self.dtype).kind == "f":
+            with np.errstate(invalid="ignore"):
+                n_overflow = (np.isinf(new_df[cols].values) & np.isfinite(df[cols].values)).sum()
+            if n_overflow > 0:
+                get_module_logger("AsType").warning(f"{n_overflow} values overflow when being casted to {self.dtype}")
+        return new_df
+
+
 class MinMaxNorm(Processor):
     def __init__(self, fit_start_time, fit_end_time, fields_group=None):
         # NOTE: correctly set the `fit_start_time` and `fit_end_time` is very important !!!
@@ -209,8 +379,7 @@ class MinMaxNorm(Processor):
     def fit(self, df: pd.DataFrame = None):
         df = fetch_df_by_index(df, slice(self.fit_start_time, self.fit_end_time), level="datetime")
         cols = get_group_columns(df, self.fields_group)
-        self.min_val = np.nanmin(df[cols].values, axis=0)
-        self.max_val = np.nanmax(df[cols].values, axis=0)
+        self.min_val, self.max_val = map_columns(self._get_min_max, df[cols].values)
         self.ignore = self.min_val == self.max_val
         # To improve the speed, we set the value of `min_val` to `0` for the columns that do not need to be processed,
         # and the value of `max_val` to `1`, when using `(x - min_val) / (max_val - min_val)` for uniform calculation,
@@ -222,10 +391,27 @@ class MinMaxNorm(Processor):
                 self.max_val[_i] = 1
         self.cols = cols
 
+    @staticmethod
+    def _get_min_max(x):
+        return np.stack([np.nanmin(x, axis=0), np.nanmax(x, axis=0)])
+
+    @staticmethod
+    def _normalize_inplace(x, min_val, max_val):
+        x -= min_val
+        x /= max_val - min_val
+        return x
+
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
         def normalize(x, min_val=self.min_val, max_val=self.max_val):
             return (x - min_val) / (max_val - min_val)
 
+        values = get_inplace_values(df, self.cols)
+        if values is not None:
+            map_columns(self._normalize_inplace, values, self.min_val, self.max_val, inplace=True)
+            return df
         df.loc(axis=1)[self.cols] = normalize(df[self.cols].values)
         return df
 
@@ -243,8 +429,7 @@ class ZScoreNorm(Processor):
     def fit(self, df: pd.DataFrame = None):
         df = fetch_df_by_index(df, slice(self.fit_start_time, self.fit_end_time), level="datetime")
         cols = get_group_columns(df, self.fields_group)
-        self.mean_train = np.nanmean(df[cols].values, axis=0)
-        self.std_train = np.nanstd(df[cols].values, axis=0)
+        self.mean_train, self.std_train = map_columns(self._get_mean_std, df[cols].values)
         self.ignore = self.std_train == 0
         # To improve the speed, we set the value of `std_train` to `1` for the columns that do not need to be processed,
         # and the value of `mean_train` to `0`, when using `(x - mean_train) / std_train` for uniform calculation,
@@ -256,10 +441,27 @@ class ZScoreNorm(Processor):
                 self.mean_train[_i] = 0
         self.cols = cols
 
+    @staticmethod
+    def _get_mean_std(x):
+        return np.stack([np.nanmean(x, axis=0), np.nanstd(x, axis=0)])
+
+    @staticmethod
+    def _normalize_inplace(x, mean_train, std_train):
+        x -= mean_train
+        x /= std_train
+        return x
+
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
         def normalize(x, mean_train=self.mean_train, std_train=self.std_train):
             return (x - mean_train) / std_train
 
+        values = get_inplace_values(df, self.cols)
+        if values is not None:
+            map_columns(self._normalize_inplace, values, self.mean_train, self.std_train, inplace=True)
+            return df
         df.loc(axis=1)[self.cols] = normalize(df[self.cols].values)
         return df
 
@@ -286,13 +488,32 @@ class RobustZScoreNorm(Processor):
     def fit(self, df: pd.DataFrame = None):
         df = fetch_df_by_index(df, slice(self.fit_start_time, self.fit_end_time), level="datetime")
         self.cols = get_group_columns(df, self.fields_group)
-        X = df[self.cols].values
-        self.mean_train = np.nanmedian(X, axis=0)
-        self.std_train = np.nanmedian(np.abs(X - self.mean_train), axis=0)
+        self.mean_train, self.std_train = map_columns(self._get_median_mad, df[self.cols].values)
         self.std_train += EPS
         self.std_train *= 1.4826
 
+    @staticmethod
+    def _get_median_mad(X):
+        median = np.nanmedian(X, axis=0)
+        return np.stack([median, np.nanmedian(np.abs(X - median), axis=0)])
+
+    @staticmethod
+    def _normalize_inplace(x, mean_train, std_train, clip_outlier):
+        x -= mean_train
+        x /= std_train
+        if clip_outlier:
+            np.clip(x, -3, 3, out=x)
+        return x
+
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
+        values = get_inplace_values(df, self.cols)
+        if values is not None:
+            func = partial(self._normalize_inplace, clip_outlier=self.clip_outlier)
+            map_columns(func, values, self.mean_train, self.std_train, inplace=True)
+            return df
         X = df[self.cols]
         X -= self.mean_train
         X /= self.std_train
@@ -314,17 +535,16 @@ class CSZScoreNorm(Processor):
         else:
             raise NotImplementedError(f"This type of input is not supported")
 
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
-        # try not modify original dataframe
         if not isinstance(self.fields_group, list):
             self.fields_group = [self.fields_group]
-        # depress warning by references:
-        # https://stackoverflow.com/questions/20625582/how-to-deal-with-settingwithcopywarning-in-pandas
-        # https://pandas.pydata.org/pandas-docs/stable/user_guide/options.html#getting-and-setting-options
-        with pd.option_context("mode.chained_assignment", None):
-            for g in self.fields_group:
-                cols = get_group_columns(df, g)
-                df[cols] = df[cols].groupby("datetime", group_keys=False).apply(self.zscore_func)
+        method = {zscore: "zscore", robust_zscore: "robust_zscore"}[self.zscore_func]
+        for g in self.fields_group:
+            cols = get_group_columns(df, g)
+            set_values(df, cols, apply_cross_section(df, cols, method))
         return df
 
 
@@ -354,13 +574,15 @@ class CSRankNorm(Processor):
     def __init__(self, fields_group=None):
         self.fields_group = fields_group
 
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
-        # try not modify original dataframe
         cols = get_group_columns(df, self.fields_group)
-        t = df[cols].groupby("datetime").rank(pct=True)
+        t = apply_cross_section(df, cols, "rank_pct")
         t -= 0.5
         t *= 3.46  # NOTE: towards unit std
-        df[cols] = t
+        set_values(df, cols, t)
         return df
 
 
@@ -370,9 +592,12 @@ class CSZFillna(Processor):
     def __init__(self, fields_group=None):
         self.fields_group = fields_group
 
+    def is_chunkable(self):
+        return True
+
     def __call__(self, df):
         cols = get_group_columns(df, self.fields_group)
-        df[cols] = df[cols].groupby("datetime", group_keys=False).apply(lambda x: x.fillna(x.mean()))
+        set_values(df, cols, apply_cross_section(df, cols, "fillna_mean"))
         return df
 
 
@@ -385,6 +610,28 @@ class HashStockFormat(Processor):
         return HashingStockStorage.from_df(df)
 
 
+class ColumnarFormat(Processor):
+    """Process the storage of from df into memory-mapped columnar format (see `ColumnarStorage`)"""
+
+    def __init__(self, tmp_dir: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        tmp_dir : str
+            the directory to create the temporary directories of the data in (the default of `tempfile` if None),
+            e.g. a directory on a fast local disk
+        """
+        self.tmp_dir = tmp_dir
+
+    def __call__(self, df: pd.DataFrame):
+        from .storage import ColumnarStorage  # pylint: disable=C0415
+
+        return ColumnarStorage.from_df(df, tmp_dir=self.tmp_dir)
+
+    def readonly(self):
+        return True
+
+
 class TimeRangeFlt(InstProcessor):
     """
     This is a filter to filter stock.
@@ -1,10 +1,15 @@
+import shutil
+import tempfile
+import weakref
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 
 from .handler import DataHandler
 from typing import Union, List, Callable
 
-from .utils import get_level_index, fetch_df_by_index, fetch_df_by_col
+from .utils import get_level_index, fetch_df_by_index, fetch_df_by_col, dump_frame, load_frame, load_frame_blocks
 
 
 class BaseHandlerStorage:
@@ -156,3 +161,141 @@ class HashingStockStorage(BaseHandlerStorage):
     def is_proc_func_supported(self):
         """the arg `proc_func` in `fetch` method is not supported in HashingStockStorage"""
         return False
+
+
+class ColumnarStorage(BaseHandlerStorage):
+    """Memory-mapped columnar data storage for datahandler
+    - The data is saved by `dump_frame`, each column is contiguous on disk and the rows are sorted by datetime
+    - The files are memory-mapped, so `fetch` only reads the data selected
+        - the columns are projected by `col_set` before reading, e.g. `fetch(col_set="label")` doesn't touch the
+          features
+        - the datetime selectors (a date, a slice of dates or a partial date string like "2020-01") are converted to
+          a range of rows by binary search, so a short time range only reads the corresponding parts of the columns
+        - the other selectors (e.g. instruments) are converted to the row positions by the in-memory index
+    - The data could be shared by the processes on the same host through the page cache, and pickling the storage
+      only pickles the path. The storage in a temporary directory (created by `from_df` without `path`) pickles the
+      data instead, because the directory is removed with the storage
+    """
+
+    def __init__(self, path: Union[str, Path], cleanup: bool = False):
+        """
+        Parameters
+        ----------
+        path : Union[str, Path]
+            the directory of the data dumped by `dump_frame`, the rows should be sorted by <datetime, instrument>
+        cleanup : bool
+            remove the directory when the storage is garbage collected (e.g. it is created by `from_df` in a temporary
+            directory)
+        """
+        self.path = Path(path)
+        self.cleanup = cleanup
+        self._open()
+        if cleanup:
+            weakref.finalize(self, shutil.rmtree, str(self.path), True)
+
+    def _open(self):
+        meta, self._blocks = load_frame_blocks(self.path, mmap_mode="r")
+        self.index, self.columns = meta["index"], meta["columns"]
+        # the block and the row in the block of each column
+        self._col_block = np.empty(len(self.columns), dtype=int)
+        self._col_loc = np.empty(len(self.columns), dtype=int)
+        for i, locs in enumerate(meta["blocks"]):
+            self._col_block[locs] = i
+            self._col_loc[locs] = np.arange(len(locs))
+        self.dt_level = get_level_index(pd.DataFrame(index=self.index), "datetime")
+        self._datetimes = self.index.get_level_values(self.dt_level)
+        if not self._datetimes.is_monotonic_increasing:
+            raise ValueError("The rows of ColumnarStorage should be sorted by datetime")
+
+    def __getstate__(self) -> dict:
+        if self.cleanup:
+            # the directory is removed when the storage is garbage collected, so it can't be reopened later
+            return {"df": load_frame(self.path)}
+        # the memory-mapped arrays will be reopened by the path
+        return {"path": self.path, "cleanup": False}
+
+    def __setstate__(self, state: dict):
+        if "df" in state:
+            # the data is dumped into a new temporary directory
+            path = tempfile.mkdtemp(prefix="qlib_columnar_")
+            dump_frame(state["df"], path)
+            self.__init__(path, cleanup=True)
+        else:
+            self.__dict__.update(state)
+            self._open()
+
+    @staticmethod
+    def from_df(df: pd.DataFrame, path: Union[str, Path, None] = None, tmp_dir: Union[str, Path, None] = None):
+        """
+        dump `df` into `path` and open it
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            the data
+        path : Union[str, Path, None]
+            the directory to dump the data. If it is None, a temporary directory is created in `tmp_dir`, which is
+            removed when the storage is garbage collected.
+        """
+        if get_level_index(df, "datetime") != 0:
+            df = df.swaplevel()
+        df = df.sort_index()
+        cleanup = path is None
+        if cleanup:
+            path = tempfile.mkdtemp(prefix="qlib_columnar_", dir=tmp_dir)
+        dump_frame(df, path)
+        return ColumnarStorage(path, cleanup=cleanup)
+
+    def _get_rows(self, selector, level) -> Union[slice, np.ndarray]:
+        """get the rows selected as a slice if possible, otherwise as the positions"""
+        if level is not None and not isinstance(selector, pd.MultiIndex):
+            if get_level_index(pd.DataFrame(index=self.index), level) == self.dt_level:
+                if isinstance(selector, slice) and selector.step is None:
+                    return slice(*self._datetimes.slice_locs(selector.start, selector.stop))
+                if isinstance(selector, (str, pd.Timestamp)):
+                    loc = self._datetimes.get_loc(selector)
+                    return slice(loc, loc + 1) if isinstance(loc, (int, np.integer)) else loc
+        pos = pd.Series(np.arange(len(self.index)), index=self.index).to_frame()
+        return fetch_df_by_index(pos, selector, level).iloc[:, 0].values
+
+    def fetch(
+        self,
+        selector: Union[pd.Timestamp, slice, str, list] = slice(None, None),
+        level: Union[str, int] = "datetime",
+        col_set: Union[str, List[str]] = DataHandler.CS_ALL,
+        fetch_orig: bool = True,
+        proc_func: Callable = None,
+    ) -> pd.DataFrame:
+        if proc_func is not None:
+            # `proc_func` works on the raw columns like the DataFrame storage
+            return fetch_df_by_col(proc_func(self.fetch(selector, level, DataHandler.CS_RAW)), col_set)
+        # project the columns by the positions, so the semantics of `col_set` are the same as `fetch_df_by_col`
+        col_df = fetch_df_by_col(pd.DataFrame([np.arange(len(self.columns))], columns=self.columns), col_set)
+        cols = col_df.values[0]
+        rows = self._get_rows(selector, level)
+        index = self.index[rows]
+
+        blocks, locs = [], []
+        for i, arr in enumerate(self._blocks):
+            sel = cols[self._col_block[cols] == i]
+            if len(sel) == 0:
+                continue
+            col_locs = self._col_loc[sel]
+            # only the selected rows of the selected columns are read from the file
+            values = arr[col_locs, rows] if isinstance(rows, slice) else arr[np.ix_(col_locs, rows)]
+            blocks.append(pd.DataFrame(values.T, index=index, copy=False))
+            locs.append(np.flatnonzero(self._col_block[cols] == i))
+        if len(blocks) == 1:
+            df = blocks[0]
+        else:
+            df = (
+                pd.concat(blocks, axis=1).iloc[:, np.argsort(np.concatenate(locs))]
+                if blocks
+                else pd.DataFrame(index=index)
+            )
+        df.columns = col_df.columns
+        return df
+
+    def is_proc_func_supported(self):
+        """the arg `proc_func` in `fetch` method is supported by processing the raw data fetched"""
+        return True
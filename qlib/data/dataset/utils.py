@@ -1,8 +1,12 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 from __future__ import annotations
+import pickle
+from pathlib import Path
+import numpy as np
 import pandas as pd
-from typing import Union, List, TYPE_CHECKING
+from typing import Union, List, Tuple, TYPE_CHECKING
+from qlib.config import C
 from qlib.utils import init_instance_by_config
 
 if TYPE_CHECKING:
@@ -89,6 +93,173 @@ def fetch_df_by_col(df: pd.DataFrame, col_set: Union[str, List[str]]) -> pd.Data
         return df.loc(axis=1)[col_set]
 
 
+class DatetimeOffsets:
+    """
+    The offset table from the datetimes to the row ranges of a DataFrame whose rows are sorted by datetime (i.e.
+    datetime is the first level of the index and the index is sorted).
+
+    Selecting a time range with it takes two binary searches on the unique datetimes and a slice of rows (a view of
+    the data), instead of scanning the MultiIndex by `.loc` every time.
+    """
+
+    def __init__(self, index: pd.Index):
+        dt_level = index.names.index("datetime") if "datetime" in index.names else 0
+        values = index.get_level_values(dt_level)
+        # the table is available only if the rows of each datetime are contiguous and sorted
+        self.valid = dt_level == 0 and isinstance(values, pd.DatetimeIndex) and values.is_monotonic_increasing
+        if self.valid:
+            starts = np.flatnonzero(values[1:] != values[:-1]) + 1
+            self.datetimes = values[np.r_[0, starts]] if len(values) > 0 else values
+            self.offsets = np.r_[0, starts, len(values)] if len(values) > 0 else np.zeros(1, dtype=int)
+
+    def get_rows(self, selector: Union[pd.Timestamp, slice, str]) -> slice:
+        """
+        get the rows of the datetime selector
+
+        Parameters
+        ----------
+        selector : Union[pd.Timestamp, slice, str]
+            a datetime, a slice of datetimes (both ends are included like `.loc`) or a partial datetime string (e.g.
+            "2020-01")
+
+        Returns
+        -------
+        slice:
+            the rows selected, a `KeyError` is raised if a single datetime is not found like `.loc`
+        """
+        if isinstance(selector, slice):
+            start, stop = self.datetimes.slice_locs(selector.start, selector.stop)
+        else:
+            loc = self.datetimes.get_loc(selector)
+            start, stop = (loc.start, loc.stop) if isinstance(loc, slice) else (loc, loc + 1)
+        return slice(self.offsets[start], self.offsets[stop])
+
+
+def _get_buffers(df: pd.DataFrame) -> list:
+    """get the root arrays (i.e. the arrays allocated by numpy) which the columns of `df` are views of"""
+    buffers = []
+    for i in range(df.shape[1]):
+        arr = df.iloc[:, i].values
+        while isinstance(getattr(arr, "base", None), np.ndarray):
+            arr = arr.base
+        buffers.append(arr)
+    return buffers
+
+
+def share_memory(df: pd.DataFrame, other: pd.DataFrame) -> bool:
+    """
+    Check if the values of `df` may share memory with the values of `other`, i.e. modifying `df` inplace may change
+    `other` (e.g. `df` is `other` itself, a shallow copy of it or a slice of its rows)
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+    other : pd.DataFrame
+
+    Returns
+    -------
+    bool:
+        False if they are guaranteed not to share memory
+    """
+    if df is other:
+        return True
+    other_ids = {id(arr) for arr in _get_buffers(other)}
+    return any(id(arr) in other_ids for arr in _get_buffers(df))
+
+
+def dump_frame(df: pd.DataFrame, path: Path, compress: bool = False):
+    """
+    Dump `df` into the directory `path` in a columnar format.
+
+    The values of each dtype are saved as a `.npy` file whose rows are the columns (so each column is contiguous on
+    disk), and the index and the columns are pickled. Compared with pickling the DataFrame, the values can be loaded
+    at the disk speed or be memory-mapped without being copied.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        the data to be dumped
+    path : Path
+        the directory, which will be created if it doesn't exist
+    compress : bool
+        compress the values by zlib (as `.npz` files), which can't be memory-mapped then
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    dtypes = df.dtypes.values
+    blocks = []
+    for i, dtype in enumerate(pd.unique(dtypes)):
+        locs = np.flatnonzero(dtypes == dtype)
+        values = np.ascontiguousarray(df.iloc[:, locs].values.T)
+        if compress:
+            np.savez_compressed(path / f"block{i}.npz", values=values)
+        else:
+            np.save(path / f"block{i}.npy", values, allow_pickle=True)
+        blocks.append(locs)
+    with (path / "meta.pkl").open("wb") as f:
+        pickle.dump({"index": df.index, "columns": df.columns, "blocks": blocks}, f, protocol=C.dump_protocol_version)
+
+
+def load_frame_blocks(path: Path, mmap_mode: str = None) -> Tuple[dict, List[np.ndarray]]:
+    """
+    Load the meta and the value blocks dumped by `dump_frame` without assembling the DataFrame
+
+    Parameters
+    ----------
+    path : Path
+        the directory of the data
+    mmap_mode : str
+        the `mmap_mode` of `np.load`, e.g. "c" (copy-on-write) to map the values instead of reading them. The blocks of
+        python objects and the compressed blocks are always read.
+
+    Returns
+    -------
+    Tuple[dict, List[np.ndarray]]:
+        the meta (`index`, `columns` and the column locations of each block in `blocks`) and the blocks, whose rows
+        are the columns of the DataFrame
+    """
+    path = Path(path)
+    with (path / "meta.pkl").open("rb") as f:
+        meta = pickle.load(f)
+    values = []
+    for i in range(len(meta["blocks"])):
+        if (path / f"block{i}.npz").exists():
+            with np.load(path / f"block{i}.npz", allow_pickle=True) as npz:
+                values.append(npz["values"])
+            continue
+        try:
+            values.append(np.load(path / f"block{i}.npy", mmap_mode=mmap_mode))
+        except ValueError:
+            # the object arrays can't be memory-mapped or loaded without pickle
+            values.append(np.load(path / f"block{i}.npy", allow_pickle=True))
+    return meta, values
+
+
+def load_frame(path: Path, mmap_mode: str = None) -> pd.DataFrame:
+    """
+    Load the DataFrame dumped by `dump_frame`
+
+    Parameters
+    ----------
+    path : Path
+        the directory of the data
+    mmap_mode : str
+        the `mmap_mode` of `np.load`, e.g. "c" (copy-on-write) to map the values instead of reading them
+
+    Returns
+    -------
+    pd.DataFrame:
+        the values of a DataFrame with a single dtype are not copied after being loaded
+    """
+    meta, values = load_frame_blocks(path, mmap_mode=mmap_mode)
+    if len(values) == 1:
+        return pd.DataFrame(values[0].T, index=meta["index"], columns=meta["columns"], copy=False)
+    order = np.argsort(np.concatenate(meta["blocks"])) if len(values) > 0 else []
+    df = pd.concat([pd.DataFrame(v.T, index=meta["index"], copy=False) for v in values], axis=1).iloc[:, order]
+    df.columns = meta["columns"]
+    return df
+
+
 def convert_index_format(df: Union[pd.DataFrame, pd.Series], level: str = "datetime") -> Union[pd.DataFrame, pd.Series]:
     """
     Convert the format of df.MultiIndex according to the following rules:
@@ -9,14 +9,21 @@ import numpy as np
 import pandas as pd
 
 from typing import Union, List, Type
-from scipy.stats import percentileofscore
-from .base import Expression, ExpressionOps, Feature, PFeature
+from .base import Expression, ExpressionOps, Feature, PFeature, InstrumentPanel
 from ..log import get_module_logger
 from ..utils import get_callable_kwargs
 
 try:
-    from ._libs.rolling import rolling_slope, rolling_rsquare, rolling_resi
-    from ._libs.expanding import expanding_slope, expanding_rsquare, expanding_resi
+    from ._libs.rolling import (
+        rolling_slope,
+        rolling_rsquare,
+        rolling_resi,
+        rolling_wma,
+        rolling_rank,
+        rolling_mad,
+        rolling_quantile,
+    )
+    from ._libs.expanding import expanding_slope, expanding_rsquare, expanding_resi, expanding_wma, expanding_ema
 except ImportError:
     print(
         "#### Do not import qlib package in the repository directory in case of importing qlib from . without compiling #####"
@@ -33,6 +40,47 @@ except ValueError:
 np.seterr(invalid="ignore")
 
 
+def _apply_by_instrument(data: Union[pd.Series, pd.DataFrame], func, instrument=None):
+    """Apply a calculation designed for the series of one instrument
+
+    Parameters
+    ----------
+    data : Union[pd.Series, pd.DataFrame]
+        the data of one instrument, or a (time x instrument) panel
+    func : Callable[[pd.Series], pd.Series]
+        the calculation on the series of one instrument
+    instrument : Union[str, InstrumentPanel]
+        If the result depends on the length of the data (e.g. `IdxMax`), the instrument panel should be given.
+        The series of each instrument is sliced to its history before calculating, so the result is consistent with
+        calculating the instrument alone.
+    """
+    if isinstance(data, pd.Series):
+        return func(data)
+    history = getattr(instrument, "history", None)
+    res = {}
+    for inst in data.columns:
+        series = data[inst]
+        if history is not None:
+            first, last = history.get(inst, (0, -1))
+            series = series.loc[first:last]
+        res[inst] = series if series.empty else func(series)
+    return pd.DataFrame(res, index=data.index, columns=data.columns)
+
+
+def _finite_values(series: pd.Series) -> np.ndarray:
+    """the values of `series` with +/-inf replaced by NaN (like the rolling of pandas) for the rolling kernels"""
+    values = series.values
+    inf = np.isinf(values)
+    return np.where(inf, np.nan, values) if inf.any() else values
+
+
+def _mask_history(data: Union[pd.Series, pd.DataFrame], instrument) -> Union[pd.Series, pd.DataFrame]:
+    """Set the values out of the history of the instruments in a panel to NaN before rolling"""
+    if isinstance(instrument, InstrumentPanel) and isinstance(data, pd.DataFrame):
+        return instrument.mask(data)
+    return data
+
+
 #################### Element-Wise Operator ####################
 class ElemOperator(ExpressionOps):
     """Element-wise Operator
@@ -86,9 +134,11 @@ class ChangeInstrument(ElemOperator):
     def __str__(self):
         return "{}('{}',{})".format(type(self).__name__, self.instrument, self.feature)
 
-    def load(self, instrument, start_index, end_index, *args):
+    def load(self, instrument, start_index, end_index, *args, shared: bool = False):
+        if isinstance(instrument, tuple):
+            raise NotImplementedError(f"{type(self).__name__} can't be calculated on a panel")
         # the first `instrument` is ignored
-        return super().load(self.instrument, start_index, end_index, *args)
+        return super().load(self.instrument, start_index, end_index, *args, shared=shared)
 
     def _load_internal(self, instrument, start_index, end_index, *args):
         return self.feature.load(instrument, start_index, end_index, *args)
@@ -206,6 +256,8 @@ class Mask(NpElemOperator):
         return "{}({},{})".format(type(self).__name__, self.feature, self.instrument.lower())
 
     def _load_internal(self, instrument, start_index, end_index, *args):
+        if isinstance(instrument, tuple):
+            raise NotImplementedError(f"{type(self).__name__} can't be calculated on a panel")
         return self.feature.load(self.instrument, start_index, end_index, *args)
 
 
@@ -667,6 +719,10 @@ class If(ExpressionOps):
             series_right = self.feature_right.load(instrument, start_index, end_index, *args)
         else:
             series_right = self.feature_right
+        if isinstance(series_cond, pd.DataFrame):
+            return pd.DataFrame(
+                np.where(series_cond, series_left, series_right), index=series_cond.index, columns=series_cond.columns
+            )
         series = pd.Series(np.where(series_cond, series_left, series_right), index=series_cond.index)
         return series
 
@@ -739,8 +795,11 @@ class Rolling(ExpressionOps):
     def __str__(self):
         return "{}({},{})".format(type(self).__name__, self.feature, self.N)
 
+    def _load_feature(self, instrument, start_index, end_index, *args):
+        return _mask_history(self.feature.load(instrument, start_index, end_index, *args), instrument)
+
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+        series = self._load_feature(instrument, start_index, end_index, *args)
         # NOTE: remove all null check,
         # now it's user's responsibility to decide whether use features in null days
         # isnull = series.isnull() # NOTE: isnull = NaN, inf is not null
@@ -798,12 +857,12 @@ class Ref(Rolling):
         super(Ref, self).__init__(feature, N, "ref")
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+        series = self._load_feature(instrument, start_index, end_index, *args)
         # N = 0, return first day
         if series.empty:
             return series  # Pandas bug, see: https://github.com/pandas-dev/pandas/issues/21049
         elif self.N == 0:
-            series = pd.Series(series.iloc[0], index=series.index)
+            series = _apply_by_instrument(series, lambda x: pd.Series(x.iloc[0], index=x.index), instrument)
         else:
             series = series.shift(self.N)  # copy
         return series
@@ -988,12 +1047,14 @@ class IdxMax(Rolling):
         super(IdxMax, self).__init__(feature, N, "idxmax")
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-        if self.N == 0:
-            series = series.expanding(min_periods=1).apply(lambda x: x.argmax() + 1, raw=True)
-        else:
-            series = series.rolling(self.N, min_periods=1).apply(lambda x: x.argmax() + 1, raw=True)
-        return series
+        series = self._load_feature(instrument, start_index, end_index, *args)
+
+        def idxmax(x):
+            if self.N == 0:
+                return x.expanding(min_periods=1).apply(lambda x: x.argmax() + 1, raw=True)
+            return x.rolling(self.N, min_periods=1).apply(lambda x: x.argmax() + 1, raw=True)
+
+        return _apply_by_instrument(series, idxmax, instrument)
 
 
 class Min(Rolling):
@@ -1036,12 +1097,14 @@ class IdxMin(Rolling):
         super(IdxMin, self).__init__(feature, N, "idxmin")
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-        if self.N == 0:
-            series = series.expanding(min_periods=1).apply(lambda x: x.argmin() + 1, raw=True)
-        else:
-            series = series.rolling(self.N, min_periods=1).apply(lambda x: x.argmin() + 1, raw=True)
-        return series
+        series = self._load_feature(instrument, start_index, end_index, *args)
+
+        def idxmin(x):
+            if self.N == 0:
+                return x.expanding(min_periods=1).apply(lambda x: x.argmin() + 1, raw=True)
+            return x.rolling(self.N, min_periods=1).apply(lambda x: x.argmin() + 1, raw=True)
+
+        return _apply_by_instrument(series, idxmin, instrument)
 
 
 class Quantile(Rolling):
@@ -1068,12 +1131,12 @@ class Quantile(Rolling):
         return "{}({},{},{})".format(type(self).__name__, self.feature, self.N, self.qscore)
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-        if self.N == 0:
-            series = series.expanding(min_periods=1).quantile(self.qscore)
-        else:
-            series = series.rolling(self.N, min_periods=1).quantile(self.qscore)
-        return series
+        series = self._load_feature(instrument, start_index, end_index, *args)
+        # the expanding window is the rolling window covering the whole series
+        func = lambda x: pd.Series(  # noqa: E731
+            rolling_quantile(_finite_values(x), self.N or len(x), self.qscore), index=x.index
+        )
+        return _apply_by_instrument(series, func)
 
 
 class Med(Rolling):
@@ -1116,18 +1179,9 @@ class Mad(Rolling):
         super(Mad, self).__init__(feature, N, "mad")
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-        # TODO: implement in Cython
-
-        def mad(x):
-            x1 = x[~np.isnan(x)]
-            return np.mean(np.abs(x1 - x1.mean()))
-
-        if self.N == 0:
-            series = series.expanding(min_periods=1).apply(mad, raw=True)
-        else:
-            series = series.rolling(self.N, min_periods=1).apply(mad, raw=True)
-        return series
+        series = self._load_feature(instrument, start_index, end_index, *args)
+        func = lambda x: pd.Series(rolling_mad(_finite_values(x), self.N or len(x)), index=x.index)  # noqa: E731
+        return _apply_by_instrument(series, func)
 
 
 class Rank(Rolling):
@@ -1149,23 +1203,11 @@ class Rank(Rolling):
     def __init__(self, feature, N):
         super(Rank, self).__init__(feature, N, "rank")
 
-    # for compatiblity of python 3.7, which doesn't support pandas 1.4.0+ which implements Rolling.rank
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-
-        rolling_or_expending = series.expanding(min_periods=1) if self.N == 0 else series.rolling(self.N, min_periods=1)
-        if hasattr(rolling_or_expending, "rank"):
-            return rolling_or_expending.rank(pct=True)
-
-        def rank(x):
-            if np.isnan(x[-1]):
-                return np.nan
-            x1 = x[~np.isnan(x)]
-            if x1.shape[0] == 0:
-                return np.nan
-            return percentileofscore(x1, x1[-1]) / 100
-
-        return rolling_or_expending.apply(rank, raw=True)
+        series = self._load_feature(instrument, start_index, end_index, *args)
+        # the same as `Rolling.rank(pct=True)` of pandas 1.4.0+, which is not available for python 3.7
+        func = lambda x: pd.Series(rolling_rank(_finite_values(x), self.N or len(x)), index=x.index)  # noqa: E731
+        return _apply_by_instrument(series, func)
 
 
 class Count(Rolling):
@@ -1208,9 +1250,9 @@ class Delta(Rolling):
         super(Delta, self).__init__(feature, N, "delta")
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+        series = self._load_feature(instrument, start_index, end_index, *args)
         if self.N == 0:
-            series = series - series.iloc[0]
+            series = _apply_by_instrument(series, lambda x: x - x.iloc[0], instrument)
         else:
             series = series - series.shift(self.N)
         return series
@@ -1246,12 +1288,12 @@ class Slope(Rolling):
         super(Slope, self).__init__(feature, N, "slope")
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+        series = self._load_feature(instrument, start_index, end_index, *args)
         if self.N == 0:
-            series = pd.Series(expanding_slope(series.values), index=series.index)
+            func = lambda x: pd.Series(expanding_slope(x.values), index=x.index)  # noqa: E731
         else:
-            series = pd.Series(rolling_slope(series.values, self.N), index=series.index)
-        return series
+            func = lambda x: pd.Series(rolling_slope(x.values, self.N), index=x.index)  # noqa: E731
+        return _apply_by_instrument(series, func)
 
 
 class Rsquare(Rolling):
@@ -1274,12 +1316,14 @@ class Rsquare(Rolling):
         super(Rsquare, self).__init__(feature, N, "rsquare")
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        _series = self.feature.load(instrument, start_index, end_index, *args)
+        _series = self._load_feature(instrument, start_index, end_index, *args)
         if self.N == 0:
-            series = pd.Series(expanding_rsquare(_series.values), index=_series.index)
+            series = _apply_by_instrument(_series, lambda x: pd.Series(expanding_rsquare(x.values), index=x.index))
         else:
-            series = pd.Series(rolling_rsquare(_series.values, self.N), index=_series.index)
-            series.loc[np.isclose(_series.rolling(self.N, min_periods=1).std(), 0, atol=2e-05)] = np.nan
+            series = _apply_by_instrument(
+                _series, lambda x: pd.Series(rolling_rsquare(x.values, self.N), index=x.index)
+            )
+            series = series.mask(np.isclose(_series.rolling(self.N, min_periods=1).std(), 0, atol=2e-05))
         return series
 
 
@@ -1303,12 +1347,12 @@ class Resi(Rolling):
         super(Resi, self).__init__(feature, N, "resi")
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
+        series = self._load_feature(instrument, start_index, end_index, *args)
         if self.N == 0:
-            series = pd.Series(expanding_resi(series.values), index=series.index)
+            func = lambda x: pd.Series(expanding_resi(x.values), index=x.index)  # noqa: E731
         else:
-            series = pd.Series(rolling_resi(series.values, self.N), index=series.index)
-        return series
+            func = lambda x: pd.Series(rolling_resi(x.values, self.N), index=x.index)  # noqa: E731
+        return _apply_by_instrument(series, func)
 
 
 class WMA(Rolling):
@@ -1331,19 +1375,12 @@ class WMA(Rolling):
         super(WMA, self).__init__(feature, N, "wma")
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-        # TODO: implement in Cython
-
-        def weighted_mean(x):
-            w = np.arange(len(x)) + 1
-            w = w / w.sum()
-            return np.nanmean(w * x)
-
+        series = self._load_feature(instrument, start_index, end_index, *args)
         if self.N == 0:
-            series = series.expanding(min_periods=1).apply(weighted_mean, raw=True)
+            func = lambda x: pd.Series(expanding_wma(_finite_values(x)), index=x.index)  # noqa: E731
         else:
-            series = series.rolling(self.N, min_periods=1).apply(weighted_mean, raw=True)
-        return series
+            func = lambda x: pd.Series(rolling_wma(_finite_values(x), self.N), index=x.index)  # noqa: E731
+        return _apply_by_instrument(series, func, instrument)
 
 
 class EMA(Rolling):
@@ -1366,16 +1403,11 @@ class EMA(Rolling):
         super(EMA, self).__init__(feature, N, "ema")
 
     def _load_internal(self, instrument, start_index, end_index, *args):
-        series = self.feature.load(instrument, start_index, end_index, *args)
-
-        def exp_weighted_mean(x):
-            a = 1 - 2 / (1 + len(x))
-            w = a ** np.arange(len(x))[::-1]
-            w /= w.sum()
-            return np.nansum(w * x)
-
+        series = self._load_feature(instrument, start_index, end_index, *args)
         if self.N == 0:
-            series = series.expanding(min_periods=1).apply(exp_weighted_mean, raw=True)
+            series = _apply_by_instrument(
+                series, lambda x: pd.Series(expanding_ema(_finite_values(x)), index=x.index), instrument
+            )
         elif 0 < self.N < 1:
             series = series.ewm(alpha=self.N, min_periods=1).mean()
         else:
@@ -1418,11 +1450,11 @@ class PairRolling(ExpressionOps):
         ), "at least one of two inputs is Expression instance"
 
         if isinstance(self.feature_left, Expression):
-            series_left = self.feature_left.load(instrument, start_index, end_index, *args)
+            series_left = _mask_history(self.feature_left.load(instrument, start_index, end_index, *args), instrument)
         else:
             series_left = self.feature_left  # numeric value
         if isinstance(self.feature_right, Expression):
-            series_right = self.feature_right.load(instrument, start_index, end_index, *args)
+            series_right = _mask_history(self.feature_right.load(instrument, start_index, end_index, *args), instrument)
         else:
             series_right = self.feature_right
 
@@ -1489,12 +1521,12 @@ class Corr(PairRolling):
         res: pd.Series = super(Corr, self)._load_internal(instrument, start_index, end_index, *args)
 
         # NOTE: Load uses MemCache, so calling load again will not cause performance degradation
-        series_left = self.feature_left.load(instrument, start_index, end_index, *args)
-        series_right = self.feature_right.load(instrument, start_index, end_index, *args)
-        res.loc[
+        series_left = _mask_history(self.feature_left.load(instrument, start_index, end_index, *args), instrument)
+        series_right = _mask_history(self.feature_right.load(instrument, start_index, end_index, *args), instrument)
+        res = res.mask(
             np.isclose(series_left.rolling(self.N, min_periods=1).std(), 0, atol=2e-05)
             | np.isclose(series_right.rolling(self.N, min_periods=1).std(), 0, atol=2e-05)
-        ] = np.nan
+        )
         return res
 
 
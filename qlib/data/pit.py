@@ -17,7 +17,7 @@ import numpy as np
 import pandas as pd
 from qlib.data.ops import ElemOperator
 from qlib.log import get_module_logger
-from .data import Cal
+from .data import Cal, PITD, _get_leaf_features
 
 
 class P(ElemOperator):
@@ -25,28 +25,52 @@ class P(ElemOperator):
         _calendar = Cal.calendar(freq=freq)
         resample_data = np.empty(end_index - start_index + 1, dtype="float32")
 
-        for cur_index in range(start_index, end_index + 1):
-            cur_time = _calendar[cur_index]
-            # To load expression accurately, more historical data are required
-            start_ws, end_ws = self.feature.get_extended_window_size()
-            if end_ws > 0:
-                raise ValueError(
-                    "PIT database does not support referring to future period (e.g. expressions like `Ref('$$roewa_q', -1)` are not supported"
-                )
-
-            # The calculated value will always the last element, so the end_offset is zero.
-            try:
+        # To load expression accurately, more historical data are required
+        start_ws, end_ws = self.feature.get_extended_window_size()
+        if end_ws > 0:
+            raise ValueError(
+                "PIT database does not support referring to future period (e.g. expressions like `Ref('$$roewa_q', -1)` are not supported"
+            )
+
+        try:
+            # The feature is only calculated on the days the PIT data change and kept until the next change
+            change_flag = self._get_change_flag(instrument, _calendar[start_index : end_index + 1])
+            change_value = np.empty(change_flag.sum(), dtype="float32")
+            for i, cur_index in enumerate(np.flatnonzero(change_flag) + start_index):
+                cur_time = _calendar[cur_index]
+                # The calculated value will always the last element, so the end_offset is zero.
                 s = self._load_feature(instrument, -start_ws, 0, cur_time)
-                resample_data[cur_index - start_index] = s.iloc[-1] if len(s) > 0 else np.nan
-            except FileNotFoundError:
-                get_module_logger("base").warning(f"WARN: period data not found for {str(self)}")
-                return pd.Series(dtype="float32", name=str(self))
+                change_value[i] = s.iloc[-1] if len(s) > 0 else np.nan
+            resample_data[:] = change_value[np.cumsum(change_flag) - 1]
+        except FileNotFoundError:
+            get_module_logger("base").warning(f"WARN: period data not found for {str(self)}")
+            return pd.Series(dtype="float32", name=str(self))
 
         resample_series = pd.Series(
             resample_data, index=pd.RangeIndex(start_index, end_index + 1), dtype="float32", name=str(self)
         )
         return resample_series
 
+    def _get_change_flag(self, instrument, calendar) -> np.ndarray:
+        """Get whether the PIT data observed on each day of `calendar` may be different from the day before
+
+        The PIT data observed on a day only depend on the revisions published on or before the day, so they only
+        change on the days of new revisions.
+        """
+        flag = np.ones(len(calendar), dtype=bool)
+        try:
+            dates = [PITD.revision_dates(instrument, f) for f in _get_leaf_features(self.feature) if f.startswith("$$")]
+        except NotImplementedError:
+            return flag
+        if len(dates) > 0:
+            calendar = pd.DatetimeIndex(calendar)
+            cal_int = calendar.year * 10000 + calendar.month * 100 + calendar.day
+            state = np.searchsorted(np.unique(np.concatenate(dates)), cal_int, side="right")
+            flag[1:] = state[1:] != state[:-1]
+        else:
+            flag[1:] = False
+        return flag
+
     def _load_feature(self, instrument, start_index, end_index, cur_time):
         return self.feature.load(instrument, start_index, end_index, cur_time)
 
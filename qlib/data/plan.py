@@ -0,0 +1,128 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+"""
+Query planner of the expression engine.
+
+The fields of a dataset query (e.g. the ~158 fields of Alpha158) share a lot of sub-expressions such as `$close`,
+`Ref($close, 1)` and `Mean($close, 20)`. `ExpressionPlan` parses all of them into one DAG, so each sub-expression is
+evaluated only once for an instrument.
+"""
+from collections import OrderedDict
+from typing import List, Tuple
+
+import pandas as pd
+
+from .base import Expression, PFeature
+from .cache import H
+from .ops import ChangeInstrument, Mask, Rolling, PairRolling, EMA, TResample
+
+
+def _has_pit_feature(expression: Expression) -> bool:
+    if isinstance(expression, PFeature):
+        return True
+    return any(_has_pit_feature(v) for v in vars(expression).values() if isinstance(v, Expression))
+
+
+def get_sub_expressions(expression: Expression) -> List[Expression]:
+    """Get the sub-expressions loaded with the same instrument and arguments as `expression`
+
+    The sub-expressions of the operators loading data of other instruments (e.g. `ChangeInstrument`) or
+    point-in-time data are not included; they are evaluated by their parents as usual.
+    """
+    if isinstance(expression, (ChangeInstrument, Mask)):
+        return []
+    return [v for v in vars(expression).values() if isinstance(v, Expression) and not _has_pit_feature(v)]
+
+
+def is_window_bounded(expression: Expression) -> bool:
+    """Whether the result of `expression` only depends on the data in its extended window
+
+    Such expressions give the same result when loaded on any index range covering their extended window, so the
+    expressions of a query can be loaded on one shared index range. The results of the operators with infinite memory
+    (e.g. `EMA` or the expanding operators with N=0) depend on where the data starts.
+    """
+    if isinstance(expression, (EMA, TResample)):
+        return False
+    if isinstance(expression, (Rolling, PairRolling)) and not (isinstance(expression.N, int) and expression.N != 0):
+        return False
+    return all(is_window_bounded(v) for v in vars(expression).values() if isinstance(v, Expression))
+
+
+class ExpressionPlan:
+    """Evaluate a group of expressions as one DAG
+
+    The nodes of the DAG are hash-consed by the string of the expression and the index range it is loaded on, so the
+    result is the same as loading the expressions one by one. Each node is evaluated exactly once; the intermediate
+    results are freed as soon as all the nodes depending on them are evaluated instead of being left in the bounded
+    memory cache `H["f"]` (except the ones cached before the plan is loaded).
+
+    Example
+    -------
+    .. code-block:: python
+
+        plan = ExpressionPlan()
+        plan.add(expr1, 0, 100)
+        plan.add(expr2, 10, 100)
+        series1, series2 = plan.load("SH600000", "day")
+    """
+
+    def __init__(self):
+        # the nodes in topological order (the children are always before their parents)
+        self._nodes = OrderedDict()
+        self._children = {}
+        self._ref_count = {}
+        self._roots = []
+        self._root_set = set()
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def add(self, expression: Expression, start_index: int, end_index: int):
+        """Add an expression to be loaded in the index range [start_index, end_index]"""
+        key = self._add_node(expression, start_index, end_index)
+        self._ref_count[key] += 1
+        self._roots.append(key)
+        self._root_set.add(key)
+
+    def _add_node(self, expression: Expression, start_index: int, end_index: int) -> Tuple:
+        key = str(expression), start_index, end_index
+        if key not in self._nodes:
+            children = []
+            for sub_expression in get_sub_expressions(expression):
+                child_key = self._add_node(sub_expression, start_index, end_index)
+                if child_key not in children:
+                    children.append(child_key)
+                    self._ref_count[child_key] += 1
+            self._children[key] = children
+            self._ref_count[key] = 0
+            self._nodes[key] = expression
+        return key
+
+    def load(self, instrument, *args) -> List[pd.Series]:
+        """Load the expressions in the order they are added
+
+        The parameters are the same as `Expression.load` except the index range.
+        """
+        results = {}
+        ref_count = self._ref_count.copy()
+        # the keys put into `H["f"]` by the plan, the entries cached before are left for the other callers
+        inserted = set()
+        for key, expression in self._nodes.items():
+            for child_key in self._children[key]:
+                # The intermediate results may have been evicted from `H["f"]` by other nodes
+                cache_key = child_key[0], instrument, child_key[1], child_key[2], *args
+                if cache_key not in H["f"]:
+                    H["f"][cache_key] = results[child_key]
+            cache_key = key[0], instrument, key[1], key[2], *args
+            if cache_key not in H["f"].od:
+                inserted.add(cache_key)
+            # only the results of the roots are shared with other processes (see `SharedMemCache`)
+            results[key] = expression.load(instrument, key[1], key[2], *args, shared=key in self._root_set)
+            for child_key in self._children[key]:
+                ref_count[child_key] -= 1
+                if ref_count[child_key] == 0:
+                    del results[child_key]
+                    cache_key = child_key[0], instrument, child_key[1], child_key[2], *args
+                    if cache_key in inserted and cache_key in H["f"].od:
+                        H["f"].pop(cache_key)
+        return [results[key] for key in self._roots]
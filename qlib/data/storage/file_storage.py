@@ -1,7 +1,12 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import os
+import mmap
+import ctypes
 import struct
+import weakref
+from collections import OrderedDict
 from pathlib import Path
 from typing import Iterable, Union, Dict, Mapping, Tuple, List
 
@@ -18,6 +23,59 @@ from qlib.data.storage import CalendarStorage, InstrumentStorage, FeatureStorage
 logger = get_module_logger("file_storage")
 
 
+def _get_max_open_files(default: int = 1024) -> int:
+    """a quarter of the limit on the number of open files of the process, so the other files could still be opened"""
+    try:
+        import resource  # pylint: disable=C0415
+
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, OSError, ValueError):
+        return default
+    return default if soft == resource.RLIM_INFINITY else max(soft // 4, 1)
+
+
+_libc = None
+
+
+def _libc_mmap(fd: int, size: int) -> ctypes.Array:
+    """map the file read-only by libc, the mapping is released when the returned buffer is garbage collected"""
+    global _libc  # pylint: disable=W0603
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _libc.mmap.restype = ctypes.c_void_p
+        # void *mmap(void *addr, size_t length, int prot, int flags, int fd, off_t offset)
+        _libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t] + [ctypes.c_int] * 3 + [ctypes.c_long]
+        _libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    addr = _libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+    if addr is None or addr == ctypes.c_void_p(-1).value:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    buf = (ctypes.c_char * size).from_address(addr)
+    weakref.finalize(buf, _libc.munmap, addr, size)
+    return buf
+
+
+def _map_file(path: Union[str, Path], dtype="<f") -> np.ndarray:
+    """Map a file as a read-only array without keeping a file descriptor open
+
+    `np.memmap` and `mmap.mmap` keep a duplicate of the file descriptor as long as the mapping is alive (unless
+    `trackfd=False`, which is only supported since Python 3.13), so mapping many files exhausts the descriptors.
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(fd).st_size
+        try:
+            buf = mmap.mmap(fd, size, access=mmap.ACCESS_READ, trackfd=False)
+        except TypeError:
+            # Python < 3.13
+            buf = _libc_mmap(fd, size) if os.name == "posix" else mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+    data = np.frombuffer(buf, dtype=dtype, count=size // np.dtype(dtype).itemsize)
+    data.flags.writeable = False
+    return data
+
+
 class FileStorageMixin:
     """FileStorageMixin, applicable to FileXXXStorage
     Subclasses need to have provider_uri, freq, storage_name, file_name attributes
@@ -377,3 +435,286 @@ class FileFeatureStorage(FileStorageMixin, FeatureStorage):
     def __len__(self) -> int:
         self.check()
         return self.uri.stat().st_size // 4 - 1
+
+
+class MmapFeatureStorage(FileFeatureStorage):
+    """FileFeatureStorage reading the `.bin` files by memory mapping
+
+    Each file is mapped once and its header is parsed once. The mapped files are kept in a per-process LRU of at most
+    `max_open_files` files (a quarter of the limit of open files by default), so reading a file repeatedly costs no
+    syscall. The mappings keep no file descriptor open (see `_map_file`). The slices returned are zero-copy (read-only)
+    views of the mapped file.
+
+    It could be enabled by the backend of the feature provider
+
+    .. code-block:: python
+
+        qlib.init(
+            provider_uri=provider_uri,
+            feature_provider={
+                "class": "LocalFeatureProvider",
+                "kwargs": {"backend": {"class": "MmapFeatureStorage", "module_path": "qlib.data.storage.file_storage"}},
+            },
+        )
+
+    .. note:: A file modified by another process is not reloaded until it is evicted from the LRU or
+        `MmapFeatureStorage.clear_cache` is called. The files written by the storage itself are reloaded.
+    """
+
+    max_open_files = _get_max_open_files()
+    # uri -> (start_index, the mapped data)
+    _mmap_cache = OrderedDict()
+
+    @classmethod
+    def clear_cache(cls):
+        cls._mmap_cache.clear()
+
+    def _get_mmap(self) -> Union[Tuple[int, np.ndarray], None]:
+        key = str(self.uri)
+        if key in self._mmap_cache:
+            self._mmap_cache.move_to_end(key)
+            return self._mmap_cache[key]
+        if not self.uri.exists() or self.uri.stat().st_size < 4:
+            return None
+        data = _map_file(self.uri)
+        self._mmap_cache[key] = int(data[0]), data[1:]
+        while len(self._mmap_cache) > self.max_open_files:
+            self._mmap_cache.popitem(last=False)
+        return self._mmap_cache[key]
+
+    def clear(self):
+        self._mmap_cache.pop(str(self.uri), None)
+        super(MmapFeatureStorage, self).clear()
+
+    def write(self, data_array: Union[List, np.ndarray], index: int = None) -> None:
+        self._mmap_cache.pop(str(self.uri), None)
+        super(MmapFeatureStorage, self).write(data_array, index)
+        self._mmap_cache.pop(str(self.uri), None)
+
+    @property
+    def start_index(self) -> Union[int, None]:
+        mmap = self._get_mmap()
+        return None if mmap is None else mmap[0]
+
+    @property
+    def end_index(self) -> Union[int, None]:
+        mmap = self._get_mmap()
+        return None if mmap is None else mmap[0] + len(mmap[1]) - 1
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Tuple[int, float], pd.Series]:
+        mmap = self._get_mmap()
+        if mmap is None:
+            if isinstance(i, int):
+                return None, None
+            elif isinstance(i, slice):
+                return pd.Series(dtype=np.float32)
+            else:
+                raise TypeError(f"type(i) = {type(i)}")
+
+        storage_start_index, data = mmap
+        if isinstance(i, int):
+            if not storage_start_index <= i < storage_start_index + len(data):
+                raise IndexError(f"{i}: the index range is [{storage_start_index}, {storage_start_index + len(data)})")
+            return i, data[i - storage_start_index].item()
+        elif isinstance(i, slice):
+            start_index = storage_start_index if i.start is None else i.start
+            end_index = storage_start_index + len(data) - 1 if i.stop is None else i.stop - 1
+            si = max(start_index, storage_start_index)
+            if si > end_index:
+                return pd.Series(dtype=np.float32)
+            values = np.asarray(data[si - storage_start_index : end_index - storage_start_index + 1])
+            return pd.Series(values, index=pd.RangeIndex(si, si + len(values)), copy=False)
+        else:
+            raise TypeError(f"type(i) = {type(i)}")
+
+    def __len__(self) -> int:
+        self.check()
+        mmap = self._get_mmap()
+        return 0 if mmap is None else len(mmap[1])
+
+
+class ColumnarFeatureStorage(FileStorageMixin, FeatureStorage):
+    """FeatureStorage of the consolidated columnar layout
+
+    All the instruments of a field are stored in one file instead of one file for each instrument.
+
+    - `columnar/<field>.<freq>.bin`: the header and an aligned (calendar x instrument) float32 matrix in row-major
+      order, so the data of all the instruments in a time range is one contiguous block. The row `i` is the calendar
+      index `i`.
+    - the header is the size of the index (uint32) and the index: the instruments in the column order of the matrix,
+      with the start and the end calendar index of their data (separated by tab, one instrument per line). The index is
+      padded with newlines so the matrix is aligned to 4 bytes.
+
+    The index and the matrix are in one file, so a field is replaced atomically by renaming the file.
+
+    The files are memory-mapped once for each process. `read_panel` reads a group of instruments at once, which is
+    used by the panel mode of `LocalDatasetProvider`. The layout could be converted from the default layout with
+    `python scripts/dump_bin.py dump_columnar_from_bin` or dumped from csv files with
+    `python scripts/dump_bin.py dump_columnar`.
+
+    .. note:: The data could only be written for all the instruments at once by `write_all`.
+    """
+
+    COLUMNAR_DIR_NAME = "columnar"
+    INDEX_SEP = "\t"
+    # uri -> (instrument -> (column, start_index, end_index), the mapped matrix)
+    _columnar_cache = OrderedDict()
+    max_open_files = 128
+
+    def __init__(self, instrument: str, field: str, freq: str, provider_uri: dict = None, **kwargs):
+        super(ColumnarFeatureStorage, self).__init__(instrument, field, freq, **kwargs)
+        self._provider_uri = None if provider_uri is None else C.DataPathManager.format_provider_uri(provider_uri)
+        self.file_name = f"{field.lower()}.{freq.lower()}.bin"
+
+    @property
+    def uri(self) -> Path:
+        if self.freq not in self.support_freq:
+            raise ValueError(f"{self.storage_name}: {self.provider_uri} does not contain data for {self.freq}")
+        return self.dpm.get_data_uri(self.freq).joinpath(self.COLUMNAR_DIR_NAME, self.file_name)
+
+    @classmethod
+    def clear_cache(cls):
+        cls._columnar_cache.clear()
+
+    def _get_columnar(self) -> Union[Tuple[Dict[str, Tuple[int, int, int]], np.ndarray], None]:
+        key = str(self.uri)
+        if key in self._columnar_cache:
+            self._columnar_cache.move_to_end(key)
+            return self._columnar_cache[key]
+        if not self.uri.exists():
+            return None
+        # the header and the matrix are read from one mapping, so they are always from the same version of the file
+        buf = _map_file(self.uri, dtype=np.uint8)
+        (index_size,) = struct.unpack("<I", buf[:4].tobytes())
+        columns = {}
+        for line in buf[4 : 4 + index_size].tobytes().decode().splitlines():
+            if line:
+                inst, start, end = line.split(self.INDEX_SEP)
+                columns[inst.lower()] = (len(columns), int(start), int(end))
+        data = buf[4 + index_size :].view("<f")
+        data = data.reshape(-1, len(columns)) if len(columns) > 0 else np.empty((0, 0), dtype="<f")
+        self._columnar_cache[key] = columns, data
+        while len(self._columnar_cache) > self.max_open_files:
+            self._columnar_cache.popitem(last=False)
+        return self._columnar_cache[key]
+
+    def _get_column(self) -> Union[Tuple[int, int, int], None]:
+        columnar = self._get_columnar()
+        if columnar is None:
+            return None
+        return columnar[0].get(str(self.instrument).lower())
+
+    def clear(self):
+        raise NotImplementedError(f"{self.__class__.__name__} can't be cleared for one instrument")
+
+    def write(self, data_array: Union[List, np.ndarray], index: int = None) -> None:
+        raise NotImplementedError(
+            f"{self.__class__.__name__} can't be written for one instrument, please use `write_all` instead"
+        )
+
+    def write_all(self, data: Mapping[str, pd.Series], calendar_size: int) -> None:
+        """write the data of all the instruments of the field
+
+        Parameters
+        ----------
+        data : Mapping[str, pd.Series]
+            instrument -> the data indexed by calendar index
+        calendar_size : int
+            the size of the calendar, which is the number of the rows of the matrix
+        """
+        self.write_columnar(self.uri, data, calendar_size)
+        self._columnar_cache.pop(str(self.uri), None)
+
+    @classmethod
+    def write_columnar(cls, uri: Union[str, Path], data: Mapping[str, pd.Series], calendar_size: int) -> None:
+        """write the files of a field to `uri` (`<qlib_dir>/columnar/<field>.<freq>.bin`) without initializing qlib"""
+        uri = Path(uri)
+        instruments = sorted(inst for inst, series in data.items() if not series.empty)
+        matrix = np.full((calendar_size, len(instruments)), np.nan, dtype="<f")
+        index = ""
+        for col, inst in enumerate(instruments):
+            series = data[inst]
+            start, end = int(series.index.min()), int(series.index.max())
+            matrix[start : end + 1, col] = series.reindex(range(start, end + 1)).values
+            index += f"{inst.lower()}{cls.INDEX_SEP}{start}{cls.INDEX_SEP}{end}\n"
+        index = index.encode()
+        index += b"\n" * (-len(index) % 4)
+        uri.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file and rename it, so the readers never see a partially written field
+        tmp_uri = uri.with_suffix(".bin.tmp")
+        with tmp_uri.open("wb") as f:
+            f.write(struct.pack("<I", len(index)))
+            f.write(index)
+            matrix.tofile(f)
+        tmp_uri.replace(uri)
+
+    @property
+    def data(self) -> pd.Series:
+        return self[:]
+
+    @property
+    def start_index(self) -> Union[int, None]:
+        column = self._get_column()
+        return None if column is None else column[1]
+
+    @property
+    def end_index(self) -> Union[int, None]:
+        column = self._get_column()
+        return None if column is None else column[2]
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Tuple[int, float], pd.Series]:
+        column = self._get_column()
+        if column is None:
+            if isinstance(i, int):
+                return None, None
+            elif isinstance(i, slice):
+                return pd.Series(dtype=np.float32)
+            else:
+                raise TypeError(f"type(i) = {type(i)}")
+
+        col, storage_start_index, storage_end_index = column
+        data = self._get_columnar()[1]
+        if isinstance(i, int):
+            if not storage_start_index <= i <= storage_end_index:
+                raise IndexError(f"{i}: the index range is [{storage_start_index}, {storage_end_index}]")
+            return i, data[i, col].item()
+        elif isinstance(i, slice):
+            si = storage_start_index if i.start is None else max(i.start, storage_start_index)
+            ei = storage_end_index if i.stop is None else min(i.stop - 1, storage_end_index)
+            if si > ei:
+                return pd.Series(dtype=np.float32)
+            return pd.Series(np.asarray(data[si : ei + 1, col]), index=pd.RangeIndex(si, ei + 1), copy=False)
+        else:
+            raise TypeError(f"type(i) = {type(i)}")
+
+    def read_panel(self, instruments: Iterable[str], start_index: int = None, end_index: int = None) -> pd.DataFrame:
+        """read the data of a group of instruments of the field with one contiguous read
+
+        Returns
+        -------
+        pd.DataFrame
+            (calendar index x instrument), the index covers the data of all the instruments within
+            [start_index, end_index]; the instruments without data are NaN.
+        """
+        instruments = list(instruments)
+        columnar = self._get_columnar()
+        columns = [] if columnar is None else [columnar[0].get(str(inst).lower()) for inst in instruments]
+        columns_found = [column for column in columns if column is not None]
+        if len(columns_found) == 0:
+            return pd.DataFrame(columns=instruments, dtype=np.float32)
+        si = min(column[1] for column in columns_found)
+        ei = max(column[2] for column in columns_found)
+        si = si if start_index is None else max(start_index, si)
+        ei = ei if end_index is None else min(end_index, ei)
+        if si > ei:
+            return pd.DataFrame(columns=instruments, dtype=np.float32)
+        block = columnar[1][si : ei + 1]
+        values = np.full((ei - si + 1, len(instruments)), np.nan, dtype=np.float32)
+        found = [i for i, column in enumerate(columns) if column is not None]
+        values[:, found] = block[:, [columns[i][0] for i in found]]
+        return pd.DataFrame(values, index=pd.RangeIndex(si, ei + 1), columns=instruments)
+
+    def __len__(self) -> int:
+        self.check()
+        column = self._get_column()
+        return 0 if column is None else column[2] - column[1] + 1
@@ -1,7 +1,7 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
-from torch.utils.data import Dataset
+from torch.utils.data import BatchSampler, DataLoader, Dataset, RandomSampler, SequentialSampler
 
 
 class ConcatDataset(Dataset):
@@ -24,3 +24,14 @@ class IndexSampler:
 
     def __len__(self):
         return len(self.sampler)
+
+
+def get_batch_loader(dataset, batch_size: int, shuffle: bool = False, drop_last: bool = False, **kwargs) -> DataLoader:
+    """
+    Get a DataLoader which fetches each batch by indexing `dataset` with the list of indices once (e.g.
+    `TSDataSampler.get_batch`) instead of collating the samples one by one.
+
+    The batches are sampled in the same way as `DataLoader(dataset, batch_size, shuffle, drop_last=drop_last)`.
+    """
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last), batch_size=None, **kwargs)
@@ -103,3 +103,133 @@ def update_config(base_config: dict, ext_config: Union[dict, List[dict]]):
                     # one of then are not dict. Then replace
                     base_config[key] = ec[key]
     return base_config
+
+
+class CrossSection:
+    """
+    Vectorized cross-sectional (i.e. grouped by datetime) operations on the values of a DataFrame
+
+    The rows are sorted by datetime once, so each cross section is a segment of the sorted rows. Then the statistics
+    are calculated by segment-wise NumPy reductions instead of calling Python functions by `groupby().apply`.
+
+    All the operations accept a 2D array (rows x columns) of the values in the original order and return a new float64
+    array in the same order. NaN values are skipped like pandas.
+
+    .. code-block:: python
+
+        cs = CrossSection(df.index)
+        df[cols] = cs.zscore(df[cols].values)  # equals `df[cols].groupby("datetime").apply(zscore)`
+    """
+
+    def __init__(self, index: pd.Index, level: Union[str, int] = "datetime"):
+        keys = index.get_level_values(level) if isinstance(index, pd.MultiIndex) else index
+        codes, _ = pd.factorize(keys, sort=True)
+        # the data is usually sorted by datetime already
+        if len(codes) > 0 and (codes[1:] < codes[:-1]).any():
+            self.order = np.argsort(codes, kind="stable")
+            codes = codes[self.order]
+        else:
+            self.order = None
+        self.starts = np.flatnonzero(np.diff(codes, prepend=-1))
+        self.lengths = np.diff(self.starts, append=len(codes))
+        # the segment of each sorted row
+        self.segments = np.repeat(np.arange(len(self.starts)), self.lengths)
+        # NumPy uses radix sort for the stable sorting of 16-bit integers
+        self._segment_keys = self.segments.astype(np.uint16 if len(self.starts) <= 2**16 else np.int64)
+
+    def _sort(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        return values if self.order is None else values[self.order]
+
+    def _unsort(self, values: np.ndarray) -> np.ndarray:
+        if self.order is None:
+            return values
+        res = np.empty_like(values)
+        res[self.order] = values
+        return res
+
+    def _sum(self, values: np.ndarray) -> np.ndarray:
+        if len(self.starts) == 0:
+            return np.zeros((0,) + values.shape[1:])
+        return np.add.reduceat(values, self.starts, axis=0)
+
+    def _expand(self, stats: np.ndarray) -> np.ndarray:
+        return np.repeat(stats, self.lengths, axis=0)
+
+    def _mean_std(self, x: np.ndarray):
+        valid = ~np.isnan(x)
+        count = self._sum(valid.astype(np.float64))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = self._sum(np.where(valid, x, 0)) / count
+            dev = np.where(valid, x - self._expand(mean), 0)
+            std = np.sqrt(self._sum(dev**2) / (count - 1))
+        std[count <= 1] = np.nan
+        return mean, std
+
+    def _zscore(self, x: np.ndarray) -> np.ndarray:
+        mean, std = self._mean_std(x)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (x - self._expand(mean)) / self._expand(std)
+
+    def _sort_in_segments(self, col: np.ndarray) -> np.ndarray:
+        """the order to sort the values in each segment, NaN values are sorted to the end of the segments"""
+        order = np.argsort(col)
+        return order[np.argsort(self._segment_keys[order], kind="stable")]
+
+    def _median(self, x: np.ndarray) -> np.ndarray:
+        count = self._sum((~np.isnan(x)).astype(np.int64))
+        lo, hi = self.starts[:, None] + (count - 1) // 2, self.starts[:, None] + count // 2
+        median = np.empty(count.shape)
+        for i in range(x.shape[1]):
+            col = x[self._sort_in_segments(x[:, i]), i]
+            median[:, i] = (col[lo[:, i].clip(0)] + col[hi[:, i].clip(0)]) / 2
+        median[count == 0] = np.nan
+        return median
+
+    def zscore(self, values: np.ndarray) -> np.ndarray:
+        """the same as `zscore` for each cross section"""
+        return self._unsort(self._zscore(self._sort(values)))
+
+    def robust_zscore(self, values: np.ndarray, zscore: bool = False) -> np.ndarray:
+        """the same as `robust_zscore` for each cross section"""
+        x = self._sort(values)
+        x = x - self._expand(self._median(x))
+        mad = self._median(np.abs(x))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = np.clip(x / self._expand(mad) / 1.4826, -3, 3)
+        if zscore:
+            x = self._zscore(x)
+        return self._unsort(x)
+
+    def rank_pct(self, values: np.ndarray) -> np.ndarray:
+        """the same as `rank(pct=True)` (the ties get the average rank) for each cross section"""
+        x = self._sort(values)
+        res = np.empty(x.shape)
+        count = self._sum((~np.isnan(x)).astype(np.float64))
+        n = x.shape[0]
+        if n == 0:
+            return self._unsort(res)
+        # the position of each sorted row in its segment
+        pos = np.arange(n) - self._expand(self.starts)
+        for i in range(x.shape[1]):
+            order = self._sort_in_segments(x[:, i])
+            col = x[order, i]
+            # the first row of each group of ties
+            first = np.empty(n, dtype=bool)
+            first[0] = True
+            first[1:] = (col[1:] != col[:-1]) | (self.segments[1:] != self.segments[:-1])
+            first_idx = np.flatnonzero(first)
+            last_idx = np.append(first_idx[1:], n) - 1
+            group = np.cumsum(first) - 1
+            rank = (pos[first_idx[group]] + pos[last_idx[group]]) / 2 + 1
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rank = rank / count[self.segments, i]
+            rank[np.isnan(col)] = np.nan
+            res[order, i] = rank
+        return self._unsort(res)
+
+    def fillna_mean(self, values: np.ndarray) -> np.ndarray:
+        """fill the NaN values with the mean of each cross section"""
+        x = self._sort(values)
+        mean, _ = self._mean_std(x)
+        return self._unsort(np.where(np.isnan(x), self._expand(mean), x))
@@ -3,10 +3,11 @@
 
 from functools import partial
 from threading import Thread
-from typing import Callable, Text, Union
+from typing import Callable, Optional, Sequence, Text, Union
 
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, effective_n_jobs
 from joblib._parallel_backends import MultiprocessingBackend
+import numpy as np
 import pandas as pd
 
 from queue import Queue
@@ -62,6 +63,103 @@ def datetime_groupby_apply(
         return _naive_group_apply(df)
 
 
+class ShardExecutor:
+    """
+    Run a function on the shards of 2D arrays (rows x columns) in a joblib pool
+
+    It is designed for the work which is independent among the columns (e.g. the statistics of the features) or among
+    the groups of rows (e.g. the cross sectional operations). Each shard is processed by the same NumPy code as the
+    whole array, so the results are exactly the same as the serial ones.
+
+    .. code-block:: python
+
+        executor = ShardExecutor(n_jobs=8)
+        median = executor.map_columns(lambda x: np.nanmedian(x, axis=0), values)
+    """
+
+    def __init__(self, n_jobs: Optional[int] = None, backend: Text = "threading"):
+        """
+        Parameters
+        ----------
+        n_jobs : Optional[int]
+            the number of the jobs (i.e. the max number of the shards). `C.kernels` will be used if it is None
+        backend : Text
+            the backend of joblib. NumPy releases the GIL in most of the heavy operations, so "threading" is the
+            default one to avoid copying the data; a process based backend (e.g. "loky") can be used for the work
+            holding the GIL. The arrays are passed to the processes by copy-on-write memmaps.
+        """
+        self.n_jobs = n_jobs
+        self.backend = backend
+
+    def get_n_jobs(self) -> int:
+        n_jobs = C.get_kernels("day") if self.n_jobs is None else self.n_jobs
+        return max(effective_n_jobs(n_jobs), 1)
+
+    def _run(self, func: Callable, args_l: list) -> list:
+        if len(args_l) == 1:
+            return [func(*args_l[0])]
+        kwargs = {} if self.backend == "threading" else {"mmap_mode": "c"}
+        return ParallelExt(n_jobs=len(args_l), backend=self.backend, **kwargs)(delayed(func)(*args) for args in args_l)
+
+    def map_columns(self, func: Callable, values: np.ndarray, *args: np.ndarray, inplace: bool = False) -> np.ndarray:
+        """
+        run `func(values, *args)` on the shards of columns
+
+        Parameters
+        ----------
+        func : Callable
+            the function working on the columns independently, the last axis of its result is the columns
+        values : np.ndarray
+            the 2D array to be sharded by columns
+        args : np.ndarray
+            the arrays sharded along their last axis like `values` (e.g. the statistics of the columns)
+        inplace : bool
+            `func` modifies the shard of `values` inplace and returns it. The results are copied back to `values` if
+            the shards are processed in other processes
+
+        Returns
+        -------
+        np.ndarray
+            `values` if `inplace` else the results concatenated along the last axis
+        """
+        bounds = np.linspace(0, values.shape[1], min(self.get_n_jobs(), values.shape[1]) + 1).astype(int)
+        shards = [(values[:, s:e],) + tuple(a[..., s:e] for a in args) for s, e in zip(bounds[:-1], bounds[1:])]
+        res_l = self._run(func, shards) if len(shards) > 0 else [func(values, *args)]
+        if not inplace:
+            return np.concatenate(res_l, axis=-1)
+        for shard, res in zip(shards, res_l):
+            if res is not shard[0]:
+                shard[0][:] = res
+        return values
+
+    def map_rows(
+        self, func: Callable, values: np.ndarray, *args: Sequence, boundaries: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        run `func(values, *args)` on the shards of rows and concatenate the results along the first axis
+
+        Parameters
+        ----------
+        boundaries : Optional[np.ndarray]
+            the sorted positions where the rows can be split (e.g. the first row of each datetime), all the positions
+            are allowed if it is None
+        args : Sequence
+            the sequences sharded by rows like `values` (e.g. the index of the rows)
+        """
+        n_rows = len(values)
+        targets = np.linspace(0, n_rows, min(self.get_n_jobs(), max(n_rows, 1)) + 1)[1:-1].astype(int)
+        if boundaries is not None and len(boundaries) > 0:
+            # move each split to the nearest following boundary
+            targets = boundaries[np.minimum(np.searchsorted(boundaries, targets), len(boundaries) - 1)]
+        elif boundaries is not None:
+            targets = targets[:0]
+        bounds = np.unique(np.concatenate([[0], targets, [n_rows]]))
+        shards = [(values[s:e],) + tuple(a[s:e] for a in args) for s, e in zip(bounds[:-1], bounds[1:])]
+        if len(shards) <= 1:
+            return func(values, *args)
+        return np.concatenate(self._run(func, shards), axis=0)
+
+
 class AsyncCaller:
     """
     This AsyncCaller tries to make it easier to async call
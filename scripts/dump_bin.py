@@ -5,7 +5,8 @@ import abc
 import shutil
 import traceback
 from pathlib import Path
-from typing import Iterable, List, Union
+from collections import defaultdict
+from typing import Iterable, List, Union, Tuple, Dict
 from functools import partial
 from concurrent.futures import ThreadPoolExecutor, as_completed, ProcessPoolExecutor
 
@@ -15,6 +16,7 @@ import pandas as pd
 from tqdm import tqdm
 from loguru import logger
 from qlib.utils import fname_to_code, code_to_fname
+from qlib.data.storage.file_storage import ColumnarFeatureStorage
 
 
 class DumpDataBase:
@@ -356,6 +358,106 @@ class DumpDataFix(DumpDataAll):
         self._dump_features()
 
 
+class DumpDataColumnar(DumpDataAll):
+    """Dump the features in the consolidated columnar layout (one file for each field, see `ColumnarFeatureStorage`)"""
+
+    def _get_columnar_data(
+        self, file_path: Path, calendar_list: List[pd.Timestamp]
+    ) -> Tuple[str, Dict[str, pd.Series]]:
+        code = self.get_symbol_from_file(file_path)
+        df = self._get_source_data(file_path)
+        if df is None or df.empty:
+            logger.warning(f"{code} data is None or empty")
+            return code, {}
+        df = self.data_merge_calendar(df.drop_duplicates(self.date_field_name), calendar_list)
+        if df.empty:
+            logger.warning(f"{code} data is not in calendars")
+            return code, {}
+        date_index = self.get_datetime_index(df, calendar_list)
+        index = pd.RangeIndex(date_index, date_index + len(df))
+        return code, {
+            field: pd.Series(df[field].values.astype("<f"), index=index)
+            for field in self.get_dump_fields(df.columns)
+            if field in df.columns
+        }
+
+    def _dump_features(self):
+        logger.info("start dump features......")
+        fields_data = defaultdict(dict)
+        _fun = partial(self._get_columnar_data, calendar_list=self._calendars_list)
+        with tqdm(total=len(self.csv_files)) as p_bar:
+            with ProcessPoolExecutor(max_workers=self.works) as executor:
+                for code, data in executor.map(_fun, self.csv_files):
+                    for field, series in data.items():
+                        fields_data[field][code_to_fname(code).lower()] = series
+                    p_bar.update()
+        for field, data in tqdm(fields_data.items()):
+            ColumnarFeatureStorage.write_columnar(
+                self.qlib_dir.joinpath(ColumnarFeatureStorage.COLUMNAR_DIR_NAME, f"{field.lower()}.{self.freq}.bin"),
+                data,
+                len(self._calendars_list),
+            )
+        logger.info("end of features dump.\n")
+
+
+class DumpColumnarFromBin:
+    def __init__(self, qlib_dir: str, freq: str = "day", exclude_fields: str = "", include_fields: str = ""):
+        """Convert the features of the default layout (one file for each instrument and field) into the
+        consolidated columnar layout (one file for each field, see `ColumnarFeatureStorage`)
+
+        Parameters
+        ----------
+        qlib_dir: str
+            qlib data directory
+        freq: str, default "day"
+            transaction frequency
+        exclude_fields: str
+            fields not converted, separated by ","
+        include_fields: str
+            fields to convert, separated by ","; all fields by default
+        """
+        self.qlib_dir = Path(qlib_dir).expanduser()
+        self.freq = freq
+        if isinstance(exclude_fields, str):
+            exclude_fields = exclude_fields.split(",")
+        if isinstance(include_fields, str):
+            include_fields = include_fields.split(",")
+        self._exclude_fields = tuple(filter(lambda x: len(x) > 0, map(str.strip, exclude_fields)))
+        self._include_fields = tuple(filter(lambda x: len(x) > 0, map(str.strip, include_fields)))
+
+    def dump(self):
+        calendar_path = self.qlib_dir.joinpath(DumpDataBase.CALENDARS_DIR_NAME, f"{self.freq}.txt")
+        calendar_size = len(DumpDataBase._read_calendars(calendar_path))
+        suffix = f".{self.freq}{DumpDataBase.DUMP_FILE_SUFFIX}"
+        fields_files = defaultdict(list)
+        for bin_path in self.qlib_dir.joinpath(DumpDataBase.FEATURES_DIR_NAME).glob(f"*/*{suffix}"):
+            field = bin_path.name[: -len(suffix)]
+            if (self._include_fields and field not in self._include_fields) or field in self._exclude_fields:
+                continue
+            fields_files[field].append(bin_path)
+
+        logger.info("start convert features......")
+        for field, bin_paths in tqdm(fields_files.items()):
+            data = {}
+            for bin_path in bin_paths:
+                values = np.fromfile(bin_path, dtype="<f")
+                if len(values) < 2:
+                    continue
+                date_index = int(values[0])
+                data[bin_path.parent.name] = pd.Series(
+                    values[1:], index=pd.RangeIndex(date_index, date_index + len(values) - 1)
+                )
+            ColumnarFeatureStorage.write_columnar(
+                self.qlib_dir.joinpath(ColumnarFeatureStorage.COLUMNAR_DIR_NAME, f"{field}{suffix}"),
+                data,
+                calendar_size,
+            )
+        logger.info("end of features convert.\n")
+
+    def __call__(self, *args, **kwargs):
+        self.dump()
+
+
 class DumpDataUpdate(DumpDataBase):
     def __init__(
         self,
@@ -502,4 +604,12 @@ class DumpDataUpdate(DumpDataBase):
 
 
 if __name__ == "__main__":
-    fire.Fire({"dump_all": DumpDataAll, "dump_fix": DumpDataFix, "dump_update": DumpDataUpdate})
+    fire.Fire(
+        {
+            "dump_all": DumpDataAll,
+            "dump_fix": DumpDataFix,
+            "dump_update": DumpDataUpdate,
+            "dump_columnar": DumpDataColumnar,
+            "dump_columnar_from_bin": DumpColumnarFromBin,
+        }
+    )
@@ -0,0 +1,92 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import copy
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qlib.backtest.decision import Order, OrderDir
+from qlib.backtest.position import ArrayPosition, ArrayPositionHistory, Position
+
+
+class TestArrayPosition(unittest.TestCase):
+    def _assert_same_position(self, expected: Position, position: ArrayPosition):
+        self.assertEqual(sorted(expected.get_stock_list()), sorted(position.get_stock_list()))
+        for code in expected.get_stock_list():
+            self.assertAlmostEqual(expected.get_stock_amount(code), position.get_stock_amount(code))
+            self.assertAlmostEqual(expected.get_stock_price(code), position.get_stock_price(code))
+            self.assertEqual(expected.get_stock_count(code, "day"), position.get_stock_count(code, "day"))
+        self.assertAlmostEqual(expected.get_cash(include_settle=True), position.get_cash(include_settle=True))
+        self.assertAlmostEqual(expected.calculate_value(), position.calculate_value())
+        self.assertAlmostEqual(expected.calculate_stock_value(), position.calculate_stock_value())
+        exp_weight, weight = expected.get_stock_weight_dict(), position.get_stock_weight_dict()
+        self.assertEqual(set(exp_weight), set(weight))
+        for code, w in exp_weight.items():
+            self.assertAlmostEqual(w, weight[code])
+
+    def test_same_as_position(self):
+        rng = np.random.default_rng(0)
+        codes = [f"SH60{i:04d}" for i in range(30)]
+        init = {"SH600000": {"amount": 1000, "price": 10.0}, "SH600001": 200}
+        expected = Position(cash=1e6, position_dict=copy.deepcopy(init))
+        position = ArrayPosition(cash=1e6, position_dict=copy.deepcopy(init))
+        expected.update_stock_price("SH600001", 5.0)
+        position.update_stock_price("SH600001", 5.0)
+        hist_expected, hist = {}, ArrayPositionHistory()
+        for day, t in enumerate(pd.date_range("2020-01-01", periods=20)):
+            if day % 5 == 0:
+                for pos in expected, position:
+                    pos.settle_start(Position.ST_CASH)
+            for code in rng.choice(codes, 10, replace=False):
+                price = 10 + rng.random()
+                held = expected.get_stock_amount(code)
+                if held > 0 and rng.random() < 0.5:
+                    # sell all the stocks or a part of them
+                    amount = held if rng.random() < 0.5 else held / 2
+                    order = Order(code, amount, OrderDir.SELL, t, t)
+                else:
+                    order = Order(code, 100 * rng.integers(1, 10), OrderDir.BUY, t, t)
+                for pos in expected, position:
+                    pos.update_order(order, order.amount * price, 5.0, price)
+            for code in expected.get_stock_list():
+                price = expected.get_stock_price(code) * (1 + rng.normal(scale=0.02))
+                for pos in expected, position:
+                    pos.update_stock_price(code, price)
+            for pos in expected, position:
+                pos.add_count_all("day")
+                pos.settle_commit()
+                pos.position["now_account_value"] = pos.calculate_value()
+                pos.update_weight_all()
+            self._assert_same_position(expected, position)
+            self._assert_same_position(copy.deepcopy(expected), copy.deepcopy(position))
+            hist_expected[t] = copy.deepcopy(expected)
+            hist.record(t, position)
+
+        self.assertEqual(list(hist_expected), list(hist))
+        for t, pos in hist_expected.items():
+            self.assertIsInstance(hist[t], Position)
+            self.assertEqual(set(pos.position), set(hist[t].position))
+            for code, value in pos.position.items():
+                if isinstance(value, dict):
+                    self.assertEqual(set(value), set(hist[t].position[code]))
+                    for key in value:
+                        self.assertAlmostEqual(value[key], hist[t].position[code][key])
+                else:
+                    self.assertAlmostEqual(value, hist[t].position[code])
+
+    def test_errors(self):
+        position = ArrayPosition(cash=1e6)
+        t = pd.Timestamp("2020-01-01")
+        with self.assertRaises(KeyError):
+            position.update_order(Order("SH600000", 100, OrderDir.SELL, t, t), 1000, 5, 10)
+        position.update_order(Order("SH600000", 100, OrderDir.BUY, t, t), 1000, 5, 10)
+        with self.assertRaises(ValueError):
+            position.update_order(Order("SH600000", 200, OrderDir.SELL, t, t), 2000, 5, 10)
+        self.assertFalse(position.check_stock("SH600001"))
+        self.assertEqual(position.get_stock_amount("SH600001"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import copy
+import unittest
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from qlib.backtest import get_exchange
+from qlib.backtest.decision import Order, OrderDir
+from qlib.backtest.high_performance_ds import IndexedNumpyQuote, NumpyQuote
+from qlib.backtest.position import Position
+from qlib.data import D
+from qlib.tests import TestAutoData
+
+
+class TestDealOrders(TestAutoData):
+    START_TIME = "2017-01-01"
+    END_TIME = "2017-03-31"
+
+    def _check_same_as_deal_order(self, quote_cls, **exchange_kwargs):
+        exchange = get_exchange(
+            start_time=self.START_TIME,
+            end_time=self.END_TIME,
+            codes="csi300",
+            limit_threshold=0.095,
+            quote_cls=quote_cls,
+            **exchange_kwargs,
+        )
+        rng = np.random.default_rng(0)
+        codes = D.list_instruments(D.instruments("csi300"), as_list=True) + ["SH699999"]
+        held = {code: {"amount": 1000.0, "price": 10.0} for code in codes[:50]}
+        for day in D.calendar(start_time="2017-02-01", end_time="2017-02-28"):
+            end_time = day + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+            orders = [
+                Order(code, 100.0 * rng.integers(1, 20), OrderDir.SELL, day, end_time)
+                for code in rng.choice(codes[:60], 30, replace=False)
+            ]
+            # the cash is not enough for all the buying orders and some stocks are bought twice
+            orders += [
+                Order(code, 100.0 * rng.integers(1, 100), OrderDir.BUY, day, end_time)
+                for code in np.concatenate([rng.choice(codes, 60), rng.choice(codes, 20)])
+            ]
+            expected_orders, orders = copy.deepcopy(orders), copy.deepcopy(orders)
+            expected_pos = Position(cash=1e5, position_dict=copy.deepcopy(held))
+            position = Position(cash=1e5, position_dict=copy.deepcopy(held))
+
+            expected, dealt_order_amount = [], defaultdict(float)
+            for order in expected_orders:
+                expected.append(
+                    exchange.deal_order(order, position=expected_pos, dealt_order_amount=dealt_order_amount)
+                )
+                dealt_order_amount[order.stock_id] += order.deal_amount
+            res = exchange.deal_orders(orders, position=position)
+
+            np.testing.assert_allclose(np.array(expected, dtype=float), np.array(res, dtype=float))
+            self.assertEqual([o.deal_amount for o in expected_orders], [o.deal_amount for o in orders])
+            self.assertEqual(expected_pos.position, position.position)
+
+    def test_deal_orders(self):
+        for quote_cls in NumpyQuote, IndexedNumpyQuote:
+            self._check_same_as_deal_order(quote_cls)
+            self._check_same_as_deal_order(
+                quote_cls,
+                deal_price=("$open", "$close"),
+                impact_cost=0.01,
+                volume_threshold={"buy": ("cum", "0.0001 * $volume"), "sell": ("current", "0.0002 * $volume")},
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
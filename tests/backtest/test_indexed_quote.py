@@ -0,0 +1,78 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qlib.backtest.high_performance_ds import BaseQuote, IndexedNumpyQuote, NumpyQuote
+from qlib.utils.index_data import IndexData
+
+
+class TestIndexedNumpyQuote(unittest.TestCase):
+    def _get_quote_df(self, times: pd.DatetimeIndex, rng: np.random.Generator) -> pd.DataFrame:
+        index = []
+        for i in range(20):
+            # each stock has records in a period, and some of the records in it are missing
+            start, end = sorted(rng.integers(0, len(times), 2))
+            stock_times = times[start : end + 1]
+            stock_times = stock_times[rng.random(len(stock_times)) < 0.8]
+            index.extend((f"SH60{i:04d}", t) for t in stock_times)
+        index = pd.MultiIndex.from_tuples(index, names=["instrument", "datetime"])
+        df = pd.DataFrame(
+            {
+                "$close": rng.random(len(index)),
+                "$volume": rng.random(len(index)),
+                "limit_buy": rng.random(len(index)) < 0.3,
+            },
+            index=index,
+        )
+        df.loc[rng.random(len(df)) < 0.2, "$close"] = np.nan
+        return df
+
+    def _assert_same(self, expected, value):
+        if expected is None or isinstance(expected, IndexData):
+            self.assertEqual(type(expected), type(value))
+            if expected is not None:
+                self.assertEqual(list(expected.index), list(value.index))
+                np.testing.assert_array_equal(expected.data, value.data)
+        else:
+            np.testing.assert_array_equal(expected, value)
+
+    def _check_same_as_numpy_quote(self, freq: str, times: pd.DatetimeIndex, bar: pd.Timedelta):
+        rng = np.random.default_rng(0)
+        quote_df = self._get_quote_df(times, rng)
+        expected, quote = NumpyQuote(quote_df, freq), IndexedNumpyQuote(quote_df, freq)
+        stocks = sorted(expected.get_all_stock()) + ["SH699999"]
+        self.assertEqual(sorted(expected.get_all_stock()), sorted(quote.get_all_stock()))
+        for _ in range(1000):
+            i = rng.integers(len(times))
+            start_time = times[i]
+            end_time = times[min(i + rng.choice([0, 1, 5]), len(times) - 1)] + bar - pd.Timedelta(seconds=1)
+            field = rng.choice(["$close", "$volume", "limit_buy"])
+            method = rng.choice([None, "sum", "mean", "last", "all", "ts_data_last"])
+            for stock_id in stocks:
+                self._assert_same(
+                    expected.get_data(stock_id, start_time, end_time, field, method),
+                    quote.get_data(stock_id, start_time, end_time, field, method),
+                )
+            if method is not None:
+                np.testing.assert_allclose(
+                    BaseQuote.get_data_batch(expected, stocks, start_time, end_time, field, method),
+                    quote.get_data_batch(stocks, start_time, end_time, field, method),
+                )
+
+    def test_day(self):
+        self._check_same_as_numpy_quote("day", pd.bdate_range("2020-01-01", periods=60), pd.Timedelta(days=1))
+
+    def test_minute(self):
+        minutes = pd.timedelta_range("09:30:00", "11:29:00", freq="min").append(
+            pd.timedelta_range("13:00:00", "14:59:00", freq="min")
+        )
+        times = pd.DatetimeIndex([day + m for day in pd.bdate_range("2020-01-01", periods=2) for m in minutes])
+        self._check_same_as_numpy_quote("1min", times, pd.Timedelta(minutes=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qlib.backtest import VectorizedBacktest, backtest, get_exchange, vectorized_backtest
+from qlib.data import D
+from qlib.tests import TestAutoData
+
+
+class TestVectorizedBacktest(TestAutoData):
+    START_TIME = "2017-01-01"
+    END_TIME = "2017-06-30"
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        instruments = D.list_instruments(D.instruments("csi300"), as_list=True)
+        calendar = D.calendar(start_time="2016-12-01", end_time=cls.END_TIME)
+        index = pd.MultiIndex.from_product([calendar, instruments], names=["datetime", "instrument"])
+        cls.signal = pd.Series(np.random.default_rng(0).normal(size=len(index)), index=index)
+
+    def _assert_same_results(self, expected, result):
+        pm_exp, pos_exp = expected[0]["1day"]
+        pm_res, pos_res = result[0]["1day"]
+        pd.testing.assert_frame_equal(pm_exp, pm_res, rtol=1e-8, check_freq=False)
+        ind_exp, ind_res = expected[1]["1day"][0], result[1]["1day"][0]
+        pd.testing.assert_frame_equal(ind_exp.astype(float), ind_res.astype(float), rtol=1e-8, check_freq=False)
+        self.assertEqual(list(pos_exp), list(pos_res))
+        for t, pos in pos_exp.items():
+            self.assertEqual(set(pos.get_stock_list()), set(pos_res[t].get_stock_list()))
+            for code in pos.get_stock_list():
+                self.assertAlmostEqual(pos.get_stock_amount(code), pos_res[t].get_stock_amount(code))
+
+    def _check_topk_dropout(self, strategy_kwargs=None, executor_kwargs=None, exchange_kwargs=None, account=1e8):
+        strategy = {
+            "class": "TopkDropoutStrategy",
+            "module_path": "qlib.contrib.strategy",
+            "kwargs": {"signal": self.signal, "topk": 20, "n_drop": 5, **(strategy_kwargs or {})},
+        }
+        executor = {
+            "class": "SimulatorExecutor",
+            "module_path": "qlib.backtest.executor",
+            "kwargs": {"time_per_step": "day", "generate_portfolio_metrics": True, **(executor_kwargs or {})},
+        }
+        exchange_kwargs = {
+            "freq": "day",
+            "limit_threshold": 0.095,
+            "deal_price": "close",
+            "open_cost": 0.0005,
+            "close_cost": 0.0015,
+            "min_cost": 5,
+            "codes": "csi300",
+            **(exchange_kwargs or {}),
+        }
+        kwargs = dict(benchmark="SH000300", account=account, exchange_kwargs=exchange_kwargs)
+        expected = backtest(self.START_TIME, self.END_TIME, strategy, executor, **kwargs)
+        result = vectorized_backtest(self.START_TIME, self.END_TIME, strategy, executor, **kwargs)
+        self._assert_same_results(expected, result)
+
+    def test_topk_dropout(self):
+        self._check_topk_dropout()
+
+    def test_topk_dropout_options(self):
+        self._check_topk_dropout(
+            strategy_kwargs={"only_tradable": True, "forbid_all_trade_at_limit": False, "hold_thresh": 3}
+        )
+        self._check_topk_dropout(executor_kwargs={"trade_type": "parallel"}, exchange_kwargs={"deal_price": "open"})
+
+    def test_cash_and_volume_limit(self):
+        # a small account makes the cash limitation and the minimum cost matter
+        self._check_topk_dropout(strategy_kwargs={"risk_degree": 1.0}, exchange_kwargs={"min_cost": 50}, account=1e5)
+        self._check_topk_dropout(exchange_kwargs={"volume_threshold": ("current", "0.001 * $volume")})
+
+    def test_target_weight(self):
+        from qlib.contrib.strategy.signal_strategy import WeightStrategyBase  # pylint: disable=C0415
+
+        class ScoreWeightStrategy(WeightStrategyBase):
+            """Hold the stocks with the weights given by the signal"""
+
+            def generate_target_weight_position(self, score, current, trade_start_time, trade_end_time):
+                return score.dropna().to_dict()
+
+        weight = self.signal.groupby(level="datetime").transform(lambda s: (s > 1) / max((s > 1).sum(), 1))
+        weight = weight[weight > 0]
+        strategy = {"class": ScoreWeightStrategy, "kwargs": {"signal": weight}}
+        executor = {
+            "class": "SimulatorExecutor",
+            "module_path": "qlib.backtest.executor",
+            "kwargs": {"time_per_step": "day", "generate_portfolio_metrics": True},
+        }
+        exchange_kwargs = {"freq": "day", "limit_threshold": 0.095, "deal_price": "close", "codes": "csi300"}
+        expected = backtest(
+            self.START_TIME, self.END_TIME, strategy, executor, account=1e8, exchange_kwargs=exchange_kwargs
+        )
+        exchange = get_exchange(start_time=self.START_TIME, end_time=self.END_TIME, **exchange_kwargs)
+        result = VectorizedBacktest(exchange, self.START_TIME, self.END_TIME, account=1e8).run_target_weight(weight)
+        self._assert_same_results(expected, result)
+
+    def test_replace_and_sweep(self):
+        from qlib.contrib.evaluate import backtest_sweep  # pylint: disable=C0415
+
+        exchange_kwargs = {"freq": "day", "deal_price": "close", "codes": "csi300"}
+        exchange = get_exchange(
+            start_time=self.START_TIME, end_time=self.END_TIME, limit_threshold=0.095, **exchange_kwargs
+        )
+        engine = VectorizedBacktest(exchange, self.START_TIME, self.END_TIME, account=1e8)
+        replaced = {"limit_threshold": 0.05, "open_cost": 0.001, "close_cost": 0.002, "min_cost": 5.0}
+        expected = VectorizedBacktest(
+            get_exchange(start_time=self.START_TIME, end_time=self.END_TIME, **exchange_kwargs, **replaced),
+            self.START_TIME,
+            self.END_TIME,
+            account=1e8,
+        ).run_topk_dropout(self.signal, topk=20, n_drop=5)
+        self._assert_same_results(expected, engine.replace(**replaced).run_topk_dropout(self.signal, 20, 5))
+        with self.assertRaises(ValueError):
+            engine.replace(deal_price="open")
+
+        grid = {"topk": [10, 20], "n_drop": [5], "limit_threshold": [0.05, 0.095]}
+        res = backtest_sweep(
+            self.signal, grid, self.START_TIME, self.END_TIME, account=1e8, exchange_kwargs=exchange_kwargs, n_jobs=2
+        )
+        self.assertEqual(len(res), 4)
+        self.assertEqual(
+            res[["topk", "limit_threshold"]].values.tolist(), [[10, 0.05], [10, 0.095], [20, 0.05], [20, 0.095]]
+        )
+        report = engine.replace(limit_threshold=0.05, open_cost=0.0005, close_cost=0.0015, min_cost=5).run_topk_dropout(
+            self.signal, topk=20, n_drop=5
+        )[0]["1day"][0]
+        self.assertAlmostEqual(res.loc[2, "turnover"], report["turnover"].mean())
+        self.assertIn("excess_return_with_cost.information_ratio", res.columns)
+
+    def test_unsupported(self):
+        exchange = get_exchange(start_time=self.START_TIME, end_time=self.END_TIME, codes="csi300")
+        with self.assertRaises(NotImplementedError):
+            VectorizedBacktest(exchange, self.START_TIME, self.END_TIME, trade_type="unknown")
+        with self.assertRaises(NotImplementedError):
+            VectorizedBacktest(exchange, self.START_TIME, self.END_TIME).run_topk_dropout(
+                self.signal, topk=20, n_drop=5, method_sell="random"
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
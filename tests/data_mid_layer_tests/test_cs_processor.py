@@ -0,0 +1,74 @@
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from qlib.data.dataset.processor import CSRankNorm, CSZFillna, CSZScoreNorm
+from qlib.utils.data import CrossSection, robust_zscore, zscore
+
+
+def make_df(n_dates, n_insts, n_cols=3, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.MultiIndex.from_product(
+        [pd.date_range("2020-01-01", periods=n_dates), [f"SH{i:06d}" for i in range(n_insts)]],
+        names=["datetime", "instrument"],
+    )
+    values = rng.normal(size=(len(index), n_cols)).astype(np.float32)
+    values[rng.random(values.shape) < 0.1] = np.nan
+    return pd.DataFrame(values, index=index, columns=pd.MultiIndex.from_product([["feature"], range(n_cols)]))
+
+
+# The previous implementations by `groupby().apply`
+GROUPBY_FUNCS = {
+    "zscore": lambda df: df.groupby("datetime", group_keys=False).apply(zscore),
+    "robust_zscore": lambda df: df.groupby("datetime", group_keys=False).apply(robust_zscore),
+    "rank_pct": lambda df: df.groupby("datetime").rank(pct=True),
+    "fillna_mean": lambda df: df.groupby("datetime", group_keys=False).apply(lambda x: x.fillna(x.mean())),
+}
+
+
+class TestCrossSection(unittest.TestCase):
+    def test_kernels(self):
+        df = make_df(50, 40)
+        df.iloc[:40, 0] = np.nan  # a cross section without valid values
+        df.iloc[40:79, 1] = np.nan  # a cross section with a single valid value
+        df.iloc[:, 2] = np.round(df.iloc[:, 2] * 2)  # ties
+        # missing and unsorted rows
+        for data in [df, df.sample(frac=0.8, random_state=0), df.swaplevel().sort_index()]:
+            cs = CrossSection(data.index)
+            for name, func in GROUPBY_FUNCS.items():
+                expected = func(data).reindex(data.index).values
+                np.testing.assert_allclose(getattr(cs, name)(data.values), expected, rtol=1e-5, atol=1e-6)
+
+    def test_processors(self):
+        df = make_df(20, 30)
+        res = CSZScoreNorm(fields_group="feature")(df.copy())
+        np.testing.assert_allclose(res.values, GROUPBY_FUNCS["zscore"](df).values, rtol=1e-5, atol=1e-6)
+        res = CSZScoreNorm(fields_group="feature", method="robust")(df.copy())
+        np.testing.assert_allclose(res.values, GROUPBY_FUNCS["robust_zscore"](df).values, rtol=1e-5, atol=1e-6)
+        res = CSRankNorm(fields_group="feature")(df.copy())
+        expected = (GROUPBY_FUNCS["rank_pct"](df).values - 0.5) * 3.46
+        np.testing.assert_allclose(res.values, expected, rtol=1e-5, atol=1e-6)
+        res = CSZFillna(fields_group="feature")(df.copy())
+        np.testing.assert_allclose(res.values, GROUPBY_FUNCS["fillna_mean"](df).values, rtol=1e-5, atol=1e-6)
+        self.assertEqual(res.dtypes.unique().tolist(), [np.float32])
+
+    @pytest.mark.slow
+    def test_speed(self):
+        df = make_df(2000, 300, n_cols=1)
+
+        def timeit(func):
+            t = time.time()
+            func()
+            return time.time() - t
+
+        for name, func in GROUPBY_FUNCS.items():
+            groupby_time = timeit(lambda: func(df))
+            kernel_time = timeit(lambda: getattr(CrossSection(df.index), name)(df.values))
+            print(f"{name}: {groupby_time:.4f}s -> {kernel_time:.4f}s, {groupby_time / kernel_time:.1f}x")
+
+
+if __name__ == "__main__":
+    unittest.main()
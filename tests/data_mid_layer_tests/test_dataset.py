@@ -1,7 +1,11 @@
 # Copyright (c) Microsoft Corporation.
 # Licensed under the MIT License.
 
+import pickle
+import tempfile
 import unittest
+from pathlib import Path
+
 import pytest
 import sys
 from qlib.tests import TestAutoData
@@ -146,6 +150,57 @@ class TestTSDataSampler(unittest.TestCase):
         self.assertEqual(dataset[0][1], dataset[1][0])
         self.assertEqual(dataset[0][2], dataset[1][1])
 
+    def test_TSDataSampler_batch(self):
+        datetime_list = pd.date_range("2000-01-01", periods=30)
+        instruments = [f"00000{i}" for i in range(6)]
+        index = pd.MultiIndex.from_product([datetime_list, instruments], names=["datetime", "instrument"])
+        test_df = pd.DataFrame(data=np.random.randn(len(index), 3), index=index, columns=["f0", "f1", "label"])
+        # lost dates of some instruments
+        test_df = test_df.drop(index[np.random.default_rng(0).random(len(index)) < 0.2])
+        dataset = TSDataSampler(test_df, datetime_list[5], datetime_list[-1], step_len=8, dtype=np.float32)
+        ids = np.random.default_rng(1).permutation(len(dataset))
+        for fillna_type in ["none", "ffill", "ffill+bfill"]:
+            dataset.config(fillna_type=fillna_type)
+            expected = np.stack([dataset[int(i)] for i in ids])
+            np.testing.assert_array_equal(dataset[ids], expected)
+            np.testing.assert_array_equal(dataset.get_batch(ids[:3]), expected[:3])
+            self.assertEqual(dataset[list(ids)].dtype, np.float32)
+        with self.assertRaises(KeyError):
+            dataset.get_batch([0, len(dataset)])
+
+    def test_TSDataSampler_mmap(self):
+        datetime_list = pd.date_range("2000-01-01", periods=20)
+        instruments = ["000001", "000002", "000003", "000004", "000005"]
+        index = pd.MultiIndex.from_product([datetime_list, instruments], names=["datetime", "instrument"])
+        test_df = pd.DataFrame(data=np.random.randn(len(index), 3), index=index, columns=["f0", "f1", "label"])
+        test_df = test_df.drop(index[7:12])
+        flt_data = test_df["label"] > -1
+        expected = TSDataSampler(test_df.copy(), datetime_list[3], datetime_list[-1], step_len=4, flt_data=flt_data)
+        with tempfile.TemporaryDirectory() as mmap_dir:
+            for _ in range(2):
+                # the arrays are built and saved at the first time, and loaded at the second time
+                dataset = TSDataSampler(
+                    test_df.copy(),
+                    datetime_list[3],
+                    datetime_list[-1],
+                    step_len=4,
+                    flt_data=flt_data,
+                    mmap_dir=mmap_dir,
+                )
+                self.assertEqual(len(list(Path(mmap_dir).iterdir())), 1)
+                self.assertIsInstance(dataset.data_arr, np.memmap)
+                self.assertEqual(len(dataset), len(expected))
+                pd.testing.assert_index_equal(dataset.get_index(), expected.get_index())
+                np.testing.assert_array_equal(dataset[np.arange(len(dataset))], expected[np.arange(len(expected))])
+                np.testing.assert_array_equal(dataset[0], expected[0])
+                np.testing.assert_array_equal(dataset["2000-01-10", "000003"], expected["2000-01-10", "000003"])
+            # the arrays are reopened instead of being pickled
+            self.assertNotIn("data_arr", dataset.__getstate__())
+            np.testing.assert_array_equal(pickle.loads(pickle.dumps(dataset))[5], expected[5])
+            # different arguments
+            TSDataSampler(test_df.copy(), datetime_list[3], datetime_list[-1], step_len=5, mmap_dir=mmap_dir)
+            self.assertEqual(len(list(Path(mmap_dir).iterdir())), 2)
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=10)
@@ -1,10 +1,22 @@
 import os
 import pickle
 import shutil
+import tempfile
+import time
 import unittest
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
 from qlib.tests import TestAutoData
 from qlib.data import D
-from qlib.data.dataset.handler import DataHandlerLP
+from qlib.data.dataset import DatasetH
+from qlib.config import C
+from qlib.data.dataset.cache import HandlerCache
+from qlib.data.dataset.handler import DataHandler, DataHandlerLP
+from qlib.data.dataset.loader import StaticDataLoader
+from qlib.data.dataset.processor import AsType
+from qlib.data.dataset.utils import share_memory, fetch_df_by_col, fetch_df_by_index
 
 
 class HandlerTests(TestAutoData):
@@ -33,5 +45,227 @@ class HandlerTests(TestAutoData):
         os.remove(fname)
 
 
+class NewDataLoader(StaticDataLoader):
+    returns_new_data = True
+
+    def load(self, instruments=None, start_time=None, end_time=None) -> pd.DataFrame:
+        # keep the returned data to check if it is modified
+        self.loaded = super().load(instruments, start_time, end_time).copy()
+        return self.loaded
+
+
+class ProcessDataTests(unittest.TestCase):
+    def get_handler(self, **kwargs):
+        index = pd.MultiIndex.from_product(
+            [pd.date_range("2020-01-01", periods=20), [f"SH60000{i}" for i in range(5)]],
+            names=["datetime", "instrument"],
+        )
+        columns = pd.MultiIndex.from_tuples([("feature", f"f{i}") for i in range(4)] + [("label", "LABEL0")])
+        values = np.random.default_rng(0).normal(size=(len(index), len(columns))).astype(np.float32)
+        values[::7, 0] = np.nan
+        values[::5, -1] = np.nan
+        self.df = pd.DataFrame(values, index=index, columns=columns)
+        self.raw = self.df.copy()
+        norm = {"fit_start_time": "2020-01-01", "fit_end_time": "2020-01-10", "fields_group": "feature"}
+        return DataHandlerLP(
+            data_loader=StaticDataLoader(self.df),
+            infer_processors=[
+                {"class": "RobustZScoreNorm", "kwargs": norm},
+                {"class": "Fillna", "kwargs": {"fields_group": "feature"}},
+            ],
+            learn_processors=["DropnaLabel", {"class": "CSZScoreNorm", "kwargs": {"fields_group": "label"}}],
+            **kwargs,
+        )
+
+    def test_copy_on_write(self):
+        dh = self.get_handler()
+        # the raw data is kept
+        pd.testing.assert_frame_equal(dh._data, self.raw)
+        self.assertFalse(share_memory(dh._infer, dh._data))
+        self.assertFalse(share_memory(dh._learn, dh._infer))
+        self.assertEqual(dh._infer.dtypes.unique().tolist(), [np.float32])
+        self.assertFalse(dh._infer["feature"].isna().any().any())
+        self.assertEqual(len(dh._learn), self.raw["label"].notna().sum().item())
+
+        dh_i = self.get_handler(process_type=DataHandlerLP.PTYPE_I)
+        pd.testing.assert_frame_equal(dh_i._infer, dh._infer)
+        pd.testing.assert_frame_equal(dh_i._data, self.raw)
+        # the features are not processed by the infer processors
+        pd.testing.assert_frame_equal(dh_i._learn["feature"], self.raw.dropna(subset=[("label", "LABEL0")])["feature"])
+
+        # the data given to the loader is not modified
+        dh_d = self.get_handler(drop_raw=True)
+        self.assertFalse(hasattr(dh_d, "_data"))
+        pd.testing.assert_frame_equal(self.df, self.raw)
+        pd.testing.assert_frame_equal(dh_d._infer, dh._infer)
+        pd.testing.assert_frame_equal(dh_d._learn, dh._learn)
+        dh_d.setup_data()
+        pd.testing.assert_frame_equal(self.df, self.raw)
+        pd.testing.assert_frame_equal(dh_d._infer, dh._infer)
+
+        # the new data returned by the loader is processed inplace
+        dh_d = self.get_handler(drop_raw=True, init_data=False)
+        dh_d.data_loader = NewDataLoader(self.df)
+        dh_d.setup_data()
+        self.assertTrue(share_memory(dh_d._infer, dh_d.data_loader.loaded))
+        pd.testing.assert_frame_equal(dh_d._infer, dh._infer)
+        pd.testing.assert_frame_equal(dh_d._learn, dh._learn)
+
+    def test_lazy(self):
+        dh = self.get_handler()
+        for process_type in [DataHandlerLP.PTYPE_A, DataHandlerLP.PTYPE_I]:
+            dh.process_type = process_type
+            dh.setup_data(init_type=DataHandlerLP.IT_FIT_SEQ)
+            dh_lazy = self.get_handler(process_type=process_type, init_data=False)
+            dh_lazy.setup_data(init_type=DataHandlerLP.IT_LAZY)
+            self.assertFalse(hasattr(dh_lazy, "_infer"))
+            dataset = DatasetH(dh_lazy, segments={"train": ("2020-01-03", "2020-01-17")})
+            for data_key in [DataHandlerLP.DK_I, DataHandlerLP.DK_L]:
+                chunks = list(dataset.prepare("train", data_key=data_key, as_iterator=True, chunk_size=4))
+                self.assertEqual(len(chunks), 4)
+                expected = dh.fetch(("2020-01-03", "2020-01-17"), data_key=data_key)
+                pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+                pd.testing.assert_frame_equal(dataset.prepare("train", data_key=data_key), expected)
+            # the raw data is kept unchanged
+            pd.testing.assert_frame_equal(dh_lazy._data, self.raw)
+
+    def test_cache(self):
+        cache_path = tempfile.mkdtemp()
+        C["handler_cache_path"] = cache_path
+        try:
+            expected = self.get_handler()
+            dh = self.get_handler(init_data=False)
+            dh.setup_data(enable_cache=True)
+            self.assertEqual(len(os.listdir(cache_path)), 1)
+
+            dh_c = self.get_handler(init_data=False)
+            dh_c.fit_process_data = None  # the data are not processed again when the cache is hit
+            dh_c.setup_data(enable_cache=True)
+            for attr in "_data", "_infer", "_learn":
+                pd.testing.assert_frame_equal(getattr(dh_c, attr), getattr(expected, attr))
+            np.testing.assert_array_equal(dh_c.infer_processors[0].mean_train, expected.infer_processors[0].mean_train)
+
+            # the key changes with the config of the processors and the time range
+            dh_c = self.get_handler(init_data=False, process_type=DataHandlerLP.PTYPE_I)
+            dh_c.setup_data(enable_cache=True)
+            dh_c = self.get_handler(init_data=False, end_time="2020-01-15")
+            dh_c.setup_data(enable_cache=True)
+            self.assertEqual(len(os.listdir(cache_path)), 3)
+            self.assertEqual(dh_c._infer.index.get_level_values("datetime").max(), pd.Timestamp("2020-01-15"))
+
+            # the precision of the expressions changes the data
+            C["expression_dtype"] = "float64"
+            try:
+                dh_c = self.get_handler(init_data=False, end_time="2020-01-15")
+                dh_c.setup_data(enable_cache=True)
+            finally:
+                C["expression_dtype"] = "float32"
+            self.assertEqual(len(os.listdir(cache_path)), 4)
+
+            # the least recently used entries are evicted
+            cache = HandlerCache(size_limit=1)
+            # the key is computed before the processors are fitted
+            key = cache.get_key(self.get_handler(init_data=False), init_type=DataHandlerLP.IT_FIT_SEQ)
+            cache.evict(keep=key)
+            self.assertEqual(os.listdir(cache_path), [key])
+        finally:
+            C["handler_cache_path"] = None
+            shutil.rmtree(cache_path)
+
+    def test_float16(self):
+        dh = self.get_handler()
+        dh_16 = self.get_handler(init_data=False)
+        dh_16.infer_processors.append(AsType(dtype="float16", fields_group="feature"))
+        dh_16.setup_data()
+        self.assertEqual(dh_16._learn["feature"].dtypes.unique().tolist(), [np.float16])
+        self.assertEqual(dh_16._learn["label"].dtypes.unique().tolist(), [np.float32])
+        self.assertEqual(dh_16._learn["feature"].values.nbytes * 2, dh._learn["feature"].values.nbytes)
+        np.testing.assert_allclose(dh_16._learn.values.astype(np.float32), dh._learn.values, rtol=1e-3, atol=1e-3)
+
+        # the compressed cache
+        cache = HandlerCache(path=tempfile.mkdtemp(), compress=True)
+        try:
+            cache.dump(dh_16, "key")
+            dh_c = self.get_handler(init_data=False)
+            self.assertTrue(cache.load(dh_c, "key"))
+            pd.testing.assert_frame_equal(dh_c._learn, dh_16._learn)
+        finally:
+            cache.clear()
+
+
+class FetchTests(unittest.TestCase):
+    def get_df(self, n_dates, n_insts, n_cols=4):
+        index = pd.MultiIndex.from_product(
+            [pd.bdate_range("2020-01-01", periods=n_dates), [f"SH{i:06d}" for i in range(n_insts)]],
+            names=["datetime", "instrument"],
+        )
+        columns = pd.MultiIndex.from_tuples([("feature", f"f{i}") for i in range(n_cols)] + [("label", "LABEL0")])
+        values = np.random.default_rng(0).normal(size=(len(index), len(columns))).astype(np.float32)
+        return pd.DataFrame(values, index=index, columns=columns)
+
+    def test_datetime_offsets(self):
+        df = self.get_df(60, 5)
+        # some rows are missing
+        df = df.iloc[np.random.default_rng(0).random(len(df)) > 0.2]
+        dh = DataHandlerLP.from_df(df)
+        selectors = [
+            slice("2020-01-10", "2020-02-03"),
+            slice(None, "2020-01-10"),
+            slice("2020-03-01", None),
+            slice("2019-01-01", "2019-02-01"),
+            "2020-02",
+            pd.Timestamp("2020-01-06"),
+        ]
+        for selector in selectors:
+            for col_set in [DataHandler.CS_ALL, DataHandler.CS_RAW, "feature", ["label"]]:
+                expected = fetch_df_by_index(fetch_df_by_col(df, col_set), selector, "datetime")
+                pd.testing.assert_frame_equal(dh.fetch(selector, col_set=col_set), expected)
+        with self.assertRaises(KeyError):
+            dh.fetch("2020-01-04")  # Saturday
+
+        # the table is rebuilt after the data is replaced
+        dh._data = dh._infer = dh._learn = df.iloc[:10]
+        pd.testing.assert_frame_equal(dh.fetch(slice("2020-01-01", "2020-01-10")), df.iloc[:10].droplevel(0, axis=1))
+
+        # the data not sorted by datetime is fetched by `.loc`
+        df_s = df.swaplevel().sort_index()
+        dh = DataHandlerLP.from_df(df_s)
+        pd.testing.assert_frame_equal(
+            dh.fetch(selectors[0]), fetch_df_by_index(fetch_df_by_col(df_s, DataHandler.CS_ALL), selectors[0], 1)
+        )
+
+    def test_pickle_after_fetch(self):
+        df = self.get_df(20, 5)
+        dh = DataHandlerLP.from_df(df)
+        expected = dh.fetch(slice("2020-01-06", "2020-01-10"))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / "handler.pkl"
+            dh.to_pickle(path, dump_all=True)
+            dh_load = DataHandlerLP.load(path)
+        pd.testing.assert_frame_equal(dh_load.fetch(slice("2020-01-06", "2020-01-10")), expected)
+
+        dh.config(dump_all=True)
+        dh_load = pickle.loads(pickle.dumps(dh))
+        pd.testing.assert_frame_equal(dh_load._data, df)
+        pd.testing.assert_frame_equal(dh_load.fetch(slice("2020-01-06", "2020-01-10")), expected)
+
+    @pytest.mark.slow
+    def test_range_iterator_speed(self):
+        df = self.get_df(500, 300, n_cols=20)
+        dh = DataHandlerLP.from_df(df)
+
+        def run():
+            t = time.time()
+            n_rows = sum(len(data) for _, data in dh.get_range_iterator(periods=20))
+            return n_rows, time.time() - t
+
+        n_rows, offsets_time = run()
+        # fetch by `.loc` without the offset table
+        dh._get_datetime_rows = lambda *args: None
+        n_rows_loc, loc_time = run()
+        self.assertEqual(n_rows, n_rows_loc)
+        print(f"get_range_iterator: {loc_time:.4f}s -> {offsets_time:.4f}s, {loc_time / offsets_time:.1f}x")
+
+
 if __name__ == "__main__":
     unittest.main()
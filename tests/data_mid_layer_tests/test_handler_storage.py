@@ -1,10 +1,17 @@
+import gc
+import pickle
+import tempfile
 import unittest
 import time
+from pathlib import Path
 import numpy as np
+import pandas as pd
 from qlib.data import D
 from qlib.tests import TestAutoData
 
-from qlib.data.dataset.handler import DataHandlerLP
+from qlib.data.dataset.handler import DataHandler, DataHandlerLP
+from qlib.data.dataset.storage import ColumnarStorage
+from qlib.data.dataset.utils import fetch_df_by_col, fetch_df_by_index
 from qlib.contrib.data.handler import check_transform_proc
 from qlib.log import TimeInspector
 
@@ -106,5 +113,64 @@ class TestHandlerStorage(TestAutoData):
                 data_handler_hs.fetch(selector=(fetch_stocks, slice(fetch_start_time, fetch_end_time)), level=None)
 
 
+class TestColumnarStorage(unittest.TestCase):
+    def test_fetch(self):
+        index = pd.MultiIndex.from_product(
+            [pd.date_range("2020-01-01", periods=60), [f"SH60000{i}" for i in range(5)]],
+            names=["datetime", "instrument"],
+        )
+        columns = pd.MultiIndex.from_tuples([("feature", f"f{i}") for i in range(3)] + [("label", "LABEL0")])
+        df = pd.DataFrame(np.random.default_rng(0).normal(size=(len(index), 4)), index=index, columns=columns)
+        df[("feature", "f1")] = df[("feature", "f1")].astype(np.float32)
+        storage = ColumnarStorage.from_df(df.sample(frac=1, random_state=0))
+        storage = pickle.loads(pickle.dumps(storage))
+
+        dt, inst = pd.Timestamp("2020-01-05"), ["SH600001", "SH600003"]
+        for selector, level in [
+            (slice(None), "datetime"),
+            (slice("2020-01-10", "2020-02-03"), "datetime"),
+            (slice("2020-01-10", None), "datetime"),
+            ("2020-02", "datetime"),
+            (dt, "datetime"),
+            (inst, "instrument"),
+            ((slice("2020-01-10", "2020-01-20"), inst), None),
+        ]:
+            for col_set in [DataHandler.CS_ALL, DataHandler.CS_RAW, "label", "feature", ["feature", "label"]]:
+                expected = fetch_df_by_index(fetch_df_by_col(df, col_set), selector, level)
+                pd.testing.assert_frame_equal(storage.fetch(selector, level, col_set), expected)
+        with self.assertRaises(KeyError):
+            storage.fetch("2021-01-01")
+
+        proc_func = lambda x: x.fillna(0)  # noqa: E731
+        pd.testing.assert_frame_equal(
+            storage.fetch(slice("2020-01-10", "2020-01-20"), col_set="label", proc_func=proc_func),
+            df.loc["2020-01-10":"2020-01-20", ["label"]].droplevel(0, axis=1),
+        )
+
+    def test_pickle(self):
+        index = pd.MultiIndex.from_product(
+            [pd.date_range("2020-01-01", periods=20), [f"SH60000{i}" for i in range(5)]],
+            names=["datetime", "instrument"],
+        )
+        df = pd.DataFrame(np.random.default_rng(0).normal(size=(len(index), 3)), index=index, columns=["a", "b", "c"])
+        storage = ColumnarStorage.from_df(df)
+        path = storage.path
+        data = pickle.dumps(storage)
+        # the temporary directory is removed with the original storage
+        del storage
+        gc.collect()
+        self.assertFalse(path.exists())
+        storage = pickle.loads(data)
+        self.assertNotEqual(storage.path, path)
+        pd.testing.assert_frame_equal(storage.fetch(), df)
+
+        # the storage in a persistent directory only pickles the path
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            storage = ColumnarStorage.from_df(df, path=Path(tmp_dir) / "data")
+            storage = pickle.loads(pickle.dumps(storage))
+            self.assertEqual(storage.path, Path(tmp_dir) / "data")
+            pd.testing.assert_frame_equal(storage.fetch(), df)
+
+
 if __name__ == "__main__":
     unittest.main()
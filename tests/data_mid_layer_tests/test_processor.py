@@ -68,7 +68,9 @@ class TestProcessor(TestAutoData):
         # If we use the formula directly on the original data, we cannot get the correct result,
         # because the original data is processed by `groupby`, so we use the method of slicing,
         # taking the 2nd group of data from the original data, to calculate and compare.
-        assert (df[2:4] == ((origin_df[2:4] - origin_df[2:4].mean()).div(origin_df[2:4].std()))).all().all()
+        # The statistics are calculated in float64 by `CrossSection`, so the results may differ in the last bits
+        expected = (origin_df[2:4] - origin_df[2:4].mean()).div(origin_df[2:4].std())
+        assert np.allclose(df[2:4], expected, rtol=1e-5, atol=1e-6)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qlib.data.dataset.handler import DataHandlerLP
+from qlib.data.dataset import processor as processor_module
+from qlib.data.dataset.processor import use_executor
+from qlib.utils import init_instance_by_config
+from qlib.utils.paral import ShardExecutor
+
+
+def make_df(n_dates=300, n_insts=50, n_cols=7, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.MultiIndex.from_product(
+        [pd.date_range("2020-01-01", periods=n_dates), [f"SH{i:06d}" for i in range(n_insts)]],
+        names=["datetime", "instrument"],
+    )
+    values = rng.normal(size=(len(index), n_cols + 1)).astype(np.float32)
+    values[rng.random(values.shape) < 0.1] = np.nan
+    columns = pd.MultiIndex.from_tuples([("feature", i) for i in range(n_cols)] + [("label", "LABEL0")])
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+FIT_KWARGS = {"fields_group": "feature", "fit_start_time": None, "fit_end_time": "2020-06-30"}
+INFER_PROCESSORS = [
+    {"class": "RobustZScoreNorm", "kwargs": FIT_KWARGS},
+    {"class": "ZScoreNorm", "kwargs": FIT_KWARGS},
+    {"class": "MinMaxNorm", "kwargs": FIT_KWARGS},
+    {"class": "CSZScoreNorm", "kwargs": {"fields_group": "feature", "method": "robust"}},
+    {"class": "CSZFillna", "kwargs": {"fields_group": "feature"}},
+    {"class": "Fillna", "kwargs": {"fields_group": "feature"}},
+]
+LEARN_PROCESSORS = [
+    {"class": "DropnaLabel"},
+    {"class": "CSRankNorm", "kwargs": {"fields_group": "label"}},
+]
+
+
+class TestProcessorExecutor(unittest.TestCase):
+    def _process(self, df, proc_executor):
+        handler = DataHandlerLP.from_df(df)
+        handler.infer_processors = [init_instance_by_config(p, processor_module) for p in INFER_PROCESSORS]
+        handler.learn_processors = [init_instance_by_config(p, processor_module) for p in LEARN_PROCESSORS]
+        handler.proc_executor = proc_executor
+        handler.process_data(with_fit=True)
+        return handler
+
+    def test_parity(self):
+        df = make_df()
+        expected = self._process(df, None)
+        executors = [
+            ShardExecutor(n_jobs=3),
+            ShardExecutor(n_jobs=16),
+            ShardExecutor(n_jobs=2, backend="loky"),
+            ShardExecutor(n_jobs=2, backend="multiprocessing"),
+        ]
+        for executor in executors:
+            handler = self._process(df, executor)
+            for data_key in [DataHandlerLP.DK_I, DataHandlerLP.DK_L]:
+                pd.testing.assert_frame_equal(handler.fetch(data_key=data_key), expected.fetch(data_key=data_key))
+            # the fitted statistics
+            for proc, exp_proc in zip(handler.infer_processors, expected.infer_processors):
+                for attr, value in vars(exp_proc).items():
+                    if isinstance(value, np.ndarray):
+                        np.testing.assert_array_equal(getattr(proc, attr), value)
+
+    def test_map_rows(self):
+        executor = ShardExecutor(n_jobs=4)
+        values = np.arange(20).reshape(10, 2)
+        sizes = executor.map_rows(lambda x: np.full(len(x), len(x)), values, boundaries=np.array([3, 8]))
+        self.assertEqual(sizes.tolist(), [3] * 3 + [5] * 5 + [2] * 2)
+        with use_executor(executor):
+            self.assertEqual(
+                executor.map_columns(lambda x: x.sum(axis=0), values).tolist(), values.sum(axis=0).tolist()
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
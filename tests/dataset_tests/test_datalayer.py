@@ -1,6 +1,8 @@
 import unittest
 import numpy as np
+import pandas as pd
 from qlib.data import D
+from qlib.data.data import ExpressionD, LocalDatasetProvider
 from qlib.tests import TestAutoData
 
 
@@ -32,6 +34,36 @@ class TestDataset(TestAutoData):
         # self.assertLessEqual(abs(close_desc.loc["max"][0]), 0.2, "Close value is abnormal")
         # self.assertGreaterEqual(close_desc.loc["min"][0], -0.2, "Close value is abnormal")
 
+    def testPanel(self):
+        fields = [
+            "$close",
+            "Mean($close>Ref($close, 1), 5)",
+            "IdxMax($high, 10)",
+            "WMA($close, 10)",
+            "Corr($close, Log($volume+1), 10)",
+            "Rsquare($close, 20)",
+            "Ref($close, -2)/$close - 1",
+        ]
+        instruments = D.instruments("csi300")
+        data = LocalDatasetProvider().dataset(instruments, fields, "2019-01-01", "2020-01-01")
+        panel_data = LocalDatasetProvider(panel_size=100).dataset(instruments, fields, "2019-01-01", "2020-01-01")
+        pd.testing.assert_frame_equal(data, panel_data, check_exact=False, rtol=1e-4)
+
+    def testExpressions(self):
+        fields = [
+            "$close",
+            "Ref($close, 1)/$close",
+            "Mean($close, 5)/$close",
+            "Mean($close, 20)/$close",
+            "Std(Ref($close, 1)/$close, 20)",
+            "EMA($close, 10)",
+            "Ref($close, -2)/Ref($close, -1) - 1",
+        ]
+        data = ExpressionD.expressions("SH600000", fields, "2019-01-01", "2020-01-01")
+        for field in fields:
+            series = ExpressionD.expression("SH600000", field, "2019-01-01", "2020-01-01")
+            pd.testing.assert_series_equal(data[field], series, check_exact=False, rtol=1e-5)
+
 
 if __name__ == "__main__":
     unittest.main()
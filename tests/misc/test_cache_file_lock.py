@@ -0,0 +1,52 @@
+import time
+import unittest
+from multiprocessing import Event, Process
+
+from qlib.data.cache import CacheUtils
+
+
+def _hold_lock(lock_name, shared, locked, release):
+    with CacheUtils.file_lock(lock_name, shared=shared):
+        locked.set()
+        release.wait(10)
+
+
+class TestCacheFileLock(unittest.TestCase):
+    def _start(self, lock_name, shared):
+        locked, release = Event(), Event()
+        p = Process(target=_hold_lock, args=(lock_name, shared, locked, release))
+        p.start()
+        self.assertTrue(locked.wait(10))
+        return p, release
+
+    def test_lock(self):
+        lock_name = f"test-{time.time()}"
+        p, release = self._start(lock_name, shared=True)
+        try:
+            # the readers share the lock
+            with CacheUtils.reader_lock(None, lock_name):
+                pass
+
+            # the writer waits for the reader
+            locked, writer_release = Event(), Event()
+            writer = Process(target=_hold_lock, args=(lock_name, False, locked, writer_release))
+            writer.start()
+            self.assertFalse(locked.wait(0.5))
+            release.set()
+            self.assertTrue(locked.wait(10))
+            writer_release.set()
+            writer.join()
+        finally:
+            release.set()
+            p.join()
+
+        # the lock is released when the process holding it is killed
+        p, release = self._start(lock_name, shared=False)
+        p.kill()
+        p.join()
+        with CacheUtils.writer_lock(None, lock_name):
+            pass
+
+
+if __name__ == "__main__":
+    unittest.main()
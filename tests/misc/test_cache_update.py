@@ -0,0 +1,124 @@
+import pickle
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import qlib
+from qlib.config import C
+from qlib.data import D
+from qlib.data.cache import DiskDatasetCache, DiskExpressionCache
+from qlib.data.data import LocalDatasetProvider
+
+INSTRUMENTS = ["SH600000", "SH600001"]
+BOUNDED_FIELDS = ["Mean($close, 5)", "Ref($close, 2)", "$close / Ref($close, -1)"]
+UNBOUNDED_FIELDS = ["EMA($close, 10)"]
+
+
+class TestCacheUpdate(unittest.TestCase):
+    """The disk caches are extended when the calendar grows"""
+
+    def setUp(self):
+        self.provider_uri = Path(tempfile.mkdtemp())
+        self.values = 10 + np.random.default_rng(0).normal(size=100).cumsum()
+
+    def tearDown(self):
+        shutil.rmtree(self.provider_uri, ignore_errors=True)
+
+    def _dump_data(self, n_days):
+        calendar = pd.bdate_range("2020-01-01", periods=n_days)
+        for name, content in [
+            ("calendars/day.txt", "\n".join(calendar.strftime("%Y-%m-%d"))),
+            ("instruments/all.txt", "".join(f"{inst}\t2020-01-01\t2099-12-31\n" for inst in INSTRUMENTS)),
+        ]:
+            path = self.provider_uri.joinpath(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+        for i, inst in enumerate(INSTRUMENTS):
+            # the data of the second instrument starts later
+            start_index = 5 * i
+            path = self.provider_uri.joinpath("features", inst.lower(), "close.day.bin")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.hstack([start_index, self.values[start_index:n_days]]).astype("<f").tofile(path)
+
+    def _init(self, with_cache=True):
+        cache = {"expression_cache": "DiskExpressionCache", "dataset_cache": "DiskDatasetCache"} if with_cache else {}
+        qlib.init(
+            provider_uri=str(self.provider_uri),
+            disk_cache_lock="file",
+            **{"expression_cache": None, "dataset_cache": None, **cache},
+        )
+
+    def _features(self, fields, disk_cache):
+        return D.features(INSTRUMENTS, fields, freq="day", disk_cache=disk_cache)
+
+    def _last_updates(self, dir_name):
+        res = []
+        for path in Path(C.dpm.get_data_uri("day")).joinpath(dir_name).rglob("*.meta"):
+            with path.open("rb") as f:
+                res.append(pickle.load(f)["info"]["last_update"])
+        return res
+
+    def test_update(self):
+        fields = BOUNDED_FIELDS + UNBOUNDED_FIELDS
+        self._dump_data(60)
+        self._init()
+        # generate the expression caches (disk_cache=0) and the dataset caches (disk_cache=1)
+        self._features(fields, disk_cache=0)
+        self._features(BOUNDED_FIELDS, disk_cache=1)
+        self._features(fields, disk_cache=1)
+
+        self._dump_data(80)
+        self._init(with_cache=False)
+        expected = self._features(fields, disk_cache=0)
+        self._init()
+        with mock.patch.object(
+            DiskExpressionCache,
+            "gen_expression_cache",
+            autospec=True,
+            side_effect=DiskExpressionCache.gen_expression_cache,
+        ) as gen_expression_cache:
+            pd.testing.assert_frame_equal(self._features(fields, disk_cache=0), expected)
+        # only the unbounded expressions are regenerated, the others are extended
+        self.assertEqual(
+            {call.kwargs["field"] for call in gen_expression_cache.call_args_list},
+            {field.replace(" ", "") for field in UNBOUNDED_FIELDS},
+        )
+        last_day = str(pd.bdate_range("2020-01-01", periods=80)[-1])
+        self.assertEqual(set(self._last_updates(C.features_cache_dir_name)), {last_day})
+
+        with mock.patch.object(
+            DiskDatasetCache, "gen_dataset_cache", autospec=True, side_effect=DiskDatasetCache.gen_dataset_cache
+        ) as gen_dataset_cache:
+            pd.testing.assert_frame_equal(self._features(BOUNDED_FIELDS, disk_cache=1), expected[BOUNDED_FIELDS])
+            self.assertEqual(gen_dataset_cache.call_count, 0)
+            # the dataset with unbounded expressions is regenerated
+            pd.testing.assert_frame_equal(self._features(fields, disk_cache=1), expected)
+            self.assertEqual(gen_dataset_cache.call_count, 1)
+        self.assertEqual(set(self._last_updates(C.dataset_cache_dir_name)), {last_day})
+
+    def test_panel(self):
+        fields = BOUNDED_FIELDS + UNBOUNDED_FIELDS
+        self._dump_data(60)
+        self._init(with_cache=False)
+        expected = self._features(fields, disk_cache=0)
+        self._init()
+        provider = LocalDatasetProvider(panel_size=10)
+        # the disk cache can't cache panels, the dataset is calculated instrument by instrument
+        with mock.patch.object(provider, "panel_dataset_processor") as panel_dataset_processor, self.assertLogs(
+            "qlib.data", "WARNING"
+        ):
+            data = provider.dataset(INSTRUMENTS, fields, freq="day")
+        panel_dataset_processor.assert_not_called()
+        pd.testing.assert_frame_equal(data, expected)
+        self.assertEqual(
+            len(list(Path(C.dpm.get_data_uri("day")).joinpath(C.features_cache_dir_name).rglob("*.meta"))), 8
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
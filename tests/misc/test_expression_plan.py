@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qlib.data.base import Expression
+from qlib.data.cache import H
+from qlib.data.ops import Abs, Mean
+from qlib.data.plan import ExpressionPlan
+
+
+class Const(Expression):
+    def __str__(self):
+        return "Const()"
+
+    def _load_internal(self, instrument, start_index, end_index, *args):
+        return pd.Series(
+            -np.arange(start_index, end_index + 1, dtype=np.float32), index=range(start_index, end_index + 1)
+        )
+
+    def get_longest_back_rolling(self):
+        return 0
+
+    def get_extended_window_size(self):
+        return 0, 0
+
+
+class TestExpressionPlan(unittest.TestCase):
+    def setUp(self):
+        H["f"].clear()
+
+    def tearDown(self):
+        H["f"].clear()
+
+    def test_free_intermediates(self):
+        inner = Abs(Const())
+        roots = [Mean(inner, 2), Abs(inner)]
+        expected = [root.load("SH600000", 0, 9, "day") for root in roots]
+        H["f"].clear()
+
+        # the entries cached by other callers before the plan runs
+        inner_key = str(inner), "SH600000", 0, 9, "day"
+        H["f"][inner_key] = inner.load("SH600000", 0, 9, "day")
+        H["f"].pop(("Const()", "SH600000", 0, 9, "day"))
+
+        plan = ExpressionPlan()
+        for root in roots:
+            plan.add(root, 0, 9)
+        for res, exp in zip(plan.load("SH600000", "day"), expected):
+            pd.testing.assert_series_equal(res, exp)
+        self.assertIn(inner_key, H["f"])
+        # the intermediates loaded by the plan itself are freed
+        self.assertNotIn(("Const()", "SH600000", 0, 9, "day"), H["f"])
+        for root in roots:
+            self.assertIn((str(root), "SH600000", 0, 9, "day"), H["f"])
+
+
+if __name__ == "__main__":
+    unittest.main()
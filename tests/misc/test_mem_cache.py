@@ -0,0 +1,92 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from qlib.data.cache import MemCache, MemCacheLengthUnit, MemCacheNbytesUnit, get_nbytes
+
+
+class TestMemCache(unittest.TestCase):
+    def test_lru(self):
+        unit = MemCacheLengthUnit(3, "lru")
+        for key in "abc":
+            unit[key] = key
+        unit["a"]
+        unit["d"] = "d"
+        self.assertEqual(list(unit.od), ["c", "a", "d"])
+
+    def test_lfu(self):
+        unit = MemCacheLengthUnit(3, "lfu")
+        for key in "abc":
+            unit[key] = key
+        for key in "aab":
+            unit[key]
+        unit["d"] = "d"
+        self.assertNotIn("c", unit.od)
+        unit["e"] = "e"
+        self.assertNotIn("d", unit.od)
+        self.assertEqual(set(unit.od), {"a", "b", "e"})
+
+    def test_arc(self):
+        unit = MemCacheLengthUnit(4, "arc")
+        # "a" and "b" are used frequently, a scan of other keys should not evict them
+        for key in "ab":
+            unit[key] = key
+            unit[key]
+        for i in range(10):
+            unit[i] = i
+        self.assertIn("a", unit.od)
+        self.assertIn("b", unit.od)
+        self.assertEqual(len(unit), 4)
+        # the key recently evicted from t1 is in the ghost list and makes t1 larger
+        unit[7] = 7
+        self.assertGreater(unit.policy.p, 0)
+        self.assertEqual(len(unit), 4)
+
+        unit.pop("a")
+        unit.clear()
+        self.assertEqual(unit.total_size, 0)
+        self.assertEqual(len(unit.policy.t1) + len(unit.policy.t2) + len(unit.policy.b1), 0)
+
+    def test_arc_zero_size(self):
+        # the ghost lists only hold zero-byte values
+        unit = MemCacheNbytesUnit(100, "arc")
+        rng = np.random.default_rng(0)
+        for _ in range(1000):
+            key = int(rng.integers(20))
+            if key in unit:
+                unit[key]
+            else:
+                unit[key] = np.empty(0) if rng.random() < 0.5 else np.zeros(int(rng.integers(1, 8)))
+            self.assertLessEqual(unit.total_size, 100)
+
+    def test_nbytes(self):
+        s = pd.Series(np.zeros(1000, dtype=np.float32))
+        self.assertGreaterEqual(get_nbytes(s), 4000)
+        self.assertGreaterEqual(get_nbytes((s, {"x": s.values})), 8000)
+
+        unit = MemCacheNbytesUnit(10000)
+        unit["a"] = s
+        unit["b"] = s
+        unit["c"] = s
+        self.assertEqual(list(unit.od), ["b", "c"])
+        self.assertLessEqual(unit.total_size, 10000)
+        unit.pop("b")
+        self.assertEqual(unit.total_size, get_nbytes(s))
+
+    def test_stats(self):
+        cache = MemCache(2, "length", "lru")
+        unit = cache["f"]
+        for key in "abc":
+            if key not in unit:
+                unit[key] = key
+        self.assertIn("c", unit)
+        stats = cache.stats()["f"]
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (1, 3, 1))
+        self.assertEqual(stats["hit_rate"], 0.25)
+        cache.reset_stats()
+        self.assertEqual(cache.stats()["f"]["hits"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+import qlib
+from qlib.data import D
+from qlib.data.base import PFeature
+from qlib.data.cache import H
+from qlib.data.data import PITD
+from qlib.data.pit import P
+from qlib.utils import read_period_data
+
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent.joinpath("scripts")))
+from dump_pit import DumpPitData
+
+INSTRUMENT = "sh600000"
+FIELDS = [
+    "P($$roe_q)",
+    "P(Mean($$roe_q, 2))",
+    "P($$roe_q / $$eps_q)",
+    "P(Ref($$eps_q, 1) + $$eps_q)",
+    "PRef($$roe_q, 201902)",
+]
+
+
+class TestPITRevision(unittest.TestCase):
+    """P is only evaluated on the revision dates of the PIT data"""
+
+    def setUp(self):
+        self.tmp_dir = Path(tempfile.mkdtemp())
+        self.qlib_dir = self.tmp_dir / "qlib_data"
+        calendar = pd.bdate_range("2019-01-01", "2020-12-31")
+        self.qlib_dir.joinpath("calendars").mkdir(parents=True)
+        self.qlib_dir.joinpath("calendars/day.txt").write_text("\n".join(calendar.strftime("%Y-%m-%d")))
+
+        rng = np.random.default_rng(0)
+        rows = []
+        for field in "roe", "eps":
+            for period_end in pd.date_range("2018-12-31", "2020-09-30", freq="Q"):
+                period = period_end.year * 100 + period_end.quarter
+                # the first report and the restatements of a period, some of them published after newer periods
+                dates = period_end + pd.to_timedelta(np.sort(rng.integers(10, 300, rng.integers(1, 4))), unit="D")
+                rows.extend((date, period, rng.normal(), field) for date in dates)
+        self.records = pd.DataFrame(rows, columns=["date", "period", "value", "field"])
+        self._dump(self.records[self.records["date"] < "2020-10-01"])
+        qlib.init(provider_uri=str(self.qlib_dir), expression_cache=None, dataset_cache=None)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _dump(self, records, overwrite=False):
+        csv_path = self.tmp_dir / "source" / f"{INSTRUMENT}.csv"
+        csv_path.parent.mkdir(exist_ok=True)
+        records = records.sort_values("date", kind="stable")
+        records.assign(date=records["date"].dt.strftime("%Y-%m-%d")).to_csv(csv_path, index=False)
+        DumpPitData(csv_path=str(csv_path), qlib_dir=str(self.qlib_dir), max_workers=1).dump(
+            interval="quarterly", overwrite=overwrite
+        )
+
+    def _features(self, fields=FIELDS):
+        return D.features([INSTRUMENT], fields, start_time="2019-01-01", end_time="2020-12-31", freq="day")
+
+    def test_revision_dates(self):
+        with mock.patch.object(P, "_get_change_flag", lambda self, instrument, calendar: np.ones(len(calendar), bool)):
+            expected = self._features()
+        # the loaded expressions are kept in memory
+        H["f"].clear()
+        pd.testing.assert_frame_equal(self._features(), expected)
+
+        flag = P(PFeature("roe_q"))._get_change_flag(INSTRUMENT, D.calendar(freq="day"))
+        self.assertLess(flag.sum(), len(flag))
+
+        # the cached revision log gives the same data as following the revision chain in the files
+        pit_dir = self.qlib_dir / "financial" / INSTRUMENT
+        for cur_time in D.calendar(start_time="2019-01-01", end_time="2020-12-31", freq="day")[::7]:
+            cur_date_int = int(cur_time.strftime("%Y%m%d"))
+            for period in self.records["period"].unique():
+                value = PITD.period_feature(INSTRUMENT, "$$roe_q", 0, 0, cur_time, period=period)
+                expected, _ = read_period_data(
+                    pit_dir / "roe_q.index", pit_dir / "roe_q.data", period, cur_date_int, quarterly=True
+                )
+                np.testing.assert_array_equal(value.values, [expected] if len(value) > 0 else [])
+
+    def test_cache_invalidation(self):
+        before = self._features(["P($$roe_q)"])
+        data_path = self.qlib_dir / "financial" / INSTRUMENT / "roe_q.data"
+        mtime = data_path.stat().st_mtime_ns
+
+        self._dump(self.records, overwrite=True)
+        # make sure the modification is visible on the file systems with a coarse mtime resolution
+        os.utime(data_path, ns=(mtime + 10**9, mtime + 10**9))
+        H["f"].clear()
+        after = self._features(["P($$roe_q)"])
+        self.assertFalse(before.equals(after))
+        # only the data observed after the new revisions change
+        pd.testing.assert_frame_equal(
+            after.loc[pd.IndexSlice[:, :"2020-09-30"], :], before.loc[pd.IndexSlice[:, :"2020-09-30"], :]
+        )
+
+        PITD._records_cache.clear()
+        H["f"].clear()
+        pd.testing.assert_frame_equal(self._features(["P($$roe_q)"]), after)
+
+
+if __name__ == "__main__":
+    unittest.main()
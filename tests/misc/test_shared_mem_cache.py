@@ -0,0 +1,123 @@
+import errno
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing import Process
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from qlib.data.base import Expression
+from qlib.data.cache import H, MemCacheLengthUnit, SharedMemCache
+from qlib.data.ops import Abs
+
+
+def _publish(path, key, value):
+    SharedMemCache(path)[key] = value
+
+
+class Const(Expression):
+    def __str__(self):
+        return "Const()"
+
+    def _load_internal(self, instrument, start_index, end_index, *args):
+        return pd.Series(
+            -np.arange(start_index, end_index + 1, dtype=np.float32), index=range(start_index, end_index + 1)
+        )
+
+    def get_longest_back_rolling(self):
+        return 0
+
+    def get_extended_window_size(self):
+        return 0, 0
+
+
+class TestSharedMemCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = SharedMemCache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_share(self):
+        key = "Mean($close,5)", "SH600000", 10, 20, "day"
+        value = pd.Series(np.arange(11, dtype=np.float32), index=pd.RangeIndex(10, 21))
+        p = Process(target=_publish, args=(self.path, key, value))
+        p.start()
+        p.join()
+        res = self.cache.get(key)
+        pd.testing.assert_series_equal(res, value, check_names=False)
+        self.assertEqual(res.dtype, np.float32)
+        self.assertIsNone(self.cache.get(("Mean($close,5)", "SH600000", 10, 21, "day")))
+
+        # the values are loaded into the local cache when they are found in the shared one
+        unit = MemCacheLengthUnit(10)
+        unit.shared = self.cache
+        self.assertNotIn(key, unit)
+        self.assertTrue(unit.contains(key, shared=True))
+        self.assertIn(key, unit.od)
+        key = "$close", "SH600000", 0, 1, "day"
+        unit[key] = pd.Series([1.0, 2.0], index=[0, 1])
+        self.assertIsNone(self.cache.get(key))
+        unit.set(key, pd.Series([1.0, 2.0], index=[0, 1]), shared=True)
+        self.assertEqual(self.cache.get(key).dtype, np.float64)
+
+    def test_share_roots(self):
+        H.set_shared_cache(self.path)
+        try:
+            expr = Abs(Const())
+            expected = expr.load("SH600000", 0, 9, "day", shared=True)
+            self.assertIn(("Const()", "SH600000", 0, 9, "day"), H["f"])
+            # only the root expression is shared
+            self.assertEqual(len(os.listdir(self.path)), 1)
+            H["f"].clear()
+            with mock.patch.object(Const, "_load_internal", side_effect=AssertionError("the data should be shared")):
+                pd.testing.assert_series_equal(expr.load("SH600000", 0, 9, "day", shared=True), expected)
+        finally:
+            H.set_shared_cache(None)
+            H["f"].clear()
+
+    def test_size_limit(self):
+        cache = SharedMemCache(self.path, size_limit=1000)
+        # 96 bytes for each value
+        keys = [("$close", f"SH{i:06d}", 0, 9, "day") for i in range(30)]
+        for i, key in enumerate(keys):
+            cache[key] = pd.Series(np.arange(10, dtype=np.float64) + i)
+            self.assertLessEqual(sum(p.stat().st_size for p in cache.path.iterdir()), 1000)
+            self.assertEqual(cache.get(key).iloc[0], i)
+        self.assertIsNone(cache.get(keys[0]))
+        # the values larger than the limit are not shared
+        cache[keys[0]] = pd.Series(np.arange(1000, dtype=np.float64))
+        self.assertIsNone(cache.get(keys[0]))
+
+    def test_write_error(self):
+        key = "$close", "SH600000", 0, 9, "day"
+        with mock.patch("qlib.data.cache.os.write", side_effect=OSError(errno.ENOSPC, "No space left on device")):
+            self.cache[key] = pd.Series(np.arange(10, dtype=np.float64))
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(os.listdir(self.path), [])
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "the open file descriptors can't be counted")
+    def test_no_fd_leak(self):
+        key = "$close", "SH600000", 0, 9, "day"
+        self.cache[key] = pd.Series(np.arange(10, dtype=np.float64))
+        n_fds = len(os.listdir("/proc/self/fd"))
+        # the series returned are held
+        values = [self.cache.get(key) for _ in range(100)]
+        self.assertLess(len(os.listdir("/proc/self/fd")) - n_fds, 10)
+        self.assertEqual(values[-1].tolist(), list(range(10)))
+
+    def test_not_shared(self):
+        value = pd.Series([1.0, 2.0], index=[0, 2])
+        self.cache[("$close", "SH600000", 0, 2, "day")] = value
+        self.cache[(("$close", ("SH600000", "SH600004"), 0, 1, "day"))] = value.iloc[:1]
+        self.cache[("$close", "SH600000", 0, 1, "day")] = pd.Series([], dtype=np.float32)
+        self.cache["uri"] = value.iloc[:1]
+        self.assertEqual(len(list(self.cache.path.iterdir())), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import percentileofscore
+
+from qlib.data._libs.rolling import rolling_wma, rolling_rank, rolling_mad, rolling_quantile
+from qlib.data._libs.expanding import expanding_wma, expanding_ema
+from qlib.data.base import Expression
+from qlib.data.ops import EMA, WMA, Mad, Quantile, Rank
+
+
+# The reference implementations calculated by calling python functions for each window
+
+
+def weighted_mean(x):
+    w = np.arange(len(x)) + 1
+    w = w / w.sum()
+    return np.nanmean(w * x)
+
+
+def exp_weighted_mean(x):
+    a = 1 - 2 / (1 + len(x))
+    w = a ** np.arange(len(x))[::-1]
+    w /= w.sum()
+    return np.nansum(w * x)
+
+
+def mad(x):
+    x1 = x[~np.isnan(x)]
+    return np.mean(np.abs(x1 - x1.mean()))
+
+
+def rank(x):
+    if np.isnan(x[-1]):
+        return np.nan
+    x1 = x[~np.isnan(x)]
+    return percentileofscore(x1, x1[-1]) / 100
+
+
+class TestRollingKernels(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        x = rng.normal(10, 1, 1000).astype(np.float32)
+        x[rng.random(len(x)) < 0.1] = np.nan
+        x[100:130] = np.nan
+        # constant values and ties
+        x[200:220] = 10.5
+        x[300:400] = np.round(x[300:400])
+        self.x = x
+        self.series = pd.Series(x)
+
+    def check(self, res, expected):
+        np.testing.assert_allclose(res, expected, rtol=1e-9, atol=1e-9)
+
+    def test_rolling(self):
+        for N in [1, 5, 20]:
+            rolling = self.series.rolling(N, min_periods=1)
+            self.check(rolling_wma(self.x, N), rolling.apply(weighted_mean, raw=True))
+            self.check(rolling_mad(self.x, N), rolling.apply(mad, raw=True))
+            self.check(rolling_rank(self.x, N), rolling.apply(rank, raw=True))
+            for qscore in [0, 0.2, 0.5, 1]:
+                self.check(rolling_quantile(self.x, N, qscore), rolling.quantile(qscore))
+
+    def test_expanding(self):
+        expanding = self.series.expanding(min_periods=1)
+        N = len(self.x)
+        self.check(expanding_wma(self.x), expanding.apply(weighted_mean, raw=True))
+        self.check(expanding_ema(self.x), expanding.apply(exp_weighted_mean, raw=True))
+        self.check(rolling_mad(self.x, N), expanding.apply(mad, raw=True))
+        self.check(rolling_rank(self.x, N), expanding.apply(rank, raw=True))
+        self.check(rolling_quantile(self.x, N, 0.2), expanding.quantile(0.2))
+
+    def test_empty(self):
+        x = np.array([], dtype=np.float32)
+        self.assertEqual(len(rolling_rank(x, 5)), 0)
+        self.assertEqual(len(expanding_ema(x)), 0)
+        x = np.full(5, np.nan)
+        self.assertTrue(np.isnan(rolling_mad(x, 3)).all())
+        self.assertTrue(np.isnan(rolling_wma(x, 3)).all())
+
+    def test_inf(self):
+        class Series(Expression):
+            def __init__(self, series):
+                self.series = series
+
+            def load(self, instrument, start_index, end_index, *args):
+                return self.series
+
+            def _load_internal(self, instrument, start_index, end_index, *args):
+                return self.series
+
+            def get_longest_back_rolling(self):
+                return 0
+
+            def get_extended_window_size(self):
+                return 0, 0
+
+        # +/-inf are regarded as NaN like the rolling of pandas
+        x = self.x.copy()
+        x[[10, 55, 56, 310]] = np.inf
+        x[[20, 320]] = -np.inf
+        series = Series(pd.Series(x))
+        for N in [0, 5]:
+            window = pd.Series(x).expanding(min_periods=1) if N == 0 else pd.Series(x).rolling(N, min_periods=1)
+            cases = [
+                (WMA(series, N), window.apply(weighted_mean, raw=True)),
+                (Mad(series, N), window.apply(mad, raw=True)),
+                (Rank(series, N), window.apply(rank, raw=True)),
+                (Quantile(series, N, 0.2), window.quantile(0.2)),
+            ]
+            if N == 0:
+                cases.append((EMA(series, N), window.apply(exp_weighted_mean, raw=True)))
+            for op, expected in cases:
+                self.check(op._load_internal("SH600000", 0, len(x) - 1, "day"), expected)
+
+    @pytest.mark.slow
+    def test_speed(self):
+        series = pd.Series(np.random.default_rng(0).normal(10, 1, 4000).astype(np.float32))
+        x = series.values
+
+        def timeit(func):
+            t = time.time()
+            func()
+            return time.time() - t
+
+        cases = {
+            "WMA(20)": (
+                lambda: series.rolling(20, min_periods=1).apply(weighted_mean, raw=True),
+                lambda: rolling_wma(x, 20),
+            ),
+            "EMA(0)": (
+                lambda: series.expanding(min_periods=1).apply(exp_weighted_mean, raw=True),
+                lambda: expanding_ema(x),
+            ),
+            "Mad(20)": (lambda: series.rolling(20, min_periods=1).apply(mad, raw=True), lambda: rolling_mad(x, 20)),
+            "Rank(20)": (lambda: series.rolling(20, min_periods=1).apply(rank, raw=True), lambda: rolling_rank(x, 20)),
+            "Quantile(20)": (
+                lambda: series.rolling(20, min_periods=1).quantile(0.2),
+                lambda: rolling_quantile(x, 20, 0.2),
+            ),
+        }
+        for name, (python_func, kernel) in cases.items():
+            python_time, kernel_time = timeit(python_func), timeit(kernel)
+            print(f"{name}: {python_time:.4f}s -> {kernel_time:.4f}s, {python_time / kernel_time:.1f}x")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,16 +2,25 @@
 # Licensed under the MIT License.
 
 
+import os
+import shutil
+import tempfile
+import unittest
 from pathlib import Path
+from unittest import mock
 from collections.abc import Iterable
 
 import numpy as np
+import pandas as pd
+import qlib
 from qlib.tests import TestAutoData
 
 from qlib.data.storage.file_storage import (
     FileCalendarStorage as CalendarStorage,
     FileInstrumentStorage as InstrumentStorage,
     FileFeatureStorage as FeatureStorage,
+    MmapFeatureStorage,
+    ColumnarFeatureStorage,
 )
 
 _file_name = Path(__file__).name.split(".")[0]
@@ -168,3 +177,94 @@ class TestStorage(TestAutoData):
             print(feature[:].empty)
         with self.assertRaises(ValueError):
             print(feature.data.empty)
+
+    def test_mmap_feature_storage(self):
+        feature = FeatureStorage(instrument="SZ300677", field="close", freq="day", provider_uri=self.provider_uri)
+        mmap_feature = MmapFeatureStorage(
+            instrument="SZ300677", field="close", freq="day", provider_uri=self.provider_uri
+        )
+        self.assertEqual(feature.start_index, mmap_feature.start_index)
+        self.assertEqual(feature.end_index, mmap_feature.end_index)
+        self.assertEqual(feature[3049], mmap_feature[3049])
+        with self.assertRaises(IndexError):
+            print(mmap_feature[0])
+        for s in [slice(None), slice(3049, 3052), slice(0, 3052), slice(3049, None)]:
+            pd.testing.assert_series_equal(feature[s], mmap_feature[s])
+        self.assertFalse(mmap_feature[:].values.flags.writeable, "the slices should be views of the mapped file")
+
+        mmap_feature = MmapFeatureStorage(instrument="SH600004", field="close", freq="day", provider_uri="not_fount")
+        with self.assertRaises(ValueError):
+            print(mmap_feature[:].empty)
+
+
+class TestMmapFeatureStorage(unittest.TestCase):
+    def setUp(self):
+        self.provider_uri = tempfile.mkdtemp()
+        Path(self.provider_uri, "calendars").mkdir()
+        Path(self.provider_uri, "calendars", "day.txt").write_text("2020-01-01\n")
+        self.instruments = [f"SH60{i:04d}" for i in range(30)]
+        for i, inst in enumerate(self.instruments):
+            path = Path(self.provider_uri, "features", inst.lower(), "close.day.bin")
+            path.parent.mkdir(parents=True)
+            np.hstack([i, np.arange(100) + i]).astype("<f").tofile(path)
+        qlib.init(provider_uri=self.provider_uri)
+        MmapFeatureStorage.clear_cache()
+
+    def tearDown(self):
+        MmapFeatureStorage.clear_cache()
+        shutil.rmtree(self.provider_uri)
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "the open file descriptors can't be counted")
+    def test_more_files_than_cap(self):
+        n_fds = len(os.listdir("/proc/self/fd"))
+        with mock.patch.object(MmapFeatureStorage, "max_open_files", 10):
+            # the slices keep the mappings alive after they are evicted (e.g. in the memory cache `H["f"]`)
+            slices = []
+            for inst in self.instruments:
+                feature = FeatureStorage(instrument=inst, field="close", freq="day", provider_uri=self.provider_uri)
+                mmap_feature = MmapFeatureStorage(
+                    instrument=inst, field="close", freq="day", provider_uri=self.provider_uri
+                )
+                slices.append(mmap_feature[:])
+                pd.testing.assert_series_equal(feature[:], slices[-1])
+                self.assertLessEqual(len(MmapFeatureStorage._mmap_cache), 10)
+            # the mappings don't hold any file descriptor
+            self.assertEqual(len(os.listdir("/proc/self/fd")), n_fds)
+            for i, s in enumerate(slices):
+                np.testing.assert_array_equal(s.values, np.arange(100) + i)
+
+
+class TestColumnarFeatureStorage(unittest.TestCase):
+    def setUp(self):
+        self.provider_uri = tempfile.mkdtemp()
+        Path(self.provider_uri, "calendars").mkdir()
+        calendar = pd.bdate_range("2020-01-01", periods=20).strftime("%Y-%m-%d")
+        Path(self.provider_uri, "calendars", "day.txt").write_text("\n".join(calendar))
+        qlib.init(provider_uri=self.provider_uri)
+        ColumnarFeatureStorage.clear_cache()
+
+    def tearDown(self):
+        ColumnarFeatureStorage.clear_cache()
+        shutil.rmtree(self.provider_uri)
+
+    def test_write_all(self):
+        storage = ColumnarFeatureStorage(instrument="SH600000", field="close", freq="day")
+        data = {
+            "SH600000": pd.Series(np.arange(5, dtype=np.float32), index=range(3, 8)),
+            "SZ000001": pd.Series(np.arange(10, dtype=np.float32), index=range(10)),
+        }
+        storage.write_all(data, calendar_size=20)
+        self.assertEqual((storage.start_index, storage.end_index), (3, 7))
+        pd.testing.assert_series_equal(storage[:], data["SH600000"], check_index_type=False)
+        pd.testing.assert_frame_equal(
+            storage.read_panel(["SZ000001", "SH600000"], 2, 4),
+            pd.DataFrame({"SZ000001": [2.0, 3.0, 4.0], "SH600000": [np.nan, 0.0, 1.0]}, index=range(2, 5), dtype="<f"),
+            check_index_type=False,
+        )
+
+        # the field is replaced by other instruments with the index and the data together
+        storage.write_all({"SH600001": data["SH600000"] + 1, "SH600002": data["SZ000001"] + 1}, calendar_size=20)
+        self.assertIsNone(storage.start_index)
+        storage = ColumnarFeatureStorage(instrument="SH600001", field="close", freq="day")
+        pd.testing.assert_series_equal(storage[:], data["SH600000"] + 1, check_index_type=False)
+        self.assertEqual(os.listdir(storage.uri.parent), [storage.uri.name])
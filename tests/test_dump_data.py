@@ -14,7 +14,7 @@ from qlib.data import D
 
 sys.path.append(str(Path(__file__).resolve().parent.parent.joinpath("scripts")))
 from get_data import GetData
-from dump_bin import DumpDataAll, DumpDataFix
+from dump_bin import DumpDataAll, DumpDataFix, DumpDataColumnar, DumpColumnarFromBin
 
 
 DATA_DIR = Path(__file__).parent.joinpath("test_dump_data")
@@ -22,6 +22,7 @@ SOURCE_DIR = DATA_DIR.joinpath("source")
 SOURCE_DIR.mkdir(exist_ok=True, parents=True)
 QLIB_DIR = DATA_DIR.joinpath("qlib")
 QLIB_DIR.mkdir(exist_ok=True, parents=True)
+COLUMNAR_QLIB_DIR = DATA_DIR.joinpath("qlib_columnar")
 
 
 class TestDumpData(unittest.TestCase):
@@ -85,6 +86,33 @@ class TestDumpData(unittest.TestCase):
         self.assertEqual(len(df), len(TestDumpData.SIMPLE_DATA), "dump features simple failed")
         self.assertTrue(np.isclose(df.dropna(), self.SIMPLE_DATA.dropna()).all(), "dump features simple failed")
 
+    def test_5_dump_columnar(self):
+        DumpColumnarFromBin(qlib_dir=QLIB_DIR, include_fields=self.FIELDS).dump()
+        DumpDataColumnar(csv_path=SOURCE_DIR, qlib_dir=COLUMNAR_QLIB_DIR, include_fields=self.FIELDS).dump()
+        # one file for each field, which contains both the index and the data
+        file_names = sorted(f"{field}.day.bin" for field in self.FIELDS)
+        self.assertEqual(sorted(p.name for p in COLUMNAR_QLIB_DIR.joinpath("columnar").iterdir()), file_names)
+        for file_name in file_names:
+            self.assertEqual(
+                QLIB_DIR.joinpath("columnar", file_name).read_bytes(),
+                COLUMNAR_QLIB_DIR.joinpath("columnar", file_name).read_bytes(),
+                "the converted data should be the same as the dumped data",
+            )
+
+        df = D.features(self.STOCK_NAMES, self.QLIB_FIELDS)
+        qlib.init(
+            provider_uri=str(COLUMNAR_QLIB_DIR.resolve()),
+            expression_cache=None,
+            dataset_cache=None,
+            feature_provider={
+                "class": "LocalFeatureProvider",
+                "kwargs": {
+                    "backend": {"class": "ColumnarFeatureStorage", "module_path": "qlib.data.storage.file_storage"}
+                },
+            },
+        )
+        pd.testing.assert_frame_equal(df, D.features(self.STOCK_NAMES, self.QLIB_FIELDS))
+
 
 if __name__ == "__main__":
     unittest.main()